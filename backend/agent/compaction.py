@@ -0,0 +1,76 @@
+# agent/compaction.py
+"""
+Tool-output compaction for the agent scratchpad. A tool result is re-sent to
+the model on every following LLM call of the turn, so it is cut down before
+it enters the scratchpad:
+
+- JSON objects keep only the fields the model acts on (per tool, from
+  TOOL_OUTPUT_FIELDS in tools/tool_config.py; status / message / error are
+  always kept), without null or empty values.
+- Text longer than `max_chars` keeps its head. URLs from the cut part (label,
+  invoice and approval links the final answer has to quote) are kept after it.
+
+Once the model has seen a result in full, the runner compacts it again to a
+tighter limit for the rest of the turn.
+"""
+
+from __future__ import annotations
+import re
+import json
+from typing import Any, Iterable, Optional, Sequence
+
+DEFAULT_MAX_CHARS = 1500        # a new tool result
+DEFAULT_OLDER_MAX_CHARS = 400   # results from earlier steps of the turn
+CHARS_PER_TOKEN = 4             # rough average for English text with OpenAI tokenizers
+
+_ALWAYS_KEEP = ("status", "message", "error")
+_URL = re.compile(r"https?://[^\s)\]\"'<>]+")
+_MAX_KEPT_URLS = 3
+
+
+def _as_text(content: Any) -> str:
+    return content if isinstance(content, str) else str(content)
+
+
+def _json_fields(text: str, fields: Optional[Sequence[str]]) -> Optional[str]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    kept = {k: v for k, v in data.items()
+            if (fields is None or k in fields or k in _ALWAYS_KEEP) and v not in (None, "", [], {})}
+    return json.dumps(kept, ensure_ascii=False, default=str)
+
+
+def compact_output(content: Any, fields: Optional[Sequence[str]] = None, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """`content` cut down to the fields and length the model needs (see module docstring)."""
+    text = _as_text(content).strip()
+    if text[:1] == "{":
+        text = _json_fields(text, fields) or text
+    if len(text) <= max_chars:
+        return text
+
+    cut_at = max_chars
+    # Never split a URL: move one that straddles the cut into the cut part.
+    for m in _URL.finditer(text, max(0, max_chars - 300), max_chars):
+        if m.end() >= max_chars:
+            cut_at = m.start()
+            break
+    head, rest = text[:cut_at].rstrip(), text[cut_at:]
+    urls = []
+    for url in _URL.findall(rest):
+        if url not in head and url not in urls:
+            urls.append(url)
+    return head + f" … [{len(rest)} chars cut]" + "".join(f"\n{u}" for u in urls[:_MAX_KEPT_URLS])
+
+
+def estimate_tokens(messages: Iterable[Any]) -> int:
+    """Approximate token count of `messages` (content plus tool-call arguments)."""
+    chars = 0
+    for m in messages:
+        chars += len(_as_text(m.content))
+        for call in getattr(m, "tool_calls", None) or ():
+            chars += len(call.get("name", "")) + len(json.dumps(call.get("args") or {}, default=str))
+    return chars // CHARS_PER_TOKEN
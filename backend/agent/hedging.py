@@ -0,0 +1,156 @@
+# agent/hedging.py
+"""
+Hedged LLM calls. Each model's recent latencies are kept in a rolling window;
+when a call is still running after that model's observed p95
+(LLM_HEDGE_QUANTILE), an identical duplicate request is sent and whichever
+answers first wins, the other is cancelled. The tail of slow requests is
+mostly independent of the prompt (a slow replica, a congested connection),
+so the duplicate usually lands on a fast path.
+
+Extra load is bounded: at most LLM_HEDGE_MAX_RATE of recent calls may be
+hedged, there is no hedging until LLM_HEDGE_MIN_SAMPLES calls have been seen,
+and the delay is never shorter than LLM_HEDGE_MIN_DELAY_SECONDS. LLM_HEDGE=0
+turns it off.
+"""
+
+from __future__ import annotations
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from observability.metrics import LLM_HEDGES, LLM_HEDGE_WINS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUANTILE = 0.95
+DEFAULT_WINDOW = 200            # recent calls per model the quantile is taken over
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_MIN_DELAY = 1.0         # seconds
+DEFAULT_MAX_RATE = 0.1          # share of recent calls that may be hedged
+
+
+class _ModelLatency:
+    __slots__ = ("samples", "hedged", "delay", "_since_update")
+
+    def __init__(self, window: int) -> None:
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.hedged: Deque[bool] = deque(maxlen=window)
+        self.delay: Optional[float] = None
+        self._since_update = 0
+
+
+class Hedger:
+    def __init__(
+        self,
+        enabled: bool = True,
+        quantile: float = DEFAULT_QUANTILE,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        max_rate: float = DEFAULT_MAX_RATE,
+    ) -> None:
+        self.enabled = enabled
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self._models: Dict[str, _ModelLatency] = {}
+
+    def _model(self, model: str) -> _ModelLatency:
+        m = self._models.get(model)
+        if m is None:
+            m = self._models[model] = _ModelLatency(self.window)
+        return m
+
+    def observe(self, model: str, seconds: float) -> None:
+        m = self._model(model)
+        m.samples.append(seconds)
+        m._since_update += 1
+        # Re-sorting the window on every call is wasted work; the quantile moves slowly.
+        if len(m.samples) >= self.min_samples and (m.delay is None or m._since_update >= 10):
+            ordered = sorted(m.samples)
+            m.delay = max(ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))], self.min_delay)
+            m._since_update = 0
+
+    def delay(self, model: str) -> Optional[float]:
+        """Seconds after which a call to `model` is hedged, or None (disabled, too few samples, over budget)."""
+        if not self.enabled:
+            return None
+        m = self._model(model)
+        if m.delay is None or sum(m.hedged) >= self.max_rate * max(len(m.hedged), 1):
+            return None
+        return m.delay
+
+    async def call(self, model: str, make_call: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Await `make_call()`, hedging it once past the model's delay; raises
+        asyncio.TimeoutError after `timeout` seconds with every attempt cancelled.
+        """
+        started = time.perf_counter()
+        delay = self.delay(model)
+        if delay is not None and timeout is not None and delay >= timeout:
+            delay = None
+
+        attempts: Dict[asyncio.Task, float] = {asyncio.ensure_future(make_call()): started}
+        primary = next(iter(attempts))
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while attempts:
+                if not hedged and delay is not None:
+                    wait = delay - (time.perf_counter() - started)
+                else:
+                    wait = None if timeout is None else timeout - (time.perf_counter() - started)
+                if wait is not None and wait <= 0 and (hedged or delay is None):
+                    raise asyncio.TimeoutError()
+                done, _ = await asyncio.wait(attempts, timeout=max(wait, 0) if wait is not None else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not hedged and delay is not None:
+                        hedged = True
+                        LLM_HEDGES.labels(model).inc()
+                        logger.info("LLM call to %s still running after %.2fs (p%d); sending a hedge.",
+                                    model, delay, round(self.quantile * 100))
+                        attempts[asyncio.ensure_future(make_call())] = time.perf_counter()
+                        continue
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    task_started = attempts.pop(task)
+                    if task.exception() is None:
+                        self.observe(model, time.perf_counter() - task_started)
+                        if task is not primary:
+                            LLM_HEDGE_WINS.labels(model).inc()
+                        return task.result()
+                    error = task.exception()
+                # Every attempt so far failed; keep waiting on the hedge if one is running.
+                if not attempts:
+                    raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            self._model(model).hedged.append(hedged)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: {"samples": len(m.samples), "hedge_delay_s": m.delay,
+                        "recent_hedge_rate": round(sum(m.hedged) / len(m.hedged), 3) if m.hedged else 0.0}
+                for model, m in self._models.items()}
+
+
+_hedger: Optional[Hedger] = None
+
+def get_hedger() -> Hedger:
+    """Process-wide hedger, configured from the environment on first use."""
+    global _hedger
+    if _hedger is None:
+        _hedger = Hedger(
+            enabled=os.getenv("LLM_HEDGE", "1") != "0",
+            quantile=float(os.getenv("LLM_HEDGE_QUANTILE", DEFAULT_QUANTILE)),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)),
+            min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", DEFAULT_MIN_DELAY)),
+            max_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", DEFAULT_MAX_RATE)),
+        )
+    return _hedger
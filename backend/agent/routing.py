@@ -0,0 +1,188 @@
+# agent/routing.py
+"""
+Model routing. Each chat turn is classified from the user's message and the
+session's state (greeting, cart edit, checkout, profile save, error recovery
+or other) and sent to a model tier: routine turns to a cheap, fast model and
+checkout / recovery turns to a stronger one. Every tier has a per-call
+timeout and a fallback model (optionally on another OpenAI-compatible
+provider) that is tried on a timeout, connection error or 5xx.
+
+Configured from the environment:
+
+  LLM_ROUTING=0                 one model (OPENAI_API_MODEL) for every turn, the
+                                baseline to compare against (tier "default")
+  LLM_FAST_MODEL                default OPENAI_API_MODEL
+  LLM_STRONG_MODEL              default gpt-4o
+  LLM_{FAST,STRONG}_TIMEOUT_SECONDS
+  LLM_FALLBACK_MODEL            fallback for both tiers; without it each tier
+                                falls back to the other tier's model
+  LLM_FALLBACK_BASE_URL / LLM_FALLBACK_API_KEY / LLM_FALLBACK_TIMEOUT_SECONDS
+  LLM_ROUTES                    overrides, e.g. "other=strong,cart_edit=strong"
+"""
+
+from __future__ import annotations
+import os
+import re
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TURN_GREETING = "greeting"
+TURN_CART = "cart_edit"
+TURN_CHECKOUT = "checkout"
+TURN_PROFILE = "profile_save"
+TURN_RECOVERY = "error_recovery"
+TURN_OTHER = "other"
+TURN_CLASSES = (TURN_GREETING, TURN_CART, TURN_CHECKOUT, TURN_PROFILE, TURN_RECOVERY, TURN_OTHER)
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+TIER_DEFAULT = "default"    # LLM_ROUTING=0
+
+DEFAULT_STRONG_MODEL = "gpt-4o"
+DEFAULT_TIMEOUTS = {TIER_FAST: 20.0, TIER_STRONG: 45.0}
+DEFAULT_ROUTES = {
+    TURN_GREETING: TIER_FAST,
+    TURN_CART: TIER_FAST,
+    TURN_PROFILE: TIER_FAST,
+    TURN_OTHER: TIER_FAST,
+    TURN_CHECKOUT: TIER_STRONG,
+    TURN_RECOVERY: TIER_STRONG,
+}
+
+# ── classification ─────────────────────────────────────────────────────────
+_GREETING = re.compile(r"^\W*(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|bye|goodbye|ok|okay)\b", re.I)
+_RECOVERY = re.compile(
+    r"\b(wrong|error|incorrect|failed|fails|broken|problem|issue|didn'?t work|doesn'?t work|not working|"
+    r"try again|that'?s not|still (not|no|haven'?t|can'?t))\b", re.I)
+_REPLY_ERROR = re.compile(r"\b(error|went wrong|failed|unable to|problem)\b", re.I)
+_PROFILE = re.compile(r"\b(save (my )?profile|my (email|phone|address)|first name|last name)\b", re.I)
+_CONTACT = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+|\b\d{3}[\s.-]?\d{3}[\s.-]?\d{4}\b|\b\d{5}(-\d{4})?\b")
+_REPLY_PROFILE = re.compile(r"save your profile|provide your full details", re.I)
+_CHECKOUT = re.compile(r"\b(check ?out|pay|paid|payment|invoice|order|buy|purchase|proceed|ship|shipping|tracking)\b", re.I)
+_CART = re.compile(r"\b(add|remove|cart|clear|quantity|more|less|fewer)\b|\b\d+\s*(x\s*)?\w*\s*(chai|coffee)\b", re.I)
+
+
+def classify_turn(message: str, *, last_reply: str = "", in_checkout: bool = False, is_guest: bool = False) -> str:
+    """Turn class from the user's message, the agent's previous reply and the session's state."""
+    text = message or ""
+    if _RECOVERY.search(text) or (last_reply and _REPLY_ERROR.search(last_reply) and len(text.split()) <= 12):
+        return TURN_RECOVERY
+    if is_guest and (_PROFILE.search(text) or _CONTACT.search(text) or _REPLY_PROFILE.search(last_reply)):
+        return TURN_PROFILE
+    if _CHECKOUT.search(text):
+        return TURN_CHECKOUT
+    if _CART.search(text):
+        return TURN_CART
+    if in_checkout:
+        return TURN_CHECKOUT
+    if not last_reply or (_GREETING.search(text) and len(text.split()) <= 8):
+        return TURN_GREETING
+    return TURN_OTHER
+
+
+# ── tiers ──────────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class ModelSpec:
+    model: str
+    timeout: float
+    base_url: Optional[str] = None
+    api_key: Optional[str] = field(default=None, repr=False)
+
+
+@dataclass
+class Candidate:
+    model: str
+    llm: Any            # chat model with the tools bound
+    timeout: Optional[float]
+
+
+@dataclass
+class ModelRoute:
+    turn_class: str
+    tier: str
+    candidates: List[Candidate]     # primary first, then fallbacks
+
+
+def fallback_reason(error: BaseException) -> Optional[str]:
+    """Why `error` justifies trying the next model ("timeout", "connection", "5xx"), or None."""
+    if isinstance(error, asyncio.TimeoutError) or type(error).__name__ == "APITimeoutError":
+        return "timeout"
+    if type(error).__name__ == "APIConnectionError":
+        return "connection"
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return "5xx"
+    return None
+
+
+def tiers_from_env(default_model: str) -> Tuple[Dict[str, List[ModelSpec]], Dict[str, str]]:
+    """(tier -> [primary, fallbacks...], turn class -> tier) from the environment."""
+    if os.getenv("LLM_ROUTING", "1") == "0":
+        spec = ModelSpec(default_model, float(os.getenv("LLM_TIMEOUT_SECONDS", DEFAULT_TIMEOUTS[TIER_STRONG])))
+        return {TIER_DEFAULT: [spec]}, {turn_class: TIER_DEFAULT for turn_class in TURN_CLASSES}
+
+    fast = ModelSpec(os.getenv("LLM_FAST_MODEL") or default_model,
+                     float(os.getenv("LLM_FAST_TIMEOUT_SECONDS", DEFAULT_TIMEOUTS[TIER_FAST])))
+    strong = ModelSpec(os.getenv("LLM_STRONG_MODEL") or DEFAULT_STRONG_MODEL,
+                       float(os.getenv("LLM_STRONG_TIMEOUT_SECONDS", DEFAULT_TIMEOUTS[TIER_STRONG])))
+    if os.getenv("LLM_FALLBACK_MODEL"):
+        fallback = ModelSpec(
+            os.environ["LLM_FALLBACK_MODEL"],
+            float(os.getenv("LLM_FALLBACK_TIMEOUT_SECONDS", DEFAULT_TIMEOUTS[TIER_STRONG])),
+            base_url=os.getenv("LLM_FALLBACK_BASE_URL") or None,
+            api_key=os.getenv("LLM_FALLBACK_API_KEY") or None,
+        )
+        tiers = {TIER_FAST: [fast, fallback], TIER_STRONG: [strong, fallback]}
+    else:
+        tiers = {TIER_FAST: [fast, strong], TIER_STRONG: [strong, fast]}
+    if fast.model == strong.model and fast.base_url == strong.base_url:
+        tiers = {tier: [specs[0]] + [s for s in specs[1:] if s.model != specs[0].model] for tier, specs in tiers.items()}
+
+    routes = dict(DEFAULT_ROUTES)
+    for pair in os.getenv("LLM_ROUTES", "").split(","):
+        if "=" in pair:
+            turn_class, tier = (part.strip() for part in pair.split("=", 1))
+            if turn_class in routes and tier in tiers:
+                routes[turn_class] = tier
+            else:
+                logger.warning(f"Ignoring LLM_ROUTES entry {pair!r}.")
+    return tiers, routes
+
+
+class ModelRouter:
+    """
+    Builds every configured model once (each distinct spec has one client and
+    connection pool, shared by all turns and tiers that use it) and hands out
+    the route for a turn class.
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, List[ModelSpec]],
+        routes: Dict[str, str],
+        build: Callable[[ModelSpec], Any],
+        tools: Sequence[Any],
+    ) -> None:
+        self.tiers = tiers
+        self.routes = routes
+        self._models: Dict[ModelSpec, Tuple[Any, Any]] = {}     # spec -> (chat model, tool-bound model)
+        for specs in tiers.values():
+            for spec in specs:
+                if spec not in self._models:
+                    llm = build(spec)
+                    self._models[spec] = (llm, llm.bind_tools(list(tools)))
+        logger.info("Model routing: " + ", ".join(
+            f"{tier}={' -> '.join(s.model for s in specs)}" for tier, specs in tiers.items()))
+
+    def route(self, turn_class: str) -> ModelRoute:
+        tier = self.routes.get(turn_class) or next(iter(self.tiers))
+        candidates = [Candidate(spec.model, self._models[spec][1], spec.timeout) for spec in self.tiers[tier]]
+        return ModelRoute(turn_class, tier, candidates)
+
+    def models(self) -> List[Tuple[ModelSpec, Any]]:
+        """Every distinct (spec, chat model), e.g. to open their connections at startup."""
+        return [(spec, llm) for spec, (llm, _) in self._models.items()]
@@ -0,0 +1,301 @@
+# agent/runner.py
+
+from __future__ import annotations
+import json
+import time
+import asyncio
+import logging
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import BaseTool
+
+from observability.tracing import span, KIND_CLIENT
+from observability.metrics import (
+    AGENT_ITERATIONS, LLM_FALLBACKS, LLM_SECONDS, LLM_TOKENS, SCRATCHPAD_TOKENS,
+    TOOL_ERRORS, TOOL_OUTPUT_CHARS, TOOL_SECONDS, TURN_DEADLINES,
+)
+from agent.routing import TIER_DEFAULT, Candidate, ModelRoute, fallback_reason
+from agent.hedging import Hedger
+from agent.compaction import DEFAULT_MAX_CHARS, DEFAULT_OLDER_MAX_CHARS, compact_output, estimate_tokens
+from runtime.deadline import DeadlineExceeded, clamp, deadline, expired
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ITERATIONS = 8
+STOPPED_MESSAGE = "Agent stopped due to iteration limit or time limit."
+OUT_OF_TIME_MESSAGE = ("I'm sorry, this is taking longer than it should. Anything I already did for you is saved; "
+                       "please send your message again in a moment.")
+
+# (conflict group, session id) -> lock. Weak values: a lock disappears once no
+# tool call is holding or waiting on it, so idle sessions cost nothing.
+_conflict_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _conflict_lock(group: str, session_id: str) -> asyncio.Lock:
+    key = (group, session_id)
+    lock = _conflict_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _conflict_locks[key] = lock
+    return lock
+
+
+def _reports_error(content: str) -> bool:
+    # Tools report failures as text rather than raising ("Error: ...", or JSON with "status": "error").
+    head = content.lstrip()[:200].lower()
+    return head.startswith("error") or '"status": "error"' in head
+
+
+class AgentRunner:
+    """
+    Tool-calling agent loop, a drop-in for `AgentExecutor.ainvoke` on the
+    `{"input": ...} -> {"output": ...}` contract with `ConversationBufferMemory`.
+
+    When the model emits several tool calls in one step they run concurrently.
+    Tools that share a conflict group (e.g. the cart tools) are serialized per
+    session in the order the model emitted them, so two writers on the same
+    cart never interleave while unrelated calls still overlap them.
+
+    A turn is bounded by `max_iterations` LLM calls and `time_budget` seconds.
+    Tool results are compacted (agent/compaction.py) before they enter the
+    scratchpad, and results of earlier steps again once the model has seen
+    them, so later calls of the turn do not re-send whole upstream responses.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        tools: Sequence[BaseTool],
+        prompt: ChatPromptTemplate,
+        memory,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS,
+        conflict_groups: Optional[Dict[str, str]] = None,
+        parallel_tool_calls: bool = True,
+        bound_llm=None,
+        route: Optional[ModelRoute] = None,
+        hedger: Optional[Hedger] = None,
+        time_budget: Optional[float] = None,
+        output_fields: Optional[Dict[str, Sequence[str]]] = None,
+        max_output_chars: int = DEFAULT_MAX_CHARS,
+        older_output_chars: int = DEFAULT_OLDER_MAX_CHARS,
+    ) -> None:
+        self.tools_by_name = {t.name: t for t in tools}
+        # With a `route` (agent/routing.py) `llm` is unused: each LLM call goes
+        # to the route's primary model and on a timeout, connection error or
+        # 5xx to its fallbacks in order. Without one, `bound_llm` is
+        # `llm.bind_tools(tools)` built once and shared, which saves converting
+        # every tool schema on each turn.
+        self.route = route
+        if route is not None:
+            self.candidates = list(route.candidates)
+            self.tier = route.tier
+        else:
+            model_name = getattr(llm, "model_name", None) or type(llm).__name__
+            bound = bound_llm if bound_llm is not None else llm.bind_tools(list(tools))
+            self.candidates = [Candidate(model_name, bound, None)]
+            self.tier = TIER_DEFAULT
+        self.model_name = self.candidates[0].model
+        self.llm = self.candidates[0].llm
+        self.hedger = hedger
+        # Where the last run ran out of time ("llm" / "tools"), None if it did not.
+        self.out_of_time: Optional[str] = None
+        self.prompt = prompt
+        self.memory = memory
+        self.max_iterations = max_iterations
+        # Seconds for the whole loop, on top of (and never past) the turn's deadline.
+        self.time_budget = time_budget
+        self.output_fields = output_fields or {}
+        self.max_output_chars = max_output_chars
+        self.older_output_chars = older_output_chars
+        self.conflict_groups = conflict_groups or {}
+        self.parallel_tool_calls = parallel_tool_calls
+        # Per-step timings of the last run, for logging and benchmarks.
+        self.steps: List[Dict[str, Any]] = []
+
+    # ── tool execution ─────────────────────────────────────────────────────
+    async def _invoke_tool(self, call: Dict[str, Any]) -> Tuple[ToolMessage, float]:
+        started = time.perf_counter()
+        tool = self.tools_by_name.get(call["name"])
+        with span(f"tool {call['name']}", **{"tool.name": call["name"]}) as tool_span:
+            if tool is None:
+                content = f"{call['name']} is not a valid tool, try one of [{', '.join(self.tools_by_name)}]."
+                tool_span.fail("unknown tool")
+            else:
+                try:
+                    result = await tool.ainvoke(call["args"])
+                    content = json.dumps(result, default=str) if isinstance(result, (dict, list)) else str(result)
+                except Exception as e:
+                    logger.error(f"Tool {call['name']} raised: {e}", exc_info=True)
+                    content = f"Error: {e}"
+                    tool_span.fail(content)
+        elapsed = time.perf_counter() - started
+        TOOL_SECONDS.labels(call["name"]).observe(elapsed)
+        if tool_span.status_message or _reports_error(content):
+            TOOL_ERRORS.labels(call["name"]).inc()
+        return ToolMessage(content=content, tool_call_id=call["id"], name=call["name"]), elapsed
+
+    async def _run_tool_call(self, call: Dict[str, Any]) -> Tuple[ToolMessage, float]:
+        group = self.conflict_groups.get(call["name"])
+        session_id = (call.get("args") or {}).get("session_id")
+        if group is None or session_id is None:
+            return await self._invoke_tool(call)
+        async with _conflict_lock(group, str(session_id)):
+            return await self._invoke_tool(call)
+
+    async def _run_tool_calls(self, calls: List[Dict[str, Any]]) -> List[Tuple[ToolMessage, float]]:
+        if not self.parallel_tool_calls or len(calls) == 1:
+            return [await self._run_tool_call(call) for call in calls]
+        # Tasks start in emission order, so same-group calls queue on their
+        # lock in the order the model asked for them.
+        return await asyncio.gather(*(self._run_tool_call(call) for call in calls))
+
+    # ── scratchpad ─────────────────────────────────────────────────────────
+    def _compact(self, msg: ToolMessage, max_chars: int) -> ToolMessage:
+        content = msg.content if isinstance(msg.content, str) else str(msg.content)
+        compacted = compact_output(content, self.output_fields.get(msg.name), max_chars)
+        if len(compacted) >= len(content):
+            return msg
+        logger.debug("Compacted %s output from %d to %d chars.", msg.name, len(content), len(compacted))
+        return ToolMessage(content=compacted, tool_call_id=msg.tool_call_id, name=msg.name)
+
+    def _prune(self, scratchpad: List[BaseMessage], start: int) -> None:
+        """Compact the tool results in `scratchpad[start:]` (already seen by the model) to the tighter limit."""
+        for i in range(start, len(scratchpad)):
+            if isinstance(scratchpad[i], ToolMessage):
+                scratchpad[i] = self._compact(scratchpad[i], self.older_output_chars)
+
+    # ── model calls ────────────────────────────────────────────────────────
+    async def _call_llm(self, messages: List[BaseMessage], llm_span) -> Tuple[AIMessage, Candidate]:
+        """
+        Ask the primary model, falling back to the next candidate on timeouts,
+        connection errors and 5xx. Each call is bounded by its tier's timeout
+        and the turn's deadline, and hedged past the model's p95.
+        """
+        for n, candidate in enumerate(self.candidates):
+            if expired():
+                raise DeadlineExceeded(f"Turn deadline passed before calling {candidate.model}.")
+            timeout = clamp(candidate.timeout)
+            try:
+                if self.hedger is not None:
+                    return await self.hedger.call(candidate.model, lambda: candidate.llm.ainvoke(messages), timeout), candidate
+                if timeout:
+                    return await asyncio.wait_for(candidate.llm.ainvoke(messages), timeout), candidate
+                return await candidate.llm.ainvoke(messages), candidate
+            except Exception as e:
+                reason = fallback_reason(e)
+                if reason is None or n == len(self.candidates) - 1 or expired():
+                    raise
+                LLM_FALLBACKS.labels(candidate.model, reason).inc()
+                llm_span.set(**{"llm.fallback_from": candidate.model, "llm.fallback_reason": reason})
+                logger.warning("LLM call to %s failed (%s: %s); falling back to %s.",
+                               candidate.model, reason, e, self.candidates[n + 1].model)
+        raise RuntimeError("No model candidates configured.")
+
+    def _ran_out_of_time(self, stage: str, iteration: int) -> str:
+        TURN_DEADLINES.labels(stage).inc()
+        self.out_of_time = stage
+        logger.warning("Agent turn ran out of time at step %s (%s); answering with an apology.", iteration, stage)
+        return OUT_OF_TIME_MESSAGE
+
+    # ── main loop ──────────────────────────────────────────────────────────
+    async def ainvoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        user_input = inputs["input"]
+        history = self.memory.load_memory_variables({})[self.memory.memory_key]
+        self.steps = []
+        self.out_of_time = None
+        with deadline(self.time_budget):
+            output = await self._loop(user_input, history)
+
+        AGENT_ITERATIONS.observe(len(self.steps))
+        if output is None:
+            logger.warning(f"Agent hit max_iterations ({self.max_iterations}) without a final answer.")
+            output = STOPPED_MESSAGE
+
+        self.memory.save_context({"input": user_input}, {"output": output})
+        return {"input": user_input, "chat_history": history, "output": output}
+
+    async def _loop(self, user_input: str, history: List[BaseMessage]) -> Optional[str]:
+        """Run LLM and tool steps until a final answer (returned), the time runs out, or max_iterations (None)."""
+        scratchpad: List[BaseMessage] = []
+        seen = 0    # scratchpad[:seen] is already pruned to older_output_chars
+        output: Optional[str] = None
+
+        for iteration in range(1, self.max_iterations + 1):
+            if expired():
+                output = self._ran_out_of_time("llm", iteration)
+                break
+            step_started = time.perf_counter()
+            messages = self.prompt.format_messages(
+                input=user_input, chat_history=history, agent_scratchpad=scratchpad
+            )
+            prompt_chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+            scratchpad_tokens = estimate_tokens(scratchpad)
+            SCRATCHPAD_TOKENS.observe(scratchpad_tokens)
+            if scratchpad:
+                logger.info("Agent step %d: scratchpad ~%d tokens in %d messages.", iteration, scratchpad_tokens, len(scratchpad))
+            try:
+                with span("llm", KIND_CLIENT, **{"llm.model": self.model_name, "llm.tier": self.tier, "agent.iteration": iteration,
+                                                 "llm.prompt_messages": len(messages), "llm.prompt_chars": prompt_chars,
+                                                 "llm.scratchpad_tokens": scratchpad_tokens}) as llm_span:
+                    ai, answered = await self._call_llm(messages, llm_span)
+                    usage = getattr(ai, "usage_metadata", None) or {}
+                    llm_span.set(**{
+                        "llm.model": answered.model,
+                        "llm.tool_calls": len(ai.tool_calls),
+                        "llm.input_tokens": usage.get("input_tokens"),
+                        "llm.output_tokens": usage.get("output_tokens"),
+                    })
+            except (asyncio.TimeoutError, DeadlineExceeded):
+                # Every candidate timed out or the turn's deadline passed.
+                output = self._ran_out_of_time("llm", iteration)
+                break
+            # Wall time of the step's model call(s), failed attempts included,
+            # under the model that answered.
+            llm_elapsed = time.perf_counter() - step_started
+            LLM_SECONDS.labels(answered.model, self.tier).observe(llm_elapsed)
+            if usage:
+                LLM_TOKENS.labels(answered.model, self.tier, "prompt").inc(usage.get("input_tokens", 0))
+                LLM_TOKENS.labels(answered.model, self.tier, "completion").inc(usage.get("output_tokens", 0))
+
+            if not ai.tool_calls:
+                output = ai.content if isinstance(ai.content, str) else str(ai.content)
+                self.steps.append({"iteration": iteration, "llm_s": llm_elapsed, "tools": [], "wall_s": llm_elapsed,
+                                   "scratchpad_tokens": scratchpad_tokens})
+                break
+
+            if expired():
+                output = self._ran_out_of_time("tools", iteration)
+                break
+            names = [c["name"] for c in ai.tool_calls]
+            logger.info(f"Agent step {iteration}: running {len(names)} tool call(s): {names}")
+            results = await self._run_tool_calls(ai.tool_calls)
+            # The model has now seen every earlier result in full; from here on
+            # they are carried at the tighter limit.
+            self._prune(scratchpad, seen)
+            seen = len(scratchpad)
+            scratchpad.append(ai)
+            for msg, _ in results:
+                compacted = self._compact(msg, self.max_output_chars)
+                TOOL_OUTPUT_CHARS.labels(msg.name, "raw").inc(len(msg.content))
+                TOOL_OUTPUT_CHARS.labels(msg.name, "compacted").inc(len(compacted.content))
+                scratchpad.append(compacted)
+
+            wall = time.perf_counter() - step_started
+            self.steps.append({
+                "iteration": iteration,
+                "llm_s": llm_elapsed,
+                "tools": [(msg.name, elapsed) for msg, elapsed in results],
+                "wall_s": wall,
+                "scratchpad_tokens": scratchpad_tokens,
+            })
+
+            # Same rule as AgentExecutor: a lone return_direct tool ends the turn.
+            if len(results) == 1:
+                tool = self.tools_by_name.get(results[0][0].name)
+                if tool is not None and tool.return_direct:
+                    output = results[0][0].content
+                    break
+        return output
@@ -0,0 +1,210 @@
+# bench/e2e.py
+"""
+Offline end-to-end benchmark: the real app served by uvicorn, a scripted
+model (bench.scenarios) instead of OpenAI, and local fakes (bench.fakes)
+instead of QuickBooks, FedEx, PayPal and Stripe. Each simulated customer
+opens /ws/{session_id} (answering heartbeats like the frontend), plays one
+scenario over POST /chat and, at checkout, completes payment through the
+WebSocket. Reports throughput and p50/p95/p99 per turn and per tool.
+
+Needs the app's requirements plus a WebSocket client (`websockets`, which
+uvicorn[standard] installs). Run from backend/:
+    python -m bench.e2e --sessions 40 --concurrency 10 --llm-latency 0.3 \\
+        --scenarios browse,guest_checkout,returning_customer,profile_save
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench.fakes import FakeUpstreams
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else float("nan")
+
+
+def prepare_env(fakes: FakeUpstreams, workdir: Path) -> None:
+    """Point the app at the fakes and at throwaway state; must run before `main` is imported."""
+    far = int(time.time()) + 86400
+    tokens = {p: {"access_token": f"{p}-bench", "refresh_token": "bench", "access_expires_at": far, "refresh_expires_at": far}
+              for p in ("quickbooks", "paypal")}
+    tokens_file = workdir / "tokens.json"
+    tokens_file.write_text(json.dumps(tokens), encoding="utf-8")
+    os.environ.update(fakes.env())
+    os.environ.update({
+        "OPENAI_API_KEY": "bench-not-used",
+        "TOKENS_FILE": str(tokens_file),
+        "ORDERS_DB_PATH": str(workdir / "orders.db"),
+        "INVOICE_PDF_CACHE_DIR": str(workdir / "invoices"),
+        "TRUSTED_PROXY_HOPS": "1",     # customers are told apart by X-Forwarded-For
+    })
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Customer:
+    """One simulated browser tab: a WebSocket plus chat requests for one session."""
+
+    def __init__(self, base_url: str, ws_url: str, session_id: str, client_ip: str, fakes: FakeUpstreams) -> None:
+        self.base_url = base_url
+        self.client_ip = client_ip
+        self.ws_url = ws_url
+        self.session_id = session_id
+        self.fakes = fakes
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.turns: List[Tuple[str, float, bool]] = []
+
+    async def _read(self, ws) -> None:
+        async for raw in ws:
+            event = json.loads(raw)
+            if event.get("type") == "ping":
+                await ws.send(json.dumps({"event": "pong"}))
+            else:
+                await self.events.put(event)
+
+    async def _wait_for(self, event_type: str, timeout: float = 60.0) -> Dict[str, Any]:
+        deadline = time.perf_counter() + timeout
+        while True:
+            event = await asyncio.wait_for(self.events.get(), timeout=max(deadline - time.perf_counter(), 0.01))
+            if event.get("type") == event_type:
+                return event
+
+    async def run(self, client, turns: List[Any]) -> None:
+        import websockets
+        from bench.scenarios import PAY, tag
+
+        async with websockets.connect(f"{self.ws_url}/ws/{self.session_id}") as ws:
+            reader = asyncio.create_task(self._read(ws))
+            try:
+                for turn in turns:
+                    started = time.perf_counter()
+                    if turn == PAY:
+                        intent = await self._wait_for("payment_intent_created")
+                        self.fakes.pay(intent["client_secret"].split("_secret_")[0])
+                        await ws.send(json.dumps({"event": "payment_complete"}))
+                        event = await self._wait_for("agent_message")
+                        ok = "Tracking ID" in event.get("ai_message", "")
+                        self.turns.append(("payment_complete (ws)", time.perf_counter() - started, ok))
+                        continue
+                    resp = await client.post(
+                        f"{self.base_url}/chat",
+                        json={"message": tag(self.session_id, turn.text), "session_id": self.session_id},
+                        headers={"X-Forwarded-For": self.client_ip},
+                    )
+                    ok = resp.status_code == 200 and resp.json().get("response") == turn.reply
+                    self.turns.append((turn.label, time.perf_counter() - started, ok))
+            finally:
+                reader.cancel()
+
+
+async def run(args: argparse.Namespace, fakes: FakeUpstreams) -> None:
+    import httpx
+    import uvicorn
+    import main
+    from bench.fake_llm import ScriptedChatModel
+    from bench.scenarios import SCENARIOS, play
+
+    main.build_llm = lambda **_: ScriptedChatModel(script=play, latency=args.llm_latency)
+    runners = []
+    create_agent = main.create_agent
+    def recording_create_agent(*args, **kwargs):
+        runner = create_agent(*args, **kwargs)
+        runners.append(runner)
+        return runner
+    main.create_agent = recording_create_agent
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    limit = asyncio.Semaphore(args.concurrency)
+    customers: List[Tuple[str, Customer]] = []
+    errors: List[str] = []
+
+    async def one(client, n: int) -> None:
+        scenario = names[n % len(names)]
+        customer = Customer(f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}", f"bench-{scenario}-{n}",
+                            f"10.1.{n // 250}.{n % 250}", fakes)
+        async with limit:
+            try:
+                await customer.run(client, SCENARIOS[scenario])
+            except Exception as e:
+                errors.append(f"{customer.session_id}: {e!r}")
+        customers.append((scenario, customer))
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        await asyncio.gather(*(one(client, n) for n in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    await serving
+
+    by_turn: Dict[str, List[float]] = {}
+    failed: Dict[str, int] = {}
+    for _, customer in customers:
+        for label, seconds, ok in customer.turns:
+            by_turn.setdefault(label, []).append(seconds)
+            failed[label] = failed.get(label, 0) + (not ok)
+    by_tool: Dict[str, List[float]] = {}
+    for runner in runners:
+        for step in runner.steps:
+            for name, seconds in step["tools"]:
+                by_tool.setdefault(name, []).append(seconds)
+
+    turns = sum(len(v) for v in by_turn.values())
+    print(f"\n{args.sessions} sessions, concurrency {args.concurrency}, {elapsed:.1f}s: "
+          f"{turns / elapsed:.1f} turns/s, {args.sessions / elapsed:.2f} sessions/s")
+    header = f"{'':<28} {'n':>5} {'failed':>7} " + " ".join(f"{'p%d ms' % p:>9}" for p in PERCENTILES)
+    for title, table in (("per turn", by_turn), ("per tool", by_tool)):
+        print(f"\n{title}\n{header}")
+        for label, samples in sorted(table.items()):
+            cells = " ".join(f"{percentile(samples, p) * 1000:>9.0f}" for p in PERCENTILES)
+            print(f"{label:<28} {len(samples):>5} {failed.get(label, 0) if table is by_turn else '':>7} {cells}")
+    print(f"\nupstream requests: {dict(sorted(fakes.requests.items()))}")
+    for line in errors[:10]:
+        print(f"error: {line}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=40, help="customers to simulate")
+    parser.add_argument("--concurrency", type=int, default=10, help="customers active at once")
+    parser.add_argument("--scenarios", default="browse,guest_checkout,returning_customer,profile_save")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per fake model call")
+    for provider in ("quickbooks", "fedex", "paypal", "stripe"):
+        parser.add_argument(f"--{provider}-latency", type=float, default=None, help=f"seconds per fake {provider} request")
+    args = parser.parse_args()
+
+    latency = {p: getattr(args, f"{p}_latency") for p in ("quickbooks", "fedex", "paypal", "stripe")}
+    with tempfile.TemporaryDirectory(prefix="chai-bench-") as workdir, \
+            FakeUpstreams(latency={k: v for k, v in latency.items() if v is not None}) as fakes:
+        prepare_env(fakes, Path(workdir))
+        logging.disable(logging.WARNING)  # keep the report readable; failures are counted per turn
+        asyncio.run(run(args, fakes))
+
+
+if __name__ == "__main__":
+    main_cli()
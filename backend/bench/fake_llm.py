@@ -0,0 +1,73 @@
+# bench/fake_llm.py
+
+from __future__ import annotations
+import time
+import asyncio
+import itertools
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_call_ids = itertools.count(1)
+
+# A step is either the final answer text or a list of (tool name, args) pairs.
+Step = Union[str, Sequence[tuple]]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI. `script` maps the prompt messages
+    to the AIMessage the "model" answers with; `latency` simulates the
+    round trip. `bind_tools` is a no-op because the script already knows
+    which tools exist.
+    """
+
+    script: Callable[[List[BaseMessage]], AIMessage]
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.script(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.script(messages))])
+
+
+def tool_call(name: str, **args: Any) -> Dict[str, Any]:
+    return {"name": name, "args": args, "id": f"call_{next(_call_ids)}", "type": "tool_call"}
+
+
+def tool_rounds(messages: List[BaseMessage]) -> int:
+    """Tool-calling rounds already taken in the current turn (since the last human message)."""
+    rounds = 0
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            break
+        if isinstance(m, AIMessage) and m.tool_calls:
+            rounds += 1
+    return rounds
+
+
+def answer(step: Step) -> AIMessage:
+    if isinstance(step, str):
+        return AIMessage(content=step)
+    return AIMessage(content="", tool_calls=[tool_call(name, **args) for name, args in step])
+
+
+def steps(*script: Step) -> Callable[[List[BaseMessage]], AIMessage]:
+    """Script that plays `script[i]` on the i-th round of every turn, repeating the last step."""
+    def play(messages: List[BaseMessage]) -> AIMessage:
+        return answer(script[min(tool_rounds(messages), len(script) - 1)])
+    return play
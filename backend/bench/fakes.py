@@ -0,0 +1,249 @@
+# bench/fakes.py
+"""
+Local stand-ins for the upstream APIs the tools call, served from one
+threaded HTTP server: QuickBooks (query, customer, invoice, invoice PDF),
+FedEx (OAuth token, ship), PayPal (create/capture order) and Stripe
+(checkout sessions). Each provider answers after a configurable latency, so
+the app can be benchmarked end-to-end without credentials or network.
+
+Point the app at it with `FakeUpstreams.env()` before importing `main`.
+"""
+
+from __future__ import annotations
+import json
+import time
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+REALM_ID = "bench-realm"
+RETURNING_CUSTOMER = "Jane Doe"
+
+DEFAULT_LATENCY = {"quickbooks": 0.25, "fedex": 0.4, "paypal": 0.3, "stripe": 0.2}
+
+
+def _provider(path: str) -> str:
+    if path.startswith("/v3/"):
+        return "quickbooks"
+    if path.startswith(("/oauth/", "/ship/")):
+        return "fedex"
+    if path.startswith("/v2/checkout/"):
+        return "paypal"
+    return "stripe"
+
+
+class FakeUpstreams:
+    """
+    In-memory state of every fake provider plus the server thread. Use as a
+    context manager, or call `start()` / `stop()`. `pay(checkout_id)` plays
+    the customer completing the Stripe form.
+    """
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, pdf_bytes: int = 48_000,
+                 host: str = "127.0.0.1", port: int = 0) -> None:
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.pdf = b"%PDF-1.4\n" + b"0" * max(pdf_bytes - 9, 0)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(100)
+        self.customers: Dict[str, Dict[str, Any]] = {
+            "58": {"Id": "58", "DisplayName": RETURNING_CUSTOMER, "SyncToken": "0"},
+        }
+        self.invoices: Dict[str, Dict[str, Any]] = {}
+        self.invoice_requests: Dict[str, str] = {}      # QuickBooks requestid -> invoice id
+        self.checkouts: Dict[str, Dict[str, Any]] = {}
+        self.checkout_keys: Dict[str, str] = {}         # Stripe Idempotency-Key -> checkout id
+        self.paypal_orders: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {}
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    # ── lifecycle ──────────────────────────────────────────────────────────
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app's clients at this server."""
+        return {
+            "QB_BASE_URL": self.base_url,
+            "QB_REALM_ID": REALM_ID,
+            "FEDEX_BASE_URL": self.base_url,
+            "FEDEX_CLIENT_ID": "bench",
+            "FEDEX_CLIENT_SECRET": "bench",
+            "FEDEX_ACCOUNT_NUMBER": "000000000",
+            "PAYPAL_API_BASE": self.base_url,
+            "STRIPE_API_BASE": self.base_url,
+            "STRIPE_SECRET_KEY": "sk_test_bench",
+        }
+
+    def start(self) -> "FakeUpstreams":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeUpstreams":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # ── test hooks ─────────────────────────────────────────────────────────
+    def pay(self, checkout_id: str) -> None:
+        with self._lock:
+            checkout = self.checkouts[checkout_id]
+            checkout.update(payment_status="paid", status="complete")
+
+    def _next_id(self) -> str:
+        return str(next(self._ids))
+
+    # ── QuickBooks ─────────────────────────────────────────────────────────
+    def qbo(self, method: str, parts: list, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Any]:
+        # parts: ["v3", "company", realm, resource, ...]
+        resource, rest = parts[3], parts[4:]
+        with self._lock:
+            if resource == "query":
+                return 200, {"QueryResponse": {"Customer": self._query_customers(query.get("query", ""))}}
+            if resource == "customer" and method == "GET":
+                customer = self.customers.get(rest[0])
+                return (200, {"Customer": customer}) if customer else (404, {"Fault": "not found"})
+            if resource == "customer":
+                if body.get("sparse") and body.get("Id") in self.customers:
+                    customer = self.customers[body["Id"]]
+                    customer.update({k: v for k, v in body.items() if k not in ("sparse", "SyncToken")})
+                    customer["SyncToken"] = str(int(customer["SyncToken"]) + 1)
+                else:
+                    cid = self._next_id()
+                    customer = self.customers[cid] = dict(body, Id=cid, SyncToken="0")
+                return 200, {"Customer": customer}
+            if resource == "invoice" and method == "POST":
+                invoice_id = self.invoice_requests.get(query.get("requestid", ""))
+                if invoice_id is None:
+                    invoice_id = self._next_id()
+                    self.invoices[invoice_id] = {
+                        "Id": invoice_id, "DocNumber": f"B{invoice_id}", "SyncToken": "0",
+                        "Line": body.get("Line", []), "CustomerRef": body.get("CustomerRef"),
+                    }
+                    if query.get("requestid"):
+                        self.invoice_requests[query["requestid"]] = invoice_id
+                return 200, {"Invoice": self.invoices[invoice_id]}
+            if resource == "invoice":
+                invoice = self.invoices.get(rest[0])
+                if invoice is None:
+                    return 404, {"Fault": "not found"}
+                if rest[1:] == ["pdf"]:
+                    return 200, self.pdf
+                return 200, {"Invoice": invoice}
+        return 404, {"Fault": f"unknown resource {resource}"}
+
+    def _query_customers(self, q: str) -> list:
+        if "LIKE '%" in q:
+            fragment = q.split("LIKE '%", 1)[1].split("%'", 1)[0].replace("''", "'").lower()
+            return [c for c in self.customers.values() if fragment in c.get("DisplayName", "").lower()]
+        if "DisplayName = '" in q:
+            name = q.split("DisplayName = '", 1)[1].rsplit("'", 1)[0].replace("''", "'")
+            return [c for c in self.customers.values() if c.get("DisplayName") == name]
+        return list(self.customers.values())
+
+    # ── FedEx ──────────────────────────────────────────────────────────────
+    def fedex(self, path: str) -> Tuple[int, Any]:
+        if path == "/oauth/token":
+            return 200, {"access_token": "fedex-bench-token", "token_type": "bearer", "expires_in": 3600}
+        tracking = f"7949{self._next_id()}"
+        return 200, {"output": {"transactionShipments": [{
+            "masterTrackingNumber": tracking,
+            "pieceResponses": [{"packageDocuments": [{"url": f"{self.base_url}/labels/{tracking}.pdf"}]}],
+        }]}}
+
+    # ── PayPal ─────────────────────────────────────────────────────────────
+    def paypal(self, parts: list) -> Tuple[int, Any]:
+        with self._lock:
+            if parts[-1] == "capture":
+                order = self.paypal_orders.get(parts[-2])
+                if order is None:
+                    return 404, {"name": "RESOURCE_NOT_FOUND"}
+                order["status"] = "COMPLETED"
+                return 201, order
+            oid = f"PAY{self._next_id()}"
+            order = self.paypal_orders[oid] = {
+                "id": oid, "status": "CREATED",
+                "links": [{"rel": "approve", "href": f"{self.base_url}/paypal/approve/{oid}"}],
+            }
+            return 201, order
+
+    # ── Stripe ─────────────────────────────────────────────────────────────
+    def stripe(self, method: str, parts: list, idempotency_key: str) -> Tuple[int, Any]:
+        # parts: ["v1", "checkout", "sessions", id?]
+        with self._lock:
+            if method == "GET":
+                checkout = self.checkouts.get(parts[3])
+                if checkout is None:
+                    return 404, {"error": {"type": "invalid_request_error", "message": "No such checkout.session"}}
+                return 200, checkout
+            cid = self.checkout_keys.get(idempotency_key)
+            if cid is None:
+                cid = f"cs_test_bench_{self._next_id()}"
+                self.checkouts[cid] = {
+                    "id": cid, "object": "checkout.session", "client_secret": f"{cid}_secret_bench",
+                    "status": "open", "payment_status": "unpaid", "url": None,
+                }
+                if idempotency_key:
+                    self.checkout_keys[idempotency_key] = cid
+            return 200, self.checkouts[cid]
+
+
+def _handler_for(fakes: FakeUpstreams):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, so client connection pools are exercised
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _dispatch(self, method: str) -> None:
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            body: Dict[str, Any] = {}
+            if raw and "json" in (self.headers.get("Content-Type") or ""):
+                body = json.loads(raw)
+
+            provider = _provider(url.path)
+            time.sleep(fakes.latency.get(provider, 0.0))
+            parts = [p for p in url.path.split("/") if p]
+            if provider == "quickbooks":
+                status, payload = fakes.qbo(method, parts, query, body)
+            elif provider == "fedex":
+                status, payload = fakes.fedex(url.path)
+            elif provider == "paypal":
+                status, payload = fakes.paypal(parts)
+            else:
+                status, payload = fakes.stripe(method, parts, self.headers.get("Idempotency-Key", ""))
+            with fakes._lock:
+                key = f"{method} {provider}"
+                fakes.requests[key] = fakes.requests.get(key, 0) + 1
+
+            if isinstance(payload, bytes):
+                data, content_type = payload, "application/pdf"
+            else:
+                data, content_type = json.dumps(payload).encode(), "application/json"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            self._dispatch("GET")
+
+        def do_POST(self) -> None:
+            self._dispatch("POST")
+
+    return Handler
@@ -0,0 +1,77 @@
+# bench/hedging.py
+"""
+Tail latency of LLM calls with and without hedging (agent/hedging.py), against
+a simulated model: most calls take `--fast-ms` (uniform ±50%), a `--tail`
+share take `--slow-ms`. Reports p50/p95/p99, the extra requests sent and how
+often the duplicate won.
+
+Run from backend/:
+    python -m bench.hedging --calls 2000 --tail 0.03 --slow-ms 20000 --fast-ms 1500 --speedup 100
+"""
+
+from __future__ import annotations
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from agent.hedging import Hedger
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def run(hedger: Hedger, args: argparse.Namespace, rng: random.Random) -> Dict[str, float]:
+    counts = {"requests": 0, "cancelled": 0}
+    scale = 1 / 1000 / args.speedup
+
+    async def call() -> None:
+        counts["requests"] += 1
+        ms = args.slow_ms if rng.random() < args.tail else args.fast_ms * rng.uniform(0.5, 1.5)
+        try:
+            await asyncio.sleep(ms * scale)
+        except asyncio.CancelledError:
+            counts["cancelled"] += 1
+            raise
+
+    latencies = []
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        await hedger.call("bench-model", call, timeout=args.timeout_ms * scale)
+        latencies.append((time.perf_counter() - started) / scale)
+    return {
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        "extra": counts["requests"] / args.calls - 1, "cancelled": counts["cancelled"],
+    }
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--tail", type=float, default=0.03, help="share of calls that are slow")
+    parser.add_argument("--fast-ms", type=float, default=1500)
+    parser.add_argument("--slow-ms", type=float, default=20000)
+    parser.add_argument("--timeout-ms", type=float, default=45000)
+    parser.add_argument("--max-rate", type=float, default=0.1, help="LLM_HEDGE_MAX_RATE")
+    parser.add_argument("--speedup", type=float, default=100, help="run simulated time this much faster")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'extra req':>10} {'cancelled':>10}")
+    for label, hedger in (
+        ("single", Hedger(enabled=False)),
+        ("hedged", Hedger(max_rate=args.max_rate, min_delay=args.fast_ms / 1000 / args.speedup)),
+    ):
+        r = asyncio.run(run(hedger, args, random.Random(args.seed)))
+        print(f"{label:<10} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['p99']:>8.0f} {r['extra']:>9.1%} {r['cancelled']:>10}")
+
+
+if __name__ == "__main__":
+    main_cli()
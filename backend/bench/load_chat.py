@@ -0,0 +1,137 @@
+# bench/load_chat.py
+"""
+Open-loop load test of POST /chat with and without admission control. The
+real app runs in-process (httpx ASGI transport) with a scripted model whose
+upstream only serves `--upstream-capacity` calls at once, like a rate-limited
+LLM API: past that, latency grows with the backlog unless excess turns are
+shed. Reports latency percentiles of served turns (all / checkout sessions)
+and how many requests got 429/503.
+
+Run from backend/:
+    python -m bench.load_chat --rate 60 --duration 20 --upstream-capacity 8 --latency 0.25
+"""
+
+from __future__ import annotations
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("OPENAI_API_KEY", "bench-not-used")  # main refuses to import without one
+os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")  # simulated clients are told apart by X-Forwarded-For
+
+import httpx
+
+import main
+from runtime import admission
+from orders.pipeline import get_order_pipeline, INVOICED
+from bench.fake_llm import ScriptedChatModel, steps
+
+logging.disable(logging.WARNING)  # one line per request (and per shed) would drown the report
+
+
+class CongestedChatModel(ScriptedChatModel):
+    """Scripted model behind an upstream that serves at most `upstream` (a semaphore) calls at a time."""
+
+    upstream: Any = None
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        async with self.upstream:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def run(label: str, controller: admission.AdmissionController, args: argparse.Namespace) -> Dict[str, Any]:
+    admission._controller = controller
+    upstream = asyncio.Semaphore(args.upstream_capacity)
+    main.build_llm = lambda **_: CongestedChatModel(script=steps("Here is our tea menu."), latency=args.latency, upstream=upstream)
+
+    pipeline = get_order_pipeline()
+    rng = random.Random(args.seed)
+    results: List[Dict[str, Any]] = []
+
+    async def one(client: httpx.AsyncClient, n: int) -> None:
+        session_id = f"{label}-{n}"
+        checkout = rng.random() < args.checkout_share
+        if checkout:
+            # Seed the pipeline cache so admission sees an invoiced order.
+            pipeline._cache({"session_id": session_id, "state": INVOICED})
+        started = time.perf_counter()
+        resp = await client.post(
+            "/chat",
+            json={"message": "show me the menu", "session_id": session_id},
+            headers={"X-Forwarded-For": f"10.0.0.{n % args.clients}"},
+        )
+        results.append({"status": resp.status_code, "latency": time.perf_counter() - started, "checkout": checkout})
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        pending = []
+        deadline = time.perf_counter() + args.duration
+        n = 0
+        while time.perf_counter() < deadline:
+            pending.append(asyncio.create_task(one(client, n)))
+            n += 1
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*pending)
+
+    served = [r["latency"] for r in results if r["status"] == 200]
+    served_checkout = [r["latency"] for r in results if r["status"] == 200 and r["checkout"]]
+    return {
+        "label": label,
+        "sent": len(results),
+        "ok": len(served),
+        "429": sum(r["status"] == 429 for r in results),
+        "503": sum(r["status"] == 503 for r in results),
+        "p50": percentile(served, 50),
+        "p95": percentile(served, 95),
+        "p99": percentile(served, 99),
+        "checkout_p99": percentile(served_checkout, 99),
+        "stats": controller.stats(),
+    }
+
+
+async def main_async() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=60.0, help="arrivals per second (open loop)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of arrivals per run")
+    parser.add_argument("--latency", type=float, default=0.25, help="seconds per model call once upstream admits it")
+    parser.add_argument("--upstream-capacity", type=int, default=8, help="model calls the upstream serves at once")
+    parser.add_argument("--clients", type=int, default=50, help="distinct client addresses")
+    parser.add_argument("--checkout-share", type=float, default=0.1, help="fraction of sessions already in checkout")
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--max-wait", type=float, default=2.0)
+    parser.add_argument("--per-client", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    unlimited = 10 ** 9
+    runs = [
+        await run("no-admission", admission.AdmissionController(unlimited, unlimited, float(unlimited), unlimited), args),
+        await run("admission", admission.AdmissionController(args.max_concurrent, args.max_queue, args.max_wait, args.per_client), args),
+    ]
+
+    print(f"\n{'run':<14} {'sent':>6} {'ok':>6} {'429':>5} {'503':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'checkout p99':>13}")
+    for r in runs:
+        print(f"{r['label']:<14} {r['sent']:>6} {r['ok']:>6} {r['429']:>5} {r['503']:>5} "
+              f"{r['p50'] * 1000:>9.0f} {r['p95'] * 1000:>9.0f} {r['p99'] * 1000:>9.0f} {r['checkout_p99'] * 1000:>13.0f}")
+    print(f"\nadmission stats: {runs[-1]['stats']}")
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    asyncio.run(main_async())
+    print(f"\nfinished in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,133 @@
+# bench/logging_overhead.py
+"""
+Per-request logging cost on the calling thread (the event loop, in the app).
+One "request" replays the log calls of a typical cart turn: session lookups
+at DEBUG, cart mutations and tool results at INFO, and a cart dump at DEBUG,
+with the level at INFO. Compares:
+
+  sync text, f-strings   the old setup: basicConfig to a stream, eager f-strings
+  queue json, f-strings  observability.logs pipeline, messages still eager
+  queue json, lazy       observability.logs pipeline, %-style arguments
+
+Also reports how long the writer thread takes to drain what was queued.
+Output goes to a temp file (or --output); `--sink-delay-us` makes every flush
+block for that long (releasing the GIL), like stdout piped to a busy log
+shipper or a terminal.
+
+Run from backend/:
+    python -m bench.logging_overhead --requests 20000 --sink-delay-us 100
+"""
+
+from __future__ import annotations
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from observability import logs
+from observability.logs import TEXT_FORMAT, configure_logging, logging_stats, stop_logging
+from observability.tracing import get_tracer
+
+logger = logging.getLogger("bench.cart")
+
+CART: Dict[str, int] = {"Masala Chai": 2, "Ginger Chai": 1, "Elaichi Chai": 3}
+
+
+def request_eager(session_id: str) -> None:
+    for _ in range(4):
+        logger.debug(f"Attempting to get state for session_id: {session_id}")
+    logger.info(f"Setting customer for session_id: {session_id} to customer_id: 58")
+    logger.debug(f"Adding 2 of 'masala chai' to cart for session_id: {session_id}")
+    logger.info(f"Successfully added 'masala chai'. New quantity is: {CART['Masala Chai']}")
+    logger.debug(f"Current cart state for '{session_id}': {dict(CART)}")
+    logger.info(f"Cart contents for session '{session_id}': {', '.join(f'{q} x {i}' for i, q in CART.items())}")
+    logger.info(f"Agent step 1: running 2 tool call(s): {['view_cart', 'add_to_cart']}")
+
+
+def request_lazy(session_id: str) -> None:
+    for _ in range(4):
+        logger.debug("Attempting to get state for session_id: %s", session_id)
+    logger.info("Setting customer for session_id: %s to customer_id: %s", session_id, 58)
+    logger.debug("Adding %s of '%s' to cart for session_id: %s", 2, "masala chai", session_id)
+    logger.info("Successfully added '%s'. New quantity is: %s", "masala chai", CART["Masala Chai"])
+    logger.debug("Current cart state for '%s': %s", session_id, CART)
+    logger.info("Cart contents for session '%s': %s", session_id, CART)
+    logger.info("Agent step %s: running %s tool call(s): %s", 1, 2, ["view_cart", "add_to_cart"])
+
+
+class SlowStream:
+    """File stream whose flush blocks for `delay` seconds, like a write to a congested pipe."""
+
+    def __init__(self, stream, delay: float) -> None:
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def measure(request: Callable[[str], None], requests: int) -> float:
+    """Caller-side microseconds per request, each inside a traced turn like /chat."""
+    tracer = get_tracer()
+    started = time.perf_counter()
+    for n in range(requests):
+        with tracer.turn(f"bench-{n % 100}"):
+            request(f"bench-{n % 100}")
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def run_sync(request: Callable[[str], None], requests: int, output: Path, delay: float) -> float:
+    root = logging.getLogger()
+    with open(output, "w", encoding="utf-8") as stream:
+        handler = logging.StreamHandler(SlowStream(stream, delay))
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.handlers[:] = [handler]
+        root.setLevel(logging.INFO)
+        return measure(request, requests)
+
+
+def run_queued(request: Callable[[str], None], requests: int, output: Path, delay: float, rate: float):
+    with open(output, "w", encoding="utf-8") as stream:
+        configure_logging(level="INFO", fmt="json", rate_per_site=rate, stream=SlowStream(stream, delay))
+        caller_us = measure(request, requests)
+        stats = logging_stats()
+        started = time.perf_counter()
+        stop_logging()
+        drain_ms = (time.perf_counter() - started) * 1000
+    logs._handler = logs._rate_limit = None
+    return caller_us, drain_ms, stats
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rate-per-site", type=float, default=0,
+                        help="LOG_RATE_PER_SITE for the queued runs (0 = no sampling, to compare like with like)")
+    parser.add_argument("--sink-delay-us", type=float, default=0, help="blocking time per flush of the log stream")
+    parser.add_argument("--output", default=None, help="file to write log lines to (default: a temp file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="chai-logbench-") as tmp:
+        output = Path(args.output or Path(tmp) / "bench.log")
+        delay = args.sink_delay_us / 1e6
+        sync_us = run_sync(request_eager, args.requests, output, delay)
+        print(f"{'':<24} {'µs/request':>11} {'drain ms':>9} {'dropped':>8}")
+        print(f"{'sync text, f-strings':<24} {sync_us:>11.1f} {'-':>9} {'-':>8}")
+        for label, request in (("queue json, f-strings", request_eager), ("queue json, lazy", request_lazy)):
+            caller_us, drain_ms, stats = run_queued(request, args.requests, output, delay, args.rate_per_site)
+            dropped = stats["dropped_queue_full"] + stats["dropped_rate_limited"]
+            print(f"{label:<24} {caller_us:>11.1f} {drain_ms:>9.0f} {dropped:>8}")
+
+
+if __name__ == "__main__":
+    main_cli()
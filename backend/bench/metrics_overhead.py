@@ -0,0 +1,86 @@
+# bench/metrics_overhead.py
+"""
+Cost of one metrics observation on the hot path: histogram observe and
+counter inc with labels (as the runner, HTTP clients and middleware do), from
+one thread and from several at once, plus the cost of rendering a scrape.
+
+Run from backend/:
+    python -m bench.metrics_overhead --iterations 200000 --threads 8
+"""
+
+from __future__ import annotations
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from observability.metrics import Registry
+
+
+def per_call_us(fn: Callable[[], None], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def baseline_us(iterations: int) -> float:
+    def noop() -> None:
+        pass
+    return per_call_us(noop, iterations)
+
+
+def threaded_us(fn: Callable[[], None], iterations: int, threads: int) -> float:
+    """Wall time per observation with `threads` threads observing the same series."""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker() -> None:
+        barrier.wait()
+        for _ in range(iterations):
+            fn()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for w in workers:
+        w.join()
+    return (time.perf_counter() - started) / (iterations * threads) * 1e6
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000, help="observations per measurement")
+    parser.add_argument("--threads", type=int, default=8, help="threads for the contended measurement")
+    args = parser.parse_args()
+
+    registry = Registry()
+    latency = registry.histogram("bench_seconds", "Latency.", ("tool",))
+    errors = registry.counter("bench_errors", "Errors.", ("tool",))
+    for n in range(50):   # a realistic number of series to look up among
+        latency.labels(f"tool_{n}").observe(0.01 * n)
+        errors.labels(f"tool_{n}").inc()
+
+    base = baseline_us(args.iterations)
+    cases = {
+        "histogram.labels().observe": lambda: latency.labels("tool_7").observe(0.042),
+        "counter.labels().inc": lambda: errors.labels("tool_7").inc(),
+    }
+    print(f"{'':<30} {'1 thread µs':>12} {f'{args.threads} threads µs':>14}")
+    for name, fn in cases.items():
+        single = per_call_us(fn, args.iterations) - base
+        contended = threaded_us(fn, args.iterations // args.threads, args.threads)
+        print(f"{name:<30} {single:>12.3f} {contended:>14.3f}")
+
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"\nrender(): {(time.perf_counter() - started) * 1000:.2f} ms for {text.count(chr(10))} lines")
+
+
+if __name__ == "__main__":
+    main_cli()
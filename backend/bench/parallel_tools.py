@@ -0,0 +1,120 @@
+# bench/parallel_tools.py
+"""
+Wall-clock saved per multi-call agent step when independent tool calls run
+concurrently. Uses the real AgentRunner with a scripted model and latency-
+simulating stand-ins for the tools, so no API keys are needed.
+
+Run from backend/:
+    python -m bench.parallel_tools --repeat 20 --qbo-latency 0.35 --local-latency 0.01
+"""
+
+from __future__ import annotations
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import tool
+
+from agent.runner import AgentRunner
+from bench.fake_llm import ScriptedChatModel, steps
+
+SESSION = "bench-session"
+
+SCENARIOS = {
+    "view_cart + get_products": [("view_cart", {"session_id": SESSION}), ("get_products", {})],
+    "validate_customer + get_products": [
+        ("validate_customer_tool", {"session_id": SESSION, "input": "Jane Doe"}),
+        ("get_products", {}),
+    ],
+    "2x add_to_cart + get_products (cart serialized)": [
+        ("add_to_cart", {"session_id": SESSION, "item_name": "masala chai", "quantity": 1}),
+        ("add_to_cart", {"session_id": SESSION, "item_name": "ginger chai", "quantity": 2}),
+        ("get_products", {}),
+    ],
+}
+
+
+def build_tools(qbo_latency: float, local_latency: float):
+    @tool
+    async def view_cart(session_id: str) -> str:
+        """View cart."""
+        await asyncio.sleep(local_latency)
+        return "The cart is currently empty."
+
+    @tool
+    async def add_to_cart(session_id: str, item_name: str, quantity: int) -> str:
+        """Add to cart."""
+        await asyncio.sleep(local_latency)
+        return f"Added {quantity} x {item_name} to the cart."
+
+    @tool
+    async def get_products() -> str:
+        """List products."""
+        await asyncio.sleep(local_latency)
+        return "masala chai - $20.00, ginger chai - $15.00"
+
+    @tool
+    async def validate_customer_tool(session_id: str, input: str) -> str:
+        """Validate customer (QuickBooks round trip)."""
+        await asyncio.sleep(qbo_latency)
+        return '{"status": "found", "name": "Jane Doe", "id": "58"}'
+
+    return [view_cart, add_to_cart, get_products, validate_customer_tool]
+
+
+def build_runner(tools, calls, parallel: bool) -> AgentRunner:
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "bench"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    llm = ScriptedChatModel(script=steps(calls, "done"))
+    return AgentRunner(
+        llm=llm,
+        tools=tools,
+        prompt=prompt,
+        memory=memory,
+        conflict_groups={"add_to_cart": "cart", "view_cart": "cart"},
+        parallel_tool_calls=parallel,
+    )
+
+
+async def measure(tools, calls, parallel: bool, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        runner = build_runner(tools, calls, parallel)
+        await runner.ainvoke({"input": "go"})
+        # Tool phase of the multi-call step: step wall-clock minus the LLM call.
+        tool_step = next(s for s in runner.steps if s["tools"])
+        samples.append(tool_step["wall_s"] - tool_step["llm_s"])
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--qbo-latency", type=float, default=0.35, help="seconds per QuickBooks-bound tool")
+    parser.add_argument("--local-latency", type=float, default=0.01, help="seconds per in-process tool")
+    args = parser.parse_args()
+
+    tools = build_tools(args.qbo_latency, args.local_latency)
+    print(f"{'scenario':<50} {'sequential ms':>14} {'parallel ms':>12} {'saved ms':>10}")
+    for name, calls in SCENARIOS.items():
+        seq = statistics.median(await measure(tools, calls, parallel=False, repeat=args.repeat))
+        par = statistics.median(await measure(tools, calls, parallel=True, repeat=args.repeat))
+        print(f"{name:<50} {seq * 1000:>14.1f} {par * 1000:>12.1f} {(seq - par) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    asyncio.run(main())
+    print(f"\nfinished in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,119 @@
+# bench/scenarios.py
+"""
+Customer journeys for the end-to-end benchmark. A scenario is a list of
+turns; each chat turn carries the tool rounds the fake model plays for it
+(the same calls the real prompt leads the model to make) and its reply.
+`PAY` is not a chat message: the harness completes the Stripe form on the
+fakes and sends `payment_complete` over the session's WebSocket.
+
+Chat messages are sent as "[<session id>] <text>" so the scripted model can
+fill in per-session tool arguments; an argument given as a callable is
+evaluated with the session id when the call is emitted.
+"""
+
+from __future__ import annotations
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from bench.fake_llm import answer, tool_rounds
+from bench.fakes import RETURNING_CUSTOMER
+from state.session import get_state
+
+PAY = "PAY"
+
+ToolCall = Tuple[str, Dict[str, Any]]
+
+
+class Turn:
+    __slots__ = ("label", "text", "rounds", "reply")
+
+    def __init__(self, label: str, text: str, rounds: Sequence[Sequence[ToolCall]] = (), reply: str = "OK.") -> None:
+        self.label = label
+        self.text = text
+        self.rounds = [list(r) for r in rounds]
+        self.reply = reply
+
+
+def _session(sid: str) -> str:
+    return sid
+
+
+ORDER_TEXT = "2 masala chai and 1 ginger chai"
+CART_ITEMS = [
+    {"name": "Masala Chai", "quantity": 2, "price": 20.0},
+    {"name": "Ginger Chai", "quantity": 1, "price": 15.0},
+]
+
+BROWSE_MENU = Turn("browse_menu", "what teas do you have?", [[("get_products", {})]],
+                   "We have elaichi chai, masala chai, ginger chai and madras coffee.")
+VIEW_CART = Turn("view_cart", "what's in my cart?", [[("view_cart", {"session_id": _session})]],
+                 "Here is your cart.")
+GUEST = Turn("guest", "I'll continue as a guest, my name is Sam",
+             [[("create_guest_tool", {"session_id": _session, "name": lambda sid: f"Sam {sid}"})]],
+             "Nice to meet you! We've created a guest profile for now.")
+RETURNING = Turn("returning_customer", f"Hi, I'm {RETURNING_CUSTOMER}",
+                 [[("validate_customer_tool", {"session_id": _session, "input": RETURNING_CUSTOMER})]],
+                 f"Welcome back, {RETURNING_CUSTOMER}!")
+ADD_ITEMS = Turn("add_to_cart", f"add {ORDER_TEXT}", [
+    [("get_products", {})],
+    [("add_to_cart", {"session_id": _session, "item_name": "masala chai", "quantity": 2}),
+     ("add_to_cart", {"session_id": _session, "item_name": "ginger chai", "quantity": 1})],
+], "Added 2 masala chai and 1 ginger chai to your cart.")
+INVOICE = Turn("invoice", "please send me the invoice", [
+    [("view_cart", {"session_id": _session})],
+    [("create_invoice_tool", {"input_text": ORDER_TEXT, "session_id": _session})],
+], "Here is your invoice.")
+CHECKOUT = Turn("checkout", "looks good, I'd like to pay", [
+    [("view_cart", {"session_id": _session}), ("generate_summary", {"order_text": ORDER_TEXT})],
+    [("trigger_payment", {"cart_items": CART_ITEMS, "session_id": _session})],
+], "The payment form has been initialized.")
+SAVE_PROFILE = Turn("save_profile", "yes, please save my profile: Sam Lee, 555-0100, sam@example.com, 1 Main St, Austin, TX 73301", [
+    [("rename_customer_tool", {
+        "session_id": _session,
+        "customer_id": lambda sid: str(get_state(sid).customer_id),
+        "new_name": lambda sid: f"Sam Lee {sid}",
+        "phone": "555-0100",
+        "email": "sam@example.com",
+        "address_line1": "1 Main St",
+        "city": "Austin",
+        "state": "TX",
+        "postal_code": "73301",
+    })],
+], "Your profile has been saved.")
+
+SCENARIOS: Dict[str, List[Any]] = {
+    "browse": [BROWSE_MENU, VIEW_CART],
+    "guest_checkout": [GUEST, ADD_ITEMS, INVOICE, CHECKOUT, PAY],
+    "returning_customer": [RETURNING, ADD_ITEMS, INVOICE, CHECKOUT, PAY],
+    "profile_save": [GUEST, ADD_ITEMS, INVOICE, CHECKOUT, PAY, SAVE_PROFILE],
+}
+
+TURNS_BY_TEXT: Dict[str, Turn] = {
+    t.text: t for turns in SCENARIOS.values() for t in turns if isinstance(t, Turn)
+}
+
+_TAGGED = re.compile(r"^\[(?P<sid>[^\]]+)\]\s*(?P<text>.*)$", re.S)
+
+
+def tag(session_id: str, text: str) -> str:
+    return f"[{session_id}] {text}"
+
+
+def _resolve(args: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    return {k: (v(session_id) if callable(v) else v) for k, v in args.items()}
+
+
+def play(messages: List[BaseMessage]) -> AIMessage:
+    """Script for ScriptedChatModel: the current turn's next tool round, then its reply."""
+    human: Optional[HumanMessage] = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    match = _TAGGED.match(str(human.content)) if human is not None else None
+    turn = TURNS_BY_TEXT.get(match.group("text")) if match else None
+    if turn is None:
+        return AIMessage(content="How can I help you today?")
+    done = tool_rounds(messages)
+    if done >= len(turn.rounds):
+        return answer(turn.reply)
+    sid = match.group("sid")
+    return answer([(name, _resolve(args, sid)) for name, args in turn.rounds[done]])
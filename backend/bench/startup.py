@@ -0,0 +1,120 @@
+# bench/startup.py
+"""
+Cold-start benchmark. Two measurements, each in fresh interpreters:
+
+  import   `python -X importtime -c "import main"`: total import time of the
+           app module and the slowest imports (cumulative and self time), so
+           a regression points at the module that caused it.
+  serve    `uvicorn main:app` as a subprocess: time until /health answers
+           (live) and until /ready returns 200 (ready to take chat traffic).
+
+Run from backend/:
+    python -m bench.startup --runs 5 --top 15
+    python -m bench.startup --mode serve --runs 3
+"""
+
+from __future__ import annotations
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def _env() -> Dict[str, str]:
+    # main refuses to import without a key; nothing here talks to OpenAI.
+    return dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY") or "bench-not-used", LOG_LEVEL="WARNING")
+
+
+def import_profile() -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Seconds to import main, and (module, self µs, cumulative µs) for every import."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=BACKEND, env=_env(), capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((module, int(self_us), int(cumulative_us)))
+    return elapsed, rows
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def serve_timings(timeout: float = 60.0) -> Tuple[float, float]:
+    """Seconds from spawning uvicorn until /health answers and until /ready is 200."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=BACKEND, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    live = ready = float("nan")
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited:\n{proc.stderr.read().decode()[-2000:]}")
+            if live != live and _status(f"{base}/health") == 200:
+                live = time.perf_counter() - started
+            if live == live and _status(f"{base}/ready") == 200:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.02)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return live, ready
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("import", "serve", "both"), default="import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (median reported)")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    if args.mode in ("import", "both"):
+        runs = [import_profile() for _ in range(args.runs)]
+        wall = statistics.median(r[0] for r in runs)
+        rows = runs[-1][1]
+        main_us = next((cum for module, _, cum in rows if module == "main"), 0)
+        print(f"import main: {main_us / 1e6:.2f}s (median interpreter wall incl. startup {wall:.2f}s, {len(rows)} modules)")
+        for title, key in (("by cumulative time", 2), ("by self time", 1)):
+            print(f"\n{title}\n{'module':<60} {'self ms':>9} {'cum ms':>9}")
+            for module, self_us, cum_us in sorted(rows, key=lambda r: r[key], reverse=True)[:args.top]:
+                print(f"{module:<60} {self_us / 1000:>9.1f} {cum_us / 1000:>9.1f}")
+
+    if args.mode in ("serve", "both"):
+        timings = [serve_timings() for _ in range(args.runs)]
+        print(f"\nuvicorn main:app over {args.runs} run(s): "
+              f"live after {statistics.median(t[0] for t in timings):.2f}s, "
+              f"ready after {statistics.median(t[1] for t in timings):.2f}s (median)")
+
+
+if __name__ == "__main__":
+    main_cli()
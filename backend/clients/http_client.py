@@ -0,0 +1,456 @@
+# clients/http_client.py
+
+from __future__ import annotations
+import os
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from observability.tracing import span, current_span, KIND_CLIENT
+from observability.metrics import observe_upstream, count_token_refresh
+from runtime.deadline import check as check_deadline, clamp, remaining
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 30.0)   # (connect, read) seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.25      # seconds; doubled per attempt, full jitter
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_POOL_MAXSIZE = 16        # keep-alive connections per host
+DEFAULT_FAILURE_THRESHOLD = 5    # consecutive failures that open the breaker
+DEFAULT_RESET_TIMEOUT = 30.0     # seconds the breaker stays open before a probe
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# For non-idempotent calls only retry when the upstream clearly did not act.
+RETRY_STATUSES_UNSAFE = {429, 503}
+
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The provider's circuit breaker is open; the request was not sent."""
+
+
+def _never_sent(error: Exception) -> bool:
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _note_retry(attempt: int) -> None:
+    current = current_span()
+    if current is not None:
+        current.set(**{"http.retries": attempt})
+
+
+def _bounded(timeout: Any) -> Any:
+    """requests timeout (a number or a (connect, read) pair) capped by the current turn's deadline."""
+    if isinstance(timeout, tuple):
+        return tuple(clamp(t) for t in timeout)
+    return clamp(timeout)
+
+
+def _retry_fits(delay: float) -> bool:
+    """Whether backing off `delay` seconds still leaves the turn time to retry."""
+    left = remaining()
+    return left is None or delay < left
+
+
+# ── token sources ──────────────────────────────────────────────────────────
+class StoredTokenSource:
+    """
+    Bearer token from token_service, cached in memory. The token file is only
+    read on first use and after a refresh, not on every request.
+    """
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self._token: Optional[str] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[str]:
+        if not self._loaded:
+            from token_service import get_token_for_provider
+            with self._lock:
+                if not self._loaded:
+                    tok = get_token_for_provider(self.provider)
+                    self._token = tok.get("access_token") if isinstance(tok, dict) else None
+                    self._loaded = True
+        return self._token
+
+    def refresh(self, stale: Optional[str]) -> Optional[str]:
+        from token_service import refresh_token_for_provider
+        with self._lock:
+            # Another thread already refreshed while we waited for the lock.
+            if self._loaded and self._token != stale:
+                return self._token
+            count_token_refresh(self.provider)
+            new_tok = refresh_token_for_provider(self.provider)
+            self._token = new_tok.get("access_token") if new_tok else None
+            self._loaded = True
+            return self._token
+
+
+class ClientCredentialsTokenSource:
+    """OAuth client-credentials token, fetched on demand and reused until shortly before it expires."""
+
+    def __init__(self, token_url: str, client_id: str, client_secret: str, http: "ProviderHttpClient") -> None:
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.http = http
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> str:
+        count_token_refresh(self.http.provider)
+        # Only ever runs inside one of the provider's own requests, whose
+        # outcome settles the breaker; going through it again would turn a
+        # half-open probe's token refresh into a second (rejected) probe.
+        resp = self.http.request(
+            "POST", self.token_url, auth=False, guarded=False,
+            data={"grant_type": "client_credentials", "client_id": self.client_id, "client_secret": self.client_secret},
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        token = body.get("access_token")
+        if not token:
+            raise RuntimeError(f"Access token not found in token response: {body}")
+        self._token = token
+        self._expires_at = time.time() + int(body.get("expires_in", 3600)) - 60
+        logger.info(f"{self.http.provider} access token acquired.")
+        return token
+
+    def get(self) -> Optional[str]:
+        if self._token and time.time() < self._expires_at:
+            return self._token
+        with self._lock:
+            if self._token and time.time() < self._expires_at:
+                return self._token
+            return self._fetch()
+
+    def refresh(self, stale: Optional[str]) -> Optional[str]:
+        with self._lock:
+            if self._token and self._token != stale and time.time() < self._expires_at:
+                return self._token
+            return self._fetch()
+
+
+# ── metrics & breaker ──────────────────────────────────────────────────────
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b}ms" for b in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / max(self.count, 1), 2),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class CircuitBreaker:
+    """
+    Closed → open after `failure_threshold` consecutive failures; open → half-open
+    after `reset_timeout`, letting a single probe through; the probe's outcome
+    closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+# ── client ─────────────────────────────────────────────────────────────────
+class ProviderHttpClient:
+    """
+    requests.Session per provider with keep-alive pools per host, default
+    timeouts, retries with exponential backoff + full jitter on 429/5xx
+    (honouring Retry-After), one bearer refresh-and-retry on 401/403, a
+    circuit breaker, and latency histograms per (method, host).
+
+    Non-idempotent methods are only retried on 429/503 and on connect
+    failures, unless the caller passes `idempotent=True`.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        breaker: Optional[CircuitBreaker] = None,
+        token_source=None,
+    ) -> None:
+        self.provider = provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.token_source = token_source if token_source is not None else StoredTokenSource(provider)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters = {"requests": 0, "retries": 0, "refreshes": 0, "failures": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+    def _observe(self, method: str, url: str, seconds: float, failed: bool) -> None:
+        key = f"{method} {urlsplit(url).netloc}"
+        with self._stats_lock:
+            self._histograms.setdefault(key, LatencyHistogram()).observe(seconds)
+            self._counters["requests"] += 1
+            self._counters["failures"] += failed
+
+    def _backoff(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        if resp is not None:
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send one logical request (retries and a token refresh included) as one traced span."""
+        method = method.upper()
+        parts = urlsplit(url)
+        with span(f"http {method} {self.provider}", KIND_CLIENT, **{
+            "http.method": method,
+            "http.url": f"{parts.scheme}://{parts.netloc}{parts.path}",
+            "peer.service": self.provider,
+        }) as http_span:
+            started = time.perf_counter()
+            try:
+                resp = self._request(method, url, **kwargs)
+            except Exception as e:
+                observe_upstream(self.provider, type(e).__name__, time.perf_counter() - started)
+                raise
+            observe_upstream(self.provider, resp.status_code, time.perf_counter() - started)
+            http_span.set(**{"http.status_code": resp.status_code})
+            if resp.status_code >= 400:
+                http_span.fail(f"HTTP {resp.status_code}")
+            return resp
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        auth: bool = True,
+        idempotent: Optional[bool] = None,
+        timeout: Any = None,
+        guarded: bool = True,
+        **kwargs: Any,
+    ) -> requests.Response:
+        check_deadline(f"{self.provider} {method}")
+        if not guarded:
+            # Nested in a guarded request (token fetch): bypasses the breaker.
+            return self._send(method, url, headers, auth, idempotent, timeout, kwargs)
+        if not self.breaker.allow():
+            with self._stats_lock:
+                self._counters["rejected"] += 1
+            logger.warning(f"{self.provider} circuit open; not sending {method} {url}.")
+            raise CircuitOpenError(f"{self.provider} is unavailable; retry in {self.breaker.retry_after():.0f}s.")
+
+        # Every way out settles the breaker, so a half-open probe that hits an
+        # unexpected error (another RequestException, an SSL or decode error,
+        # a failing token source) re-opens it instead of leaving it stuck.
+        try:
+            resp = self._send(method, url, headers, auth, idempotent, timeout, kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        logger.debug("%s %s %s completed with status %s.", self.provider, method, url, resp.status_code)
+        return resp
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        auth: bool,
+        idempotent: Optional[bool],
+        timeout: Any,
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        """The request with its retries and token refresh; the caller records the outcome on the breaker."""
+        safe = idempotent if idempotent is not None else method in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if safe else RETRY_STATUSES_UNSAFE
+        hdrs = dict(headers or {})
+        token = None
+        if auth and "Authorization" not in hdrs:
+            token = self.token_source.get()
+            if token:
+                hdrs["Authorization"] = f"Bearer {token}"
+
+        refreshed = False
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            resp: Optional[requests.Response] = None
+            try:
+                resp = self.session.request(method, url, headers=hdrs, timeout=_bounded(timeout or self.timeout), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._observe(method, url, time.perf_counter() - started, failed=True)
+                # A read timeout or dropped response may mean the upstream acted;
+                # only failures to connect are safe to resend for unsafe calls.
+                delay = self._backoff(attempt, None)
+                if attempt < self.max_retries and (safe or _never_sent(e)) and _retry_fits(delay):
+                    logger.warning(f"{self.provider} {method} {url} failed ({e}); retry {attempt + 1} in {delay:.2f}s.")
+                    with self._stats_lock:
+                        self._counters["retries"] += 1
+                    attempt += 1
+                    _note_retry(attempt)
+                    time.sleep(delay)
+                    continue
+                raise
+
+            failed = resp.status_code >= 500
+            self._observe(method, url, time.perf_counter() - started, failed=failed)
+
+            if resp.status_code in (401, 403) and auth and token is not None and not refreshed:
+                logger.warning(f"{self.provider} {method} {url} returned {resp.status_code}; refreshing token.")
+                refreshed = True
+                with self._stats_lock:
+                    self._counters["refreshes"] += 1
+                try:
+                    with span("token.refresh", **{"peer.service": self.provider}):
+                        token = self.token_source.refresh(token)
+                except Exception as e:
+                    logger.error(f"{self.provider} token refresh failed: {e}", exc_info=True)
+                    token = None
+                if token:
+                    hdrs["Authorization"] = f"Bearer {token}"
+                    continue
+
+            delay = self._backoff(attempt, resp) if resp.status_code in retry_statuses else 0.0
+            if resp.status_code in retry_statuses and attempt < self.max_retries and _retry_fits(delay):
+                logger.warning(f"{self.provider} {method} {url} returned {resp.status_code}; retry {attempt + 1} in {delay:.2f}s.")
+                with self._stats_lock:
+                    self._counters["retries"] += 1
+                attempt += 1
+                _note_retry(attempt)
+                resp.close()
+                time.sleep(delay)
+                continue
+            return resp
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                **self._counters,
+                "breaker": self.breaker.state,
+                "latency": {key: h.as_dict() for key, h in self._histograms.items()},
+            }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, ProviderHttpClient] = {}
+_clients_lock = threading.Lock()
+
+def get_http_client(provider: str, token_source_factory: Optional[Callable[[ProviderHttpClient], Any]] = None) -> ProviderHttpClient:
+    """
+    Process-wide client for `provider`, configured from the environment on
+    first use (HTTP_TIMEOUT_SECONDS, HTTP_MAX_RETRIES, HTTP_POOL_MAXSIZE,
+    HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_RESET_SECONDS). `token_source_factory`
+    is only used when the client is created.
+    """
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = ProviderHttpClient(
+                provider,
+                timeout=(DEFAULT_TIMEOUT[0], float(os.getenv("HTTP_TIMEOUT_SECONDS", DEFAULT_TIMEOUT[1]))),
+                max_retries=int(os.getenv("HTTP_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("HTTP_BREAKER_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+                    reset_timeout=float(os.getenv("HTTP_BREAKER_RESET_SECONDS", DEFAULT_RESET_TIMEOUT)),
+                ),
+            )
+            if token_source_factory is not None:
+                client.token_source = token_source_factory(client)
+            _clients[provider] = client
+        return client
+
+
+def http_client_stats() -> Dict[str, Dict[str, Any]]:
+    with _clients_lock:
+        return {name: client.stats() for name, client in _clients.items()}
+
+
+def close_http_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
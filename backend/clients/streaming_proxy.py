@@ -0,0 +1,254 @@
+# clients/streaming_proxy.py
+
+from __future__ import annotations
+import os
+import asyncio
+import logging
+import weakref
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+import httpx
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024      # bytes per upstream read
+DEFAULT_BUFFER_CHUNKS = 4           # read-ahead between upstream and client
+DEFAULT_MAX_CONCURRENCY = 32        # simultaneous proxied downloads
+DEFAULT_ACQUIRE_TIMEOUT = 5.0       # seconds to wait for a download slot
+
+
+class ProxyBusyError(RuntimeError):
+    """Raised when no download slot frees up within the acquire timeout."""
+
+
+class _Download:
+    """An opened upstream body handed to `stream()`; its slot and connection are released exactly once."""
+    __slots__ = ("resp", "on_complete", "reader", "completed", "finished")
+
+    def __init__(self, resp: httpx.Response, on_complete: Optional[Callable[[bool], None]]) -> None:
+        self.resp = resp
+        self.on_complete = on_complete
+        self.reader: Optional[asyncio.Task] = None
+        self.completed = False
+        self.finished = False
+
+
+class StreamingProxy:
+    """
+    Proxies an upstream HTTP body to the client chunk-by-chunk.
+
+    - One shared `httpx.AsyncClient`, so upstream I/O never blocks the loop
+      and connections are reused across downloads.
+    - A semaphore caps concurrent downloads; the slot is held until the
+      client has received the last byte (or disconnected). It is given back
+      even when the body is never iterated: by the response's background
+      task if the client left before the body started, and by a finalizer
+      if the response object was dropped without being sent.
+    - `on_chunk` / `on_complete` (e.g. a disk cache writer) may block; they
+      run on a worker thread, one at a time and in order.
+    - A reader task fills a bounded queue of at most `buffer_chunks` chunks.
+      When the client is slow the queue fills, the reader stops reading and
+      TCP flow control pushes back on upstream. Memory per download is
+      therefore at most `chunk_size * (buffer_chunks + 1)`.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        buffer_chunks: int = DEFAULT_BUFFER_CHUNKS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        timeout: float = 20.0,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._cleanups: Set[asyncio.Future] = set()    # shielded cleanups still running
+        self.active = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=8),
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _acquire(self) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise ProxyBusyError("Too many concurrent downloads. Please retry shortly.")
+        self.active += 1
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._slots.release()
+
+    async def open(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        Acquire a slot and start the upstream request; only the status line
+        and headers are read. Callers must either pass the response to
+        `stream()` or `await close(resp)` to give the slot back.
+        """
+        await self._acquire()
+        try:
+            request = self.client.build_request("GET", url, headers=headers)
+            return await self.client.send(request, stream=True)
+        except BaseException:
+            self._release()
+            raise
+
+    async def close(self, resp: httpx.Response) -> None:
+        try:
+            await resp.aclose()
+        finally:
+            self._release()
+
+    async def _finish(self, download: _Download) -> None:
+        if download.finished:
+            return
+        download.finished = True
+        if download.reader is not None:
+            # A reader blocked on a full queue would otherwise wait forever once the client is gone.
+            download.reader.cancel()
+        # After a client disconnect this runs in a cancelled scope; shielded,
+        # the cleanup still completes (the cache writer's temp file is
+        # removed, the slot and connection are given back) even though the
+        # caller stops waiting for it.
+        cleanup = asyncio.ensure_future(self._cleanup(download))
+        self._cleanups.add(cleanup)
+        cleanup.add_done_callback(self._cleanups.discard)
+        await asyncio.shield(cleanup)
+
+    async def _cleanup(self, download: _Download) -> None:
+        try:
+            await self.close(download.resp)
+        finally:
+            if download.on_complete is not None:
+                await asyncio.to_thread(download.on_complete, download.completed)
+        logger.debug("Proxied stream from %s finished (completed=%s).", download.resp.url, download.completed)
+
+    def _abandon(self, download: _Download, loop: asyncio.AbstractEventLoop) -> None:
+        # Finalizer of a StreamingResponse that was never sent; may run on any thread.
+        if download.finished:
+            return
+        download.finished = True
+        logger.warning("Proxied response for %s was dropped before it was sent; releasing it.", download.resp.url)
+
+        def release() -> None:
+            self._release()
+            asyncio.ensure_future(download.resp.aclose())
+
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass    # the loop is closed; nothing is left to release
+        if download.on_complete is not None:
+            download.on_complete(False)
+
+    async def _body(self, download: _Download, on_chunk: Optional[Callable[[bytes], None]]) -> AsyncIterator[bytes]:
+        resp = download.resp
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_chunks)
+        done = object()
+
+        async def reader() -> None:
+            try:
+                async for chunk in resp.aiter_bytes(self.chunk_size):
+                    await queue.put(chunk)
+                await queue.put(done)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put(e)
+
+        task = download.reader = asyncio.create_task(reader())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    download.completed = True
+                    break
+                if isinstance(item, BaseException):
+                    logger.error("Upstream stream from %s failed: %s", resp.url, item)
+                    break
+                if on_chunk is not None:
+                    await asyncio.to_thread(on_chunk, item)
+                yield item
+        finally:
+            # Runs on normal completion and when the client disconnects mid-stream.
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            await self._finish(download)
+
+    def stream(
+        self,
+        resp: httpx.Response,
+        media_type: str,
+        filename: Optional[str] = None,
+        on_chunk: Optional[Callable[[bytes], None]] = None,
+        on_complete: Optional[Callable[[bool], None]] = None,
+    ) -> StreamingResponse:
+        """Wrap an opened upstream response in a StreamingResponse that owns its slot and connection."""
+        headers = {}
+        if filename:
+            headers["Content-Disposition"] = f"attachment; filename={filename}"
+        if "content-length" in resp.headers and "content-encoding" not in resp.headers:
+            headers["Content-Length"] = resp.headers["content-length"]
+        download = _Download(resp, on_complete)
+        response = StreamingResponse(
+            self._body(download, on_chunk),
+            status_code=resp.status_code,
+            media_type=media_type,
+            headers=headers,
+            # Runs after the response ends, also when the client disconnected
+            # before the body generator was ever started.
+            background=BackgroundTask(self._finish, download),
+        )
+        weakref.finalize(response, self._abandon, download, asyncio.get_running_loop())
+        return response
+
+    async def proxy(self, url: str, media_type: str, filename: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        """Open + stream in one call; upstream errors become JSON responses."""
+        try:
+            resp = await self.open(url, headers=headers)
+        except ProxyBusyError as e:
+            return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
+
+        if resp.status_code != 200:
+            logger.error("Upstream %s returned status %s.", url, resp.status_code)
+            await self.close(resp)
+            return JSONResponse(status_code=resp.status_code, content={"error": f"Upstream returned {resp.status_code}"})
+        return self.stream(resp, media_type, filename)
+
+
+_proxy: Optional[StreamingProxy] = None
+
+def get_streaming_proxy() -> StreamingProxy:
+    """Process-wide proxy, configured from the environment on first use."""
+    global _proxy
+    if _proxy is None:
+        _proxy = StreamingProxy(
+            chunk_size=int(os.getenv("DOWNLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)),
+            buffer_chunks=int(os.getenv("DOWNLOAD_BUFFER_CHUNKS", DEFAULT_BUFFER_CHUNKS)),
+            max_concurrency=int(os.getenv("DOWNLOAD_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+        )
+    return _proxy
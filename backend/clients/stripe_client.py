@@ -0,0 +1,130 @@
+# clients/stripe_client.py
+
+from __future__ import annotations
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from observability.tracing import span, KIND_CLIENT
+from observability.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 20.0          # seconds per HTTP request to Stripe
+DEFAULT_NETWORK_RETRIES = 2     # the SDK retries with the same idempotency key
+SLOW_CALL_WARNING = 2.0         # seconds
+
+
+class StripeCallStats:
+    __slots__ = ("calls", "errors", "total_s", "max_s")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(1000 * self.total_s / max(self.calls, 1), 2),
+            "max_ms": round(1000 * self.max_s, 2),
+        }
+
+
+class StripeGateway:
+    """
+    One `StripeClient` for the process, on a pooled `requests.Session`, so
+    checkout calls reuse warm TLS connections instead of the SDK's default
+    per-call client. Calls are blocking: run them on the tool executor.
+    Every call is timed.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_network_retries: int = DEFAULT_NETWORK_RETRIES,
+        api_base: Optional[str] = None,
+    ) -> None:
+        import stripe  # imported with the first gateway rather than at app startup
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._session = session
+        options: Dict[str, Any] = {}
+        if api_base:
+            options["base_addresses"] = {"api": api_base.rstrip("/")}
+        self.client = stripe.StripeClient(
+            api_key or os.getenv("STRIPE_SECRET_KEY") or "",
+            http_client=stripe.RequestsClient(session=session, timeout=timeout),
+            max_network_retries=max_network_retries,
+            **options,
+        )
+        self._stats: Dict[str, StripeCallStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def _timed(self, op: str, fn, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        failed = False
+        try:
+            with span(f"stripe {op}", KIND_CLIENT, **{"peer.service": "stripe", "stripe.operation": op}):
+                return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_upstream("stripe", "error" if failed else "ok", elapsed)
+            with self._stats_lock:
+                s = self._stats.setdefault(op, StripeCallStats())
+                s.calls += 1
+                s.errors += failed
+                s.total_s += elapsed
+                s.max_s = max(s.max_s, elapsed)
+            log = logger.warning if elapsed > SLOW_CALL_WARNING else logger.info
+            log(f"Stripe {op} took {elapsed * 1000:.0f}ms{' (failed)' if failed else ''}.")
+
+    def create_checkout_session(self, params: Dict[str, Any], idempotency_key: str):
+        return self._timed(
+            "checkout.sessions.create",
+            self.client.checkout.sessions.create,
+            params=params,
+            options={"idempotency_key": idempotency_key},
+        )
+
+    def retrieve_checkout_session(self, checkout_id: str):
+        return self._timed("checkout.sessions.retrieve", self.client.checkout.sessions.retrieve, checkout_id)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {op: s.as_dict() for op, s in self._stats.items()}
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_gateway: Optional[StripeGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_stripe_gateway() -> StripeGateway:
+    """Process-wide Stripe client, configured from the environment on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = StripeGateway(
+                pool_size=int(os.getenv("STRIPE_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                timeout=float(os.getenv("STRIPE_TIMEOUT_SECONDS", DEFAULT_TIMEOUT)),
+                api_base=os.getenv("STRIPE_API_BASE") or None,
+            )
+        return _gateway
@@ -1,61 +1,65 @@
 import os
-import io
-import sys
+import time
+import asyncio
 import logging
 from pathlib import Path
-import requests
-from fastapi import FastAPI, WebSocket
+from typing import TYPE_CHECKING, Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.memory import ConversationBufferMemory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+# The model client (langchain_openai), conversation memory and the tool
+# modules are imported on first use or by the background warm-up after
+# startup (see "Readiness"), not at import time.
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferMemory
+
 # Routers
 from routers.fedex import router as fedex_router
 from routers.paypal import router as paypal_router
 from routers.quickbooks import router as quickbooks_router
 from routers.customer import router as customer_router
 from routers.applepay import router as applepay_router
+from routers.orders import router as orders_router
+from routers.stripe_webhook import router as stripe_webhook_router
+from routers.traces import router as traces_router
+from routers.admin import router as admin_router
 
 # Tools & SDKs
-from state.session import set_websocket
-from tools.tool_config import get_all_tools
-from tools.quickbooks.quickbooks_wrapper import QuickBooksWrapper
+from state.session import get_state
+from orders.pipeline import get_order_pipeline, CallInProgressError, OrderStateError, PAID, SHIPPED
+from agent.runner import AgentRunner
+from agent.routing import ModelRouter, TURN_OTHER, classify_turn, tiers_from_env
+from agent.hedging import get_hedger
+from tools.quickbooks.quickbooks_wrapper import QuickBooksWrapper, get_customer_cache
+from tools.quickbooks.invoice_pdf_cache import get_invoice_pdf_cache, flush_invoice_pdf_cache
+from clients.streaming_proxy import get_streaming_proxy, ProxyBusyError
+from runtime.tool_executor import get_tool_executor
+from runtime.pubsub import get_pubsub, publish_session_event
+from runtime.ws_manager import get_ws_manager
+from runtime.session_tasks import get_session_tasks
+from runtime.session_locks import get_session_locks, SessionBusyError
+from runtime.warmup import get_warmup, WarmupSkipped
+from runtime.deadline import deadline
+from runtime.admission import get_admission_controller, AdmissionRejected, PRIORITY_CHECKOUT, PRIORITY_DEFAULT
+from clients.stripe_client import get_stripe_gateway
+from clients.http_client import close_http_clients
+from observability.tracing import get_tracer, span
+from observability.metrics import MetricsMiddleware, LLM_ROUTES, get_registry, gauge_family, counter_family
+from observability.logs import configure_logging, stop_logging, logging_stats
+from observability import slow_turns
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pathlib import Path
-
-# Serve built frontend from backend/static
-static_dir = Path(__file__).parent / "static"
-if static_dir.exists():
-    app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
-
-    # SPA fallback: unknown paths return index.html
-    @app.get("/{full_path:path}")
-    async def spa_fallback(full_path: str):
-        index_file = static_dir / "index.html"
-        if index_file.exists():
-            return FileResponse(index_file)
-        return {"detail": "Frontend not built yet"}
-
-# Simple health endpoint (for Azure probe)
-@app.get("/api/health")
-def health_check():
-    return {"status": "ok"}
+from fastapi.responses import FileResponse, Response
 # ──────────────────────────────────────────────────────────────────────────────
 # Set up logging for the application
 # ──────────────────────────────────────────────────────────────────────────────
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO, # Set the lowest level of message to display
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout, # Ensure logs go to the terminal
-)
+# JSON lines to stdout, written by a background thread (see observability/logs.py).
+configure_logging()
 logger.info("Chai Corner Backend starting up...")
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -66,6 +70,19 @@ load_dotenv(dotenv_path=ENV_PATH)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_API_MODEL = os.getenv("OPENAI_API_MODEL") or "gpt-4o-mini"  # safe default
+# Run independent tool calls from one LLM step concurrently (set to 0 to disable).
+AGENT_PARALLEL_TOOLS = os.getenv("AGENT_PARALLEL_TOOLS", "1") != "0"
+# Budget for one /chat turn, admission wait included; LLM, tool and upstream
+# HTTP calls are capped by what is left of it (0 disables).
+CHAT_TURN_DEADLINE = float(os.getenv("CHAT_TURN_DEADLINE_SECONDS", "40"))
+# Budget for the agent loop itself: at most this many LLM calls and seconds
+# per turn (the turn deadline still applies when it is tighter; 0 disables the time budget).
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "8"))
+AGENT_TIME_BUDGET = float(os.getenv("AGENT_TIME_BUDGET_SECONDS", "30"))
+# Reverse proxies in front of the app that append to X-Forwarded-For. The
+# client is the address the outermost of them saw; with 0 the peer address
+# is used and the header (which the client controls) is ignored.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
 
 if not OPENAI_API_KEY:
     logger.critical("Missing OPENAI_API_KEY in environment. Shutting down.")
@@ -94,14 +111,120 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Turns slower than SLOW_TURN_THRESHOLD_SECONDS are kept for /api/admin/slow-turns.
+slow_turns.install()
+
+# QuickBooks wrapper for invoice downloads, built on first use (it reads the token store).
+_qb: Optional[QuickBooksWrapper] = None
+
+def get_qb() -> Optional[QuickBooksWrapper]:
+    global _qb
+    if _qb is None:
+        try:
+            _qb = QuickBooksWrapper()
+            logger.info("QuickBooksWrapper initialized successfully.")
+        except Exception as e:
+            logger.error("Failed to initialize QuickBooksWrapper: %s", e, exc_info=True)
+    return _qb
 
-# Initialize SDK wrappers once
-try:
-    qb = QuickBooksWrapper()
-    logger.info("QuickBooksWrapper initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize QuickBooksWrapper: {e}", exc_info=True)
-    qb = None
+# ──────────────────────────────────────────────────────────────────────────────
+# Readiness: liveness (/health) answers as soon as the process serves HTTP;
+# /ready answers 200 once the warm-up (runtime/warmup.py) has passed its
+# required steps. Besides starting pub/sub and prebuilding the agent it opens
+# the pooled connections to OpenAI, QuickBooks and FedEx and checks their
+# tokens, so the first customer after a deploy does not pay for any of it.
+# ──────────────────────────────────────────────────────────────────────────────
+def _warm_agent() -> str:
+    import langchain.memory  # noqa: F401
+    _, tools, _ = get_agent_parts()
+    return f"{len(tools)} tools"
+
+async def _warm_openai() -> str:
+    # Runs after "agent"; one request per routing tier's model opens the pool
+    # that tier's ainvoke calls use (and checks the model name and key).
+    reached = []
+    for spec, llm in get_agent_parts()[0].models():
+        client = getattr(llm, "root_async_client", None)
+        if client is not None:
+            reached.append((await client.models.retrieve(spec.model)).id)
+    if not reached:
+        raise WarmupSkipped("no OpenAI clients configured")
+    return f"{', '.join(reached)} reachable"
+
+def _warm_quickbooks() -> str:
+    if not os.getenv("QB_REALM_ID"):
+        raise WarmupSkipped("QB_REALM_ID is not set")
+    qb = get_qb()
+    if qb is None:
+        raise RuntimeError("QuickBooksWrapper could not be initialized (see logs).")
+    return qb.warm_up()
+
+def _warm_fedex() -> str:
+    if not os.getenv("FEDEX_CLIENT_ID"):
+        raise WarmupSkipped("FEDEX_CLIENT_ID is not set")
+    from tools.fedex.fedex_api_wrapper import FedExWrapper
+    FedExWrapper()  # acquires the OAuth token on the shared, pooled client
+    return "token acquired"
+
+_warmup = get_warmup()
+_warmup.add("pubsub")
+_warmup.add("agent", _warm_agent)
+_warmup.add("openai", _warm_openai, after=("agent",))
+_warmup.add("quickbooks", _warm_quickbooks)
+_warmup.add("fedex", _warm_fedex)
+
+@app.on_event("startup")
+async def start_pubsub():
+    await get_pubsub().start()
+    get_warmup().mark("pubsub")
+
+@app.on_event("startup")
+async def start_warmup():
+    app.state.warmup_task = asyncio.create_task(get_warmup().run())
+
+RESUME_ORDER_TIMEOUT = 60.0
+
+@app.on_event("startup")
+async def resume_orders():
+    # Orders a previous process left between payment and shipment are finished
+    # in the background; startup does not wait on provider calls.
+    async def _resume():
+        pipeline = get_order_pipeline()
+        executor = get_tool_executor()
+        try:
+            orders = await asyncio.to_thread(pipeline.begin_resume)
+        except Exception as e:
+            logger.error("Resuming pending orders failed: %s", e, exc_info=True)
+            return
+        resumed = 0
+        try:
+            # One executor call per order, so a slow provider only times out that order.
+            for order in orders:
+                try:
+                    resumed += await executor.run("stripe", pipeline.resume_order, order, timeout=RESUME_ORDER_TIMEOUT)
+                except CallInProgressError as e:
+                    logger.info("Skipping order %s: %s", order["order_id"], e)
+                except Exception as e:
+                    logger.error("Could not resume order %s: %s", order["order_id"], e, exc_info=True)
+        finally:
+            await asyncio.to_thread(pipeline.end_resume)
+        if resumed:
+            logger.info("Resumed %d order(s) after restart.", resumed)
+    app.state.resume_orders_task = asyncio.create_task(_resume())
+
+@app.on_event("shutdown")
+async def release_shared_clients():
+    app.state.warmup_task.cancel()
+    await get_streaming_proxy().aclose()
+    get_stripe_gateway().close()
+    close_http_clients()
+    flush_invoice_pdf_cache()
+    await get_ws_manager().close_all()
+    await get_pubsub().close()
+    get_tool_executor().shutdown()
+    get_tracer().shutdown()
+    stop_logging()
 
 # Health
 @app.get("/health")
@@ -109,53 +232,196 @@ def health():
     logger.info("Health check endpoint called.")
     return {"status": "ok"}
 
+# Simple health endpoint (for Azure probe)
+@app.get("/api/health")
+def health_check():
+    return {"status": "ok"}
+
+# Readiness probe: route traffic here only once this returns 200. The body
+# reports every warm-up step's state, attempts, timing and detail.
+@app.get("/ready")
+def readiness():
+    status = get_warmup().status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+# Live WebSocket gauges (open sockets, queued bytes, drops)
+@app.get("/api/ws/stats")
+def websocket_stats():
+    return get_ws_manager().stats()
+
+# Per-session turn serialization and background task queues
+@app.get("/api/sessions/stats")
+def session_stats():
+    return {"locks": get_session_locks().stats(), "tasks": get_session_tasks().stats()}
+
+# /chat admission: in-flight turns, queue depth, shed counts
+@app.get("/api/admission/stats")
+def admission_stats():
+    return get_admission_controller().stats()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Metrics (Prometheus text format)
+# ──────────────────────────────────────────────────────────────────────────────
+@app.get("/metrics")
+def metrics():
+    return Response(get_registry().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@get_registry().collector
+def runtime_gauges():
+    # Read at scrape time from the components' own stats, so nothing is added to their hot paths.
+    ws = get_ws_manager().stats()
+    admission = get_admission_controller().stats()
+    lanes = get_tool_executor().stats()
+    pdf_cache = get_invoice_pdf_cache().stats()
+    yield gauge_family("chai_sessions_live", "Chat sessions with conversation memory in this process.",
+                       [({}, len(session_memories))])
+    yield gauge_family("chai_websocket_connections", "Open WebSocket connections.", [({}, ws["open_sockets"])])
+    yield gauge_family("chai_websocket_queued_bytes", "Bytes queued for WebSocket clients.", [({}, ws["queued_bytes"])])
+    yield counter_family("chai_websocket_dropped_events", "Events dropped for slow WebSocket clients.",
+                         [({}, ws["dropped_events"])])
+    yield gauge_family("chai_websocket_dropped_events_open", "Events dropped for WebSocket clients still connected.",
+                       [({}, ws["dropped_events_open"])])
+    yield gauge_family("chai_chat_in_flight", "Chat turns currently running.", [({}, admission["in_flight"])])
+    yield gauge_family("chai_chat_queue_depth", "Chat turns waiting for admission.", [({}, admission["queue_depth"])])
+    yield counter_family("chai_chat_rejected", "Chat turns rejected by admission control, by reason.", [
+        ({"reason": "client_limit"}, admission["rejected_client"]),
+        ({"reason": "queue_full"}, admission["shed_queue_full"]),
+        ({"reason": "queue_timeout"}, admission["shed_timeout"]),
+    ])
+    yield gauge_family("chai_executor_in_flight", "Blocking tool calls running, by provider lane.",
+                       [({"lane": lane}, s["in_flight"]) for lane, s in lanes.items()])
+    yield gauge_family("chai_executor_queued", "Blocking tool calls waiting for a lane slot.",
+                       [({"lane": lane}, s["queued"]) for lane, s in lanes.items()])
+    yield gauge_family("chai_session_locks_active", "Sessions with a turn running or waiting.",
+                       [({}, get_session_locks().stats()["active_sessions"])])
+    yield gauge_family("chai_session_tasks_queued", "Background session tasks waiting to run.",
+                       [({}, get_session_tasks().stats()["queued"])])
+    yield gauge_family("chai_invoice_pdf_cache_bytes", "Bytes held by the invoice PDF cache.", [({}, pdf_cache["bytes"])])
+    yield gauge_family("chai_invoice_pdf_cache_entries", "Invoice versions in the PDF cache.", [({}, pdf_cache["entries"])])
+    customers = get_customer_cache().stats()
+    yield counter_family("chai_customer_cache_lookups", "Customer name lookups, by cache result.", [
+        ({"result": "hit"}, customers["hits"]),
+        ({"result": "miss"}, customers["misses"]),
+    ])
+    yield gauge_family("chai_llm_hedge_delay_seconds", "Observed latency quantile after which LLM calls are hedged, by model.",
+                       [({"model": model}, h["hedge_delay_s"]) for model, h in get_hedger().stats().items()
+                        if h["hedge_delay_s"] is not None])
+    warmup = get_warmup().status()
+    yield gauge_family("chai_ready", "1 once the required warm-up steps have passed.", [({}, int(warmup["ready"]))])
+    yield gauge_family("chai_warmup_step_ok", "1 if the warm-up step succeeded, by step.",
+                       [({"step": name}, int(step["state"] == "ok")) for name, step in warmup["steps"].items()])
+    logs = logging_stats()
+    yield gauge_family("chai_log_queue_depth", "Log records waiting for the writer thread.", [({}, logs["queued"])])
+    yield counter_family("chai_log_records_dropped", "Log records dropped, by reason.", [
+        ({"reason": "queue_full"}, logs["dropped_queue_full"]),
+        ({"reason": "rate_limited"}, logs["dropped_rate_limited"]),
+    ])
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Downloads
 # ──────────────────────────────────────────────────────────────────────────────
+def _weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _not_modified(request: Request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x" (proxies and
+    # compressing middleware weaken validators).
+    if_none_match = request.headers.get("if-none-match", "")
+    return if_none_match.strip() == "*" or _weak(etag) in [_weak(tag) for tag in if_none_match.split(",")]
+
+def _cached_invoice(cache, qb, invoice_id: str):
+    """(current SyncToken, cached PDF for it or None); blocking, run off the event loop."""
+    sync_token = cache.current_sync_token(qb, invoice_id)
+    return sync_token, cache.lookup(invoice_id, sync_token)
+
 @app.get("/download/invoice/{invoice_id}")
-def download_invoice(invoice_id: str):
-    """Stream a QuickBooks invoice PDF by invoice_id."""
-    logger.info(f"Received request to download invoice: {invoice_id}")
+async def download_invoice(invoice_id: str, request: Request):
+    """
+    Serve a QuickBooks invoice PDF by invoice_id.
+    Cache hits are sent from disk with FileResponse (sendfile, ETag/304, Range).
+    Misses are proxied from QuickBooks chunk-by-chunk and teed into the cache,
+    so neither path holds the whole PDF in memory or blocks the event loop.
+    """
+    logger.info("Received request to download invoice: %s", invoice_id)
+    qb = get_qb()
     if not qb:
         logger.error("QuickBooksWrapper is not initialized. Cannot download invoice.")
         return JSONResponse(status_code=500, content={"error": "Internal service error. QuickBooks not configured."})
-        
+
+    cache = get_invoice_pdf_cache()
+    proxy = get_streaming_proxy()
+    executor = get_tool_executor()
     try:
-        pdf_bytes = qb.get_invoice_pdf(invoice_id)
-        logger.info(f"Successfully retrieved PDF for invoice: {invoice_id}")
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=invoice_{invoice_id}.pdf"},
-        )
+        # Token refresh and the SyncToken lookup are blocking QuickBooks calls;
+        # run them on the QuickBooks lane so they share its concurrency limit.
+        # The cache lookup (a stat of the blob) goes along on the same thread.
+        sync_token, cached = await executor.run("quickbooks", _cached_invoice, cache, qb, invoice_id)
+        if cached is not None:
+            headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+            if _not_modified(request, cached.etag):
+                logger.info("Invoice %s not modified; returning 304.", invoice_id)
+                return Response(status_code=304, headers=headers)
+            logger.info("Serving cached PDF for invoice: %s", invoice_id)
+            return FileResponse(
+                cached.path,
+                media_type="application/pdf",
+                filename=f"invoice_{invoice_id}.pdf",
+                headers=headers,
+            )
+
+        url = qb.invoice_pdf_url(invoice_id)
+        headers = await executor.run("quickbooks", qb.authorized_headers, Accept="application/pdf")
+        resp = await proxy.open(url, headers=headers)
+        if resp.status_code == 401:
+            logger.warning("Invoice PDF request returned 401. Refreshing token and retrying once.")
+            await proxy.close(resp)
+            headers = await executor.run("quickbooks", qb.authorized_headers, force_refresh=True, Accept="application/pdf")
+            resp = await proxy.open(url, headers=headers)
+
+        if resp.status_code != 200 or not resp.headers.get("content-type", "").lower().startswith("application/pdf"):
+            body = (await resp.aread())[:2000].decode(errors="replace")
+            await proxy.close(resp)
+            logger.error("QuickBooks invoice PDF failed: HTTP %s - %s", resp.status_code, body)
+            return JSONResponse(status_code=502, content={"error": f"QuickBooks returned HTTP {resp.status_code}"})
+
+        # The writer's file I/O (open, per-chunk writes, commit) runs off the
+        # event loop; the proxy calls on_chunk / on_complete on a worker thread.
+        writer = await asyncio.to_thread(cache.writer, invoice_id, sync_token)
+
+        def on_complete(completed: bool) -> None:
+            if completed:
+                writer.commit()
+            else:
+                writer.abort()
+
+        logger.info("Streaming PDF for invoice %s from QuickBooks.", invoice_id)
+        return proxy.stream(resp, "application/pdf", f"invoice_{invoice_id}.pdf", on_chunk=writer.write, on_complete=on_complete)
+    except ProxyBusyError as e:
+        logger.warning("Rejecting invoice download %s: %s", invoice_id, e)
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
     except Exception as e:
-        logger.error(f"Failed to download invoice {invoice_id}. Error: {e}", exc_info=True)
+        logger.error("Failed to download invoice %s. Error: %s", invoice_id, e, exc_info=True)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/download/label/{tracking_number}")
-def download_label(tracking_number: str):
+async def download_label(tracking_number: str):
     """
     Streams the FedEx label PDF given a tracking number.
     NOTE: Replace the URL logic with your persisted label lookup if available.
     """
-    logger.info(f"Received request to download FedEx label for tracking number: {tracking_number}")
+    logger.info("Received request to download FedEx label for tracking number: %s", tracking_number)
     try:
         label_url = f"https://www.fedex.com/label/{tracking_number}.pdf"
-        resp = requests.get(label_url, timeout=20)
-        if resp.status_code != 200:
-            logger.error(f"Failed to fetch label from FedEx. Status code: {resp.status_code}")
-            return JSONResponse(
-                status_code=resp.status_code,
-                content={"error": f"Failed to fetch label: {resp.status_code}"},
-            )
-        logger.info("Successfully fetched FedEx label.")
-        return StreamingResponse(
-            io.BytesIO(resp.content),
+        return await get_streaming_proxy().proxy(
+            label_url,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=label_{tracking_number}.pdf"},
+            filename=f"label_{tracking_number}.pdf",
         )
     except Exception as e:
-        logger.error(f"An error occurred while downloading label: {e}", exc_info=True)
+        logger.error("An error occurred while downloading label: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -168,10 +434,11 @@ def download_label(tracking_number: str):
 # WARNING: This is an in-memory store. It will be cleared if the server restarts.
 session_memories = {}
 
-def get_memory_for_session(session_id: str) -> ConversationBufferMemory:
+def get_memory_for_session(session_id: str) -> "ConversationBufferMemory":
     """Retrieves or creates a memory object for a given session ID."""
     if session_id not in session_memories:
-        logger.info(f"No memory found for session {session_id}. Creating a new one.")
+        from langchain.memory import ConversationBufferMemory
+        logger.info("No memory found for session %s. Creating a new one.", session_id)
         session_memories[session_id] = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
@@ -182,43 +449,132 @@ def get_memory_for_session(session_id: str) -> ConversationBufferMemory:
 
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(ws: WebSocket, session_id: str):
-    logger.info(f"New WebSocket connection established for session ID: {session_id}")
-
-    await ws.accept()
-    set_websocket(session_id, ws)
+    logger.info("New WebSocket connection established for session ID: %s", session_id)
+
+    # The manager accepts the socket, subscribes it to the session's events
+    # (so every open tab gets them), and runs its heartbeat and sender tasks.
+    manager = get_ws_manager()
+    tasks = get_session_tasks()
+    conn = await manager.connect(ws, session_id)
+    if conn is None:
+        return
     
     try:
         while True:
-            data = await ws.receive_json()
-            logger.info(f"Websocket: Message from {session_id}: {data}")
+            data = await manager.receive(conn)
+            if data is None:
+                continue  # heartbeat reply
+            logger.info("Websocket: Message from %s: %s", session_id, data)
             
             if data.get("event") == "payment_complete":
-                logging.info(f"Payment complete event received for session: {session_id}")
-                
-                memory = get_memory_for_session(session_id)
-                agent_executor = create_agent(memory)
-                response = await agent_executor.ainvoke({"input": "The payment has been verified. Please move on to shipping."})
-                
-                logging.info(f"Sending response back after payment: {response.get('output')}")
-                await ws.send_json({
-                    "type": "agent_message",
-                    "ai_message": response.get("output")
-                })
+                logger.info("Payment complete event received for session: %s", session_id)
+                # Handled on the session's task queue so this loop keeps reading
+                # (heartbeats, further events) while payment and shipping run.
+                if not tasks.submit(session_id, "payment_complete", lambda: handle_payment_complete(session_id)):
+                    await publish_session_event(
+                        session_id, "agent_message",
+                        ai_message="I'm still working on your previous request. Please give me a moment.",
+                    )
+    except WebSocketDisconnect:
+        logger.info("WebSocket connection closed for session %s.", session_id)
     except Exception as e:
-        logger.error(f"WebSocket connection closed for session {session_id}. Error: {e}", exc_info=True)
-        set_websocket(session_id, None)
+        logger.error("WebSocket connection closed for session %s. Error: %s", session_id, e, exc_info=True)
+    finally:
+        await manager.disconnect(conn)
+        # Nobody left to report to: drop the session's queued work. The order
+        # pipeline is persisted, so an interrupted step is resumed later.
+        if manager.session_connections(session_id) == 0:
+            tasks.cancel(session_id)
+
+# payment_complete runs in the background, so it can afford to wait out a long turn,
+# and is re-queued behind the session's other work if the session stays busy.
+PAYMENT_COMPLETE_LOCK_WAIT = 120.0
+PAYMENT_COMPLETE_ATTEMPTS = 3
+STILL_PROCESSING_MESSAGE = "Thanks, your payment is being processed. I'll confirm your order and shipment here in a moment."
+
+async def handle_payment_complete(session_id: str, attempt: int = 1) -> None:
+    # Deterministic step: verify payment and ship straight from the
+    # order pipeline instead of spending an LLM turn on it. Holds the session
+    # lock so it never interleaves with a /chat turn of the same session.
+    with get_tracer().turn(session_id, "payment_complete") as turn:
+        try:
+            async with get_session_locks().hold(session_id, wait=PAYMENT_COMPLETE_LOCK_WAIT):
+                ai_message = await complete_order(session_id)
+                get_memory_for_session(session_id).chat_memory.add_ai_message(ai_message)
+        except SessionBusyError as e:
+            turn.set(**{"chat.outcome": "busy", "payment_complete.attempt": attempt})
+            if attempt < PAYMENT_COMPLETE_ATTEMPTS and get_session_tasks().submit(
+                session_id, "payment_complete", lambda: handle_payment_complete(session_id, attempt + 1)
+            ):
+                logger.warning("Payment complete for session %s deferred: %s Re-queued (attempt %s).", session_id, e, attempt + 1)
+            else:
+                # The order is persisted as paid / payment pending; resume_orders
+                # finishes it on the next start if no later attempt does.
+                logger.error("Payment complete for session %s gave up after %s attempt(s): %s", session_id, attempt, e)
+            if attempt == 1:
+                await publish_session_event(session_id, "agent_message", ai_message=STILL_PROCESSING_MESSAGE)
+            return
+    
+    logger.info("Sending response back after payment: %s", ai_message)
+    await publish_session_event(session_id, "agent_message", ai_message=ai_message)
 
-def create_agent(memory: ConversationBufferMemory) -> AgentExecutor:
-    """Create and return the LangChain tool-calling agent executor."""
-    tools = get_all_tools()
-    logger.debug(f"Loaded {len(tools)} tools for the agent.")
+async def complete_order(session_id: str) -> str:
+    """
+    Confirm payment and create the shipment for the session's order, streaming
+    `order_progress` events as each step starts and finishes. Returns the reply
+    for the customer.
+    """
+    pipeline = get_order_pipeline()
+    executor = get_tool_executor()
+    try:
+        await publish_session_event(session_id, "order_progress", step="verifying_payment")
+        order = await executor.run("stripe", pipeline.confirm_payment, session_id)
+        if order["state"] == PAID:
+            await publish_session_event(session_id, "order_progress", step="payment_verified", order_id=order["order_id"])
+            await publish_session_event(session_id, "order_progress", step="creating_shipment", order_id=order["order_id"])
+            order = await executor.run("fedex", pipeline.ship, session_id)
+    except OrderStateError as e:
+        logger.warning("Payment complete for session %s, but the order cannot ship: %s", session_id, e)
+        return f"I couldn't find a payment to confirm for this session. {e}"
+    except Exception as e:
+        logger.error("Could not complete order for session %s: %s", session_id, e, exc_info=True)
+        await publish_session_event(session_id, "order_progress", step="failed")
+        return "Your payment was received, but I couldn't create the shipment just yet. Please ask me to try shipping again in a moment."
+
+    if order["state"] != SHIPPED:
+        return "Your payment hasn't gone through yet. Please complete the payment form to continue."
+    await publish_session_event(
+        session_id, "shipment_created",
+        order_id=order["order_id"], tracking_number=order["tracking_number"], label_url=order["label_url"],
+    )
 
-    llm = ChatOpenAI(
-        model=OPENAI_API_MODEL,
+    message = (
+        f"Thank you, your payment has been verified! Your order is on its way. "
+        f"Tracking ID: {order['tracking_number']}. "
+        f"Shipping label: {order['label_url'] or 'Label not available'}"
+    )
+    if get_state(session_id).is_guest:
+        message += "\n\nWould you like to save your profile for future orders?"
+    return message
+
+def build_llm(
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+):
+    """Chat model for one routing tier (the load benchmarks swap in a fake here)."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model or OPENAI_API_MODEL,
         temperature=0,
-        openai_api_key=OPENAI_API_KEY,
+        openai_api_key=api_key or OPENAI_API_KEY,
+        base_url=base_url,
+        timeout=timeout,
     )
-    
+
+def build_prompt() -> ChatPromptTemplate:
+    """System prompt, conversation history and scratchpad for every agent turn."""
     SYSTEM_PROMPT = """
         You are a friendly and helpful AI assistant for an e-commerce business called Chai Corner.
         Your goal is to help customers find products, add them to a cart, and complete their purchase.
@@ -239,7 +595,7 @@ def create_agent(memory: ConversationBufferMemory) -> AgentExecutor:
         4. Generate an invoice using create_invoice_tool. Send the link to the customer. Let the Customer verify that everything is correct.
         5. If the user wants to proceed, you must use `view_cart` tool and `generate_summary` tool to provide cart_items to `trigger_payment_tool` tool.
         6. If the user claims to have paid, use `stripe_checkout_status_tool` tool to see if payment has been made. DO NOT move on to the next step if the payment has not been made. Let customer know they still have to pay if that is the case.
-        7. Once Payment is complete, use `fedex_tool` tool and return the tracking ID and the link to the shipping label.
+        7. Once Payment is complete, use `fedex_tool` tool with the session_id and return the tracking ID and the link to the shipping label.
         8. (Mandatory) DO NOT forget to ask if and only if the customer was initially added as a guest:
             - Only ask: "Would you like to save your profile for future orders?"
             - If they say yes:
@@ -261,7 +617,7 @@ def create_agent(memory: ConversationBufferMemory) -> AgentExecutor:
             - Only ask the save-profile question if and only if the latest client state says is_guest == True (passed via the input string).
     """
 
-    prompt = ChatPromptTemplate.from_messages(
+    return ChatPromptTemplate.from_messages(
         [
             ("system", SYSTEM_PROMPT),
             MessagesPlaceholder(variable_name="chat_history"),
@@ -269,48 +625,146 @@ def create_agent(memory: ConversationBufferMemory) -> AgentExecutor:
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ]
     )
-    agent = create_tool_calling_agent(llm, tools, prompt)
-    logger.info("LangChain agent created.")
 
-    return AgentExecutor(
-        agent=agent,
+# The model router (every tier's client, and with it the connection pools to
+# OpenAI), the tool list and the prompt are built once, by the warm-up, and
+# shared by every turn. They are rebuilt if a benchmark swaps `build_llm`.
+_agent_parts: Optional[tuple] = None
+
+def get_agent_parts() -> tuple:
+    """(model router, tools, prompt) shared by all agent runners."""
+    global _agent_parts
+    if _agent_parts is None or _agent_parts[0] is not build_llm:
+        from tools.tool_config import get_all_tools
+        tools = get_all_tools()
+        tiers, routes = tiers_from_env(OPENAI_API_MODEL)
+        router = ModelRouter(
+            tiers, routes,
+            build=lambda spec: build_llm(model=spec.model, timeout=spec.timeout, base_url=spec.base_url, api_key=spec.api_key),
+            tools=tools,
+        )
+        _agent_parts = (build_llm, router, tools, build_prompt())
+        logger.info("LangChain agent built with %s tools.", len(tools))
+    return _agent_parts[1:]
+
+def create_agent(memory: "ConversationBufferMemory", turn_class: str = TURN_OTHER) -> AgentRunner:
+    """Create and return the tool-calling agent runner, on the model tier for `turn_class`."""
+    from tools.tool_config import TOOL_CONFLICT_GROUPS, TOOL_OUTPUT_FIELDS
+    router, tools, prompt = get_agent_parts()
+    return AgentRunner(
+        llm=None,
         tools=tools,
+        prompt=prompt,
         memory=memory,
-        verbose=True,
-        handle_parsing_errors=True,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        time_budget=AGENT_TIME_BUDGET,
+        output_fields=TOOL_OUTPUT_FIELDS,
+        conflict_groups=TOOL_CONFLICT_GROUPS,
+        parallel_tool_calls=AGENT_PARALLEL_TOOLS,
+        route=router.route(turn_class),
+        hedger=get_hedger(),
     )
+
+def _last_reply(memory: "ConversationBufferMemory") -> str:
+    """The agent's previous answer in this session ("" on the first turn)."""
+    for message in reversed(memory.chat_memory.messages[1:]):
+        if message.type == "ai":
+            return message.content if isinstance(message.content, str) else str(message.content)
+    return ""
     
 # ──────────────────────────────────────────────────────────────────────────────
 # Main chat endpoint
 # ──────────────────────────────────────────────────────────────────────────────
 
+BUSY_MESSAGE = "I'm still working on your previous message. Please wait a moment and try again."
+BUSY_RETRY_AFTER = 2  # seconds
+OVERLOADED_MESSAGE = "We're getting a lot of messages right now. Please try again in a few seconds."
+
 class ChatRequest(BaseModel):
     message: str
     session_id: str
     
 
+def _client_id(http_request: Request) -> str:
+    """
+    Caller identity for per-client limits. Behind TRUSTED_PROXY_HOPS proxies it
+    is the X-Forwarded-For entry that many hops from the right (entries to its
+    left are whatever the client sent); otherwise the peer address.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [h.strip() for h in http_request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if hops:
+            return hops[max(len(hops) - TRUSTED_PROXY_HOPS, 0)]
+    return http_request.client.host if http_request.client else "unknown"
+
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """
     Receives a message, retrieves the correct session memory,
     creates an agent with that memory, and returns a response.
     """
-    try:
-        session_id = request.session_id
-        logger.info(f"Received chat request for session ID: {session_id}")
-        
-        memory = get_memory_for_session(session_id)
-        
-        agent_executor = create_agent(memory)
-
-        response = await agent_executor.ainvoke({"input": request.message})
-        logger.info(f"Agent response for session {session_id} is ready.")
-
-        return {"response": response.get("output")}
-
-    except Exception as e:
-        logger.error(f"An error occurred in chat endpoint for session {session_id}: {e}", exc_info=True)
-        return JSONResponse(status_code=500, content={"error": "An internal server error occurred."})
+    session_id = request.session_id
+    # The whole turn is one trace; its id is returned in X-Trace-Id for /api/traces.
+    with get_tracer().turn(session_id, "chat.turn") as turn, deadline(CHAT_TURN_DEADLINE):
+        trace_headers = {"X-Trace-Id": turn.trace_id}
+        try:
+            logger.info("Received chat request for session ID: %s (trace %s)", session_id, turn.trace_id)
+
+            # Sessions already in checkout are served ahead of browsing traffic when turns queue up.
+            priority = PRIORITY_CHECKOUT if get_order_pipeline().in_checkout(session_id) else PRIORITY_DEFAULT
+            waiting = time.perf_counter()
+            # One turn per session at a time: memory and cart are not safe to share
+            # between concurrent turns. Other sessions are unaffected. Taken before
+            # admission, so a double-submitted turn waits for its predecessor
+            # without holding one of the CHAT_MAX_CONCURRENT slots.
+            async with get_session_locks().hold(session_id):
+                turn.set(**{"session_lock.wait_ms": round((time.perf_counter() - waiting) * 1000, 1)})
+                waiting = time.perf_counter()
+                async with get_admission_controller().admit(_client_id(http_request), priority):
+                    turn.set(**{"admission.wait_ms": round((time.perf_counter() - waiting) * 1000, 1)})
+                    memory = get_memory_for_session(session_id)
+
+                    # Routine turns go to the fast tier, checkout and recovery to the strong one.
+                    turn_class = classify_turn(
+                        request.message,
+                        last_reply=_last_reply(memory),
+                        in_checkout=priority == PRIORITY_CHECKOUT,
+                        is_guest=bool(get_state(session_id).is_guest),
+                    )
+                    agent_executor = create_agent(memory, turn_class)
+                    tier = agent_executor.tier
+                    LLM_ROUTES.labels(turn_class, tier).inc()
+                    turn.set(**{"route.turn_class": turn_class, "route.tier": tier})
+                    logger.info("Turn for session %s classified %s; routed to the %s tier.", session_id, turn_class, tier)
+
+                    with span("agent.run"):
+                        response = await agent_executor.ainvoke({"input": request.message})
+                    if agent_executor.out_of_time:
+                        turn.set(**{"chat.outcome": "out_of_time", "deadline.stage": agent_executor.out_of_time})
+                    logger.info("Agent response for session %s is ready.", session_id)
+
+            return JSONResponse(content={"response": response.get("output")}, headers=trace_headers)
+
+        except AdmissionRejected as e:
+            logger.warning("Chat request for session %s shed (%s): %s", session_id, e.status, e.reason)
+            turn.set(**{"chat.outcome": f"shed_{e.status}"})
+            return JSONResponse(
+                status_code=e.status,
+                headers={"Retry-After": str(e.retry_after), **trace_headers},
+                content={"response": OVERLOADED_MESSAGE, "overloaded": True},
+            )
+        except SessionBusyError as e:
+            logger.warning("Chat request for session %s rejected: %s", session_id, e)
+            turn.set(**{"chat.outcome": "busy"})
+            return JSONResponse(
+                status_code=409,
+                headers={"Retry-After": str(BUSY_RETRY_AFTER), **trace_headers},
+                content={"response": BUSY_MESSAGE, "busy": True},
+            )
+        except Exception as e:
+            logger.error("An error occurred in chat endpoint for session %s: %s", session_id, e, exc_info=True)
+            turn.fail(f"{type(e).__name__}: {e}")
+            return JSONResponse(status_code=500, content={"error": "An internal server error occurred."}, headers=trace_headers)
 
 
 
@@ -322,3 +776,23 @@ app.include_router(customer_router)
 app.include_router(quickbooks_router)
 app.include_router(paypal_router)
 app.include_router(fedex_router)
+app.include_router(orders_router)
+app.include_router(stripe_webhook_router)
+app.include_router(traces_router)
+app.include_router(admin_router)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Frontend (must be registered last: it catches every unmatched path)
+# ──────────────────────────────────────────────────────────────────────────────
+# Serve built frontend from backend/static
+static_dir = Path(__file__).parent / "static"
+if static_dir.exists():
+    app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
+
+    # SPA fallback: unknown paths return index.html
+    @app.get("/{full_path:path}")
+    async def spa_fallback(full_path: str):
+        index_file = static_dir / "index.html"
+        if index_file.exists():
+            return FileResponse(index_file)
+        return {"detail": "Frontend not built yet"}
@@ -0,0 +1,206 @@
+# observability/logs.py
+"""
+Process logging pipeline. Loggers hand records to a bounded in-memory queue
+(a QueueHandler, so the event loop never waits on stdout); a QueueListener
+thread formats and writes them, as JSON lines (LOG_FORMAT=json, the default)
+or the classic text format (LOG_FORMAT=text). Every record carries the
+session, turn and trace ids of the span it was logged in.
+
+High-volume paths are rate-limited per call site (logger + line): below
+WARNING a site may emit LOG_RATE_PER_SITE records per second, and the next
+record it gets through reports how many were dropped (`suppressed`). Warnings
+and errors are never sampled. If the queue is full, records are dropped and
+counted rather than blocking the caller.
+
+Hot paths should log with %-style arguments (`logger.debug("cart %s", cart)`)
+so records that are disabled or rate-limited are never formatted.
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from observability.tracing import current_span
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_RATE_PER_SITE = 50.0    # records/s per call site below WARNING; 0 disables the limit
+
+# Loggers uvicorn configures with their own synchronous handlers.
+_SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the current span's session, turn and trace ids on the record, on the caller's thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        if span is not None:
+            record.session_id = span.attributes.get("session.id")
+            record.turn_id = span.attributes.get("turn.id")
+            record.trace_id = span.trace_id
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site for records below `below`; counts what it drops."""
+
+    def __init__(self, per_second: float, below: int = logging.WARNING) -> None:
+        super().__init__()
+        self.per_second = per_second
+        self.burst = max(per_second, 1.0)
+        self.below = below
+        self.dropped = 0
+        self._sites: Dict[Tuple[str, int], List[float]] = {}   # site -> [tokens, last refill, dropped since last]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.below or self.per_second <= 0:
+            return True
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [self.burst, now, 0]
+            tokens = min(self.burst, site[0] + (now - site[1]) * self.per_second)
+            site[1] = now
+            if tokens < 1.0:
+                site[0] = tokens
+                site[2] += 1
+                self.dropped += 1
+                return False
+            site[0] = tokens - 1.0
+            if site[2]:
+                record.suppressed = int(site[2])
+                site[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler over a SimpleQueue (a lock-free put, so no handler lock is
+    taken either) that drops and counts records past `max_size` instead of
+    blocking.
+    """
+
+    def __init__(self, q: "queue.SimpleQueue[logging.LogRecord]", max_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        super().__init__(q)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (arguments may be mutated after the call returns);
+        # timestamps, JSON and the final line are built on the listener thread.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus ids / suppressed / exc when present."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("session_id", "turn_id", "trace_id", "suppressed"):
+            value = getattr(record, key, None)
+            if value is not None:
+                out[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_rate_limit: Optional[RateLimitFilter] = None
+_sink: Optional[logging.Handler] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                      rate_per_site: Optional[float] = None, stream: TextIO = sys.stdout) -> None:
+    """Route the root logger (and uvicorn's) through the queue; arguments default to the environment."""
+    global _listener, _handler, _rate_limit, _sink
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL") or "INFO").upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT") or "json").lower()
+    if rate_per_site is None:
+        rate_per_site = float(os.getenv("LOG_RATE_PER_SITE", DEFAULT_RATE_PER_SITE))
+
+    _sink = logging.StreamHandler(stream)
+    _sink.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    # Neither format uses process fields; skip collecting them for every record.
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _handler = NonBlockingQueueHandler(records, int(os.getenv("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    _rate_limit = RateLimitFilter(rate_per_site)
+    _handler.addFilter(_rate_limit)      # cheapest rejection first
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(level)
+    for name in _SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+
+    _listener = QueueListener(records, _sink)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Drain the queue and write any later records directly, so shutdown messages are not lost."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    root = logging.getLogger()
+    if _handler in root.handlers:
+        root.handlers[:] = [_sink]
+
+
+def logging_stats() -> Dict[str, int]:
+    return {
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped_queue_full": _handler.dropped if _handler is not None else 0,
+        "dropped_rate_limited": _rate_limit.dropped if _rate_limit is not None else 0,
+    }
@@ -0,0 +1,127 @@
+# observability/profiler.py
+"""
+On-demand sampling profiler. For a fixed window a background thread reads
+every thread's Python stack (`sys._current_frames()`) at a fixed interval and
+counts identical stacks. The result is in the "collapsed stack" format
+(`thread;outer;...;leaf count` per line) that flamegraph.pl, speedscope and
+inferno read directly.
+
+Nothing is hooked into the interpreter, so there is no cost outside a
+profiling window; inside one, each sample costs a stack walk per thread (the
+response reports the measured share of wall time). Stacks parked in the event
+loop's selector or an idle worker's queue wait can be dropped (`idle=False`)
+so the flamegraph shows work, not waiting.
+"""
+
+from __future__ import annotations
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.01         # seconds between samples (100 Hz)
+MAX_SECONDS = 120.0
+
+# Leaf frames (file, function) of threads that are waiting, not working.
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),         # event loop with nothing to do
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),           # executor worker blocked on its queue
+    ("handlers.py", "dequeue"),         # log writer blocked on its queue
+}
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusyError(Exception):
+    """A profiling window is already open."""
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_BACKEND_ROOT):
+        return os.path.relpath(filename, _BACKEND_ROOT)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+class SamplingProfiler:
+    def __init__(self) -> None:
+        self._busy = threading.Lock()
+        self._labels: Dict[Any, str] = {}      # code object -> frame label, reused across samples
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def profile(self, seconds: float, interval: float = DEFAULT_INTERVAL, idle: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """Sample for `seconds` (blocking); returns the collapsed stacks and a summary."""
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running.")
+        try:
+            return self._sample(min(max(seconds, 0.1), MAX_SECONDS), max(interval, 0.001), idle)
+        finally:
+            self._busy.release()
+
+    def _sample(self, seconds: float, interval: float, idle: bool) -> Tuple[str, Dict[str, Any]]:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        names: Dict[int, str] = {}
+        samples = 0
+        sampling_time = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        logger.info(f"Sampling profiler running for {seconds:.1f}s every {interval * 1000:.1f}ms.")
+
+        while time.perf_counter() < deadline:
+            tick = time.perf_counter()
+            frames = sys._current_frames()
+            if len(names) != len(frames) or any(tid not in names for tid in frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in frames.items():
+                if tid == me:
+                    continue
+                code = frame.f_code
+                if not idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                counts[";".join(reversed(stack))] += 1
+            del frames
+            samples += 1
+            spent = time.perf_counter() - tick
+            sampling_time += spent
+            time.sleep(max(interval - spent, 0))
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "seconds": round(elapsed, 2),
+            "samples": samples,
+            "stacks": len(counts),
+            "sample_cost_us": round(sampling_time / max(samples, 1) * 1e6, 1),
+            "overhead_pct": round(100 * sampling_time / elapsed, 2),
+        }
+        logger.info(f"Sampling profiler finished: {summary}")
+        collapsed = "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+        return collapsed + ("\n" if collapsed else ""), summary
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler()
+    return _profiler
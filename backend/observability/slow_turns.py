@@ -0,0 +1,127 @@
+# observability/slow_turns.py
+"""
+Automatic capture of slow turns. When a traced turn (a /chat request or a
+background payment completion) takes longer than SLOW_TURN_THRESHOLD_SECONDS,
+its full span tree (OTLP/JSON), prompt size per LLM call and tool timings are
+copied into a bounded ring buffer (SLOW_TURN_BUFFER_SIZE entries), so a
+latency spike can be inspected after the trace has left the tracer's buffer.
+
+Registered as a tracer listener by `install()`; fast turns cost one
+comparison.
+"""
+
+from __future__ import annotations
+import os
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from observability.tracing import Span, STATUS_ERROR, get_tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 8.0     # seconds; 0 disables capture
+DEFAULT_BUFFER_SIZE = 50
+
+
+def _steps(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Per-LLM-call breakdown: each tool span belongs to the LLM call that ended last before it started."""
+    steps: List[Dict[str, Any]] = []
+    llm_spans = sorted((s for s in spans if s.name == "llm"), key=lambda s: s.start_ns)
+    for s in llm_spans:
+        steps.append({
+            "iteration": s.attributes.get("agent.iteration"),
+            "model": s.attributes.get("llm.model"),
+            "fallback_from": s.attributes.get("llm.fallback_from"),
+            "llm_ms": round(s.duration_ms, 1),
+            "prompt_messages": s.attributes.get("llm.prompt_messages"),
+            "prompt_chars": s.attributes.get("llm.prompt_chars"),
+            "scratchpad_tokens": s.attributes.get("llm.scratchpad_tokens"),
+            "input_tokens": s.attributes.get("llm.input_tokens"),
+            "output_tokens": s.attributes.get("llm.output_tokens"),
+            "tools": [],
+        })
+    for s in sorted((s for s in spans if s.name.startswith("tool ")), key=lambda s: s.start_ns):
+        owner = None
+        for step, llm in zip(steps, llm_spans):
+            if (llm.end_ns or 0) <= s.start_ns:
+                owner = step
+        if owner is not None:
+            owner["tools"].append({"name": s.attributes.get("tool.name", s.name[5:]), "ms": round(s.duration_ms, 1),
+                                   "error": s.status == STATUS_ERROR})
+    return steps
+
+
+class SlowTurnLog:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, size: int = DEFAULT_BUFFER_SIZE) -> None:
+        self.threshold = threshold
+        self._turns: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.captured = 0
+
+    def consider(self, root: Span) -> bool:
+        """Tracer listener: capture the finished turn rooted at `root` if it was slow."""
+        if self.threshold <= 0 or "turn.id" not in root.attributes or root.duration_ms < self.threshold * 1000:
+            return False
+        tracer = get_tracer()
+        spans = tracer.get(root.trace_id) or [root]
+        steps = _steps(spans)
+        entry = {
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "session_id": root.attributes.get("session.id"),
+            "turn_id": root.attributes.get("turn.id"),
+            "start": root.start_ns / 1e9,
+            "duration_ms": round(root.duration_ms, 1),
+            "turn_class": root.attributes.get("route.turn_class"),
+            "tier": root.attributes.get("route.tier"),
+            "outcome": root.attributes.get("chat.outcome") or ("error" if root.status == STATUS_ERROR else "ok"),
+            "admission_wait_ms": root.attributes.get("admission.wait_ms"),
+            "session_lock_wait_ms": root.attributes.get("session_lock.wait_ms"),
+            "llm_calls": len(steps),
+            "llm_ms_total": round(sum(s["llm_ms"] for s in steps), 1),
+            "tool_calls": sum(len(s["tools"]) for s in steps),
+            "prompt_chars_max": max((s["prompt_chars"] or 0 for s in steps), default=0),
+            "input_tokens_total": sum(s["input_tokens"] or 0 for s in steps),
+            "steps": steps,
+            "trace": tracer.to_otlp(spans),
+        }
+        with self._lock:
+            self._turns.append(entry)
+            self.captured += 1
+        logger.warning(f"Slow turn {root.name} for session {entry['session_id']}: {entry['duration_ms']:.0f}ms "
+                       f"({entry['llm_calls']} LLM calls, {entry['tool_calls']} tool calls); captured as {root.trace_id}.")
+        return True
+
+    def recent(self, limit: int = 50, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest first, without the steps and span trees."""
+        with self._lock:
+            turns = list(self._turns)
+        out = [{k: v for k, v in t.items() if k not in ("steps", "trace")}
+               for t in reversed(turns) if not session_id or t["session_id"] == session_id]
+        return out[:limit]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((t for t in self._turns if t["trace_id"] == trace_id), None)
+
+
+_log: Optional[SlowTurnLog] = None
+
+def get_slow_turns() -> SlowTurnLog:
+    """Process-wide slow-turn buffer, configured from the environment on first use."""
+    global _log
+    if _log is None:
+        _log = SlowTurnLog(
+            threshold=float(os.getenv("SLOW_TURN_THRESHOLD_SECONDS", DEFAULT_THRESHOLD)),
+            size=int(os.getenv("SLOW_TURN_BUFFER_SIZE", DEFAULT_BUFFER_SIZE)),
+        )
+    return _log
+
+
+def install() -> SlowTurnLog:
+    """Start capturing: register the buffer as a listener on the process tracer."""
+    log = get_slow_turns()
+    get_tracer().add_listener(log.consider)
+    return log
@@ -0,0 +1,313 @@
+# observability/tracing.py
+"""
+Lightweight per-turn tracing. A turn (one /chat request or one background
+payment completion) is a trace; LLM calls, tool calls and upstream HTTP
+requests inside it are nested spans carrying the session and turn ids.
+The current span lives in a contextvar, so nesting follows asyncio tasks and
+the tool executor's worker threads (which copy the caller's context).
+
+Finished traces are kept in a ring buffer (served by routers/traces.py) and,
+when configured, exported as OTLP/JSON: appended to TRACE_EXPORT_PATH (one
+export request per line) and/or POSTed to TRACE_OTLP_ENDPOINT/v1/traces.
+
+Render a waterfall offline from an export file:
+    python -m observability.tracing traces.jsonl [trace_id]
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 200       # finished traces kept in memory
+SERVICE_NAME = "chai-backend"
+
+# OTLP span kinds / status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, message: str) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class Tracer:
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, export_path: Optional[str] = None,
+                 otlp_endpoint: Optional[str] = None, service_name: str = SERVICE_NAME) -> None:
+        self.buffer_size = buffer_size
+        self.export_path = export_path
+        self.otlp_endpoint = otlp_endpoint.rstrip("/") if otlp_endpoint else None
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._open: Dict[str, List[Span]] = {}
+        self._done: "OrderedDict[str, List[Span]]" = OrderedDict()
+        # One background thread for exports, so a slow collector never delays a turn.
+        self._exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export") if (export_path or otlp_endpoint) else None
+        self._listeners: List[Callable[[Span], None]] = []
+        self.exported = 0
+        self.export_errors = 0
+
+    # ── recording ──────────────────────────────────────────────────────────
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        """Child of the current span (a new trace if there is none); exceptions mark it failed and propagate."""
+        parent = _current.get()
+        if parent is not None:
+            for key in ("session.id", "turn.id"):
+                if key in parent.attributes:
+                    attributes.setdefault(key, parent.attributes[key])
+            span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+        else:
+            span = Span(name, uuid.uuid4().hex, None, kind, attributes)
+            with self._lock:
+                self._open[span.trace_id] = []
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    @contextmanager
+    def turn(self, session_id: str, name: str = "chat.turn", **attributes: Any) -> Iterator[Span]:
+        """Root span of a new trace for one unit of work on a session."""
+        token = _current.set(None)  # never nest a turn under whatever the caller had open
+        try:
+            with self.span(name, KIND_SERVER, **{"session.id": session_id, "turn.id": uuid.uuid4().hex[:12]}, **attributes) as span:
+                yield span
+        finally:
+            _current.reset(token)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            spans = self._open.get(span.trace_id)
+            if spans is not None:
+                spans.append(span)
+                if span.parent_id is not None:
+                    return
+                del self._open[span.trace_id]
+                self._done[span.trace_id] = spans
+                while len(self._done) > self.buffer_size:
+                    self._done.popitem(last=False)
+                batch = list(spans)
+            else:
+                # Finished after its root (e.g. a background prewarm): attach to the stored trace.
+                stored = self._done.get(span.trace_id)
+                if stored is None:
+                    return
+                stored.append(span)
+                batch = [span]
+        if span.parent_id is None:
+            logger.debug(f"Trace {span.trace_id} ({span.name}) finished in {span.duration_ms:.0f}ms.")
+            for listener in self._listeners:
+                try:
+                    listener(span)
+                except Exception as e:
+                    logger.warning(f"Trace listener {getattr(listener, '__name__', listener)} failed: {e}")
+        if self._exporter is not None:
+            self._exporter.submit(self._export, batch)
+
+    def add_listener(self, fn: Callable[[Span], None]) -> None:
+        """Call `fn(root_span)` whenever a trace finishes (on the thread that finished it); keep it cheap."""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    # ── export ─────────────────────────────────────────────────────────────
+    def to_otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+
+    def _export(self, spans: List[Span]) -> None:
+        payload = self.to_otlp(spans)
+        try:
+            if self.export_path:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload) + "\n")
+            if self.otlp_endpoint:
+                import requests
+                requests.post(f"{self.otlp_endpoint}/v1/traces", json=payload, timeout=5).raise_for_status()
+            self.exported += len(spans)
+        except Exception as e:
+            self.export_errors += 1
+            logger.warning(f"Trace export failed: {e}")
+
+    def shutdown(self) -> None:
+        if self._exporter is not None:
+            self._exporter.shutdown(wait=True)
+
+    # ── reads ──────────────────────────────────────────────────────────────
+    def get(self, trace_id: str) -> Optional[List[Span]]:
+        with self._lock:
+            spans = self._done.get(trace_id)
+            return list(spans) if spans is not None else None
+
+    def recent(self, limit: int = 50, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._done.values())
+        out = []
+        for spans in reversed(traces):
+            root = next((s for s in spans if s.parent_id is None), spans[-1])
+            if session_id and root.attributes.get("session.id") != session_id:
+                continue
+            out.append({
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "session_id": root.attributes.get("session.id"),
+                "turn_id": root.attributes.get("turn.id"),
+                "start": root.start_ns / 1e9,
+                "duration_ms": round(root.duration_ms, 1),
+                "spans": len(spans),
+                "error": root.status == STATUS_ERROR or any(s.status == STATUS_ERROR for s in spans),
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+
+# ── waterfall ──────────────────────────────────────────────────────────────
+def render_waterfall(spans: List[Dict[str, Any]], width: int = 48) -> str:
+    """Text waterfall of one trace, from OTLP span dicts (`Span.to_otlp()` or an export file)."""
+    if not spans:
+        return "(no spans)"
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+    end = max(int(s["endTimeUnixNano"]) for s in spans)
+    total = max(end - start, 1)
+    ids = {s["spanId"] for s in spans}
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        parent = s.get("parentSpanId") if s.get("parentSpanId") in ids else ""
+        children.setdefault(parent, []).append(s)
+
+    root = children.get("", [spans[0]])[0]
+    attrs = {a["key"]: next(iter(a["value"].values())) for a in root.get("attributes", [])}
+    lines = [f"trace {root['traceId']}  {root['name']}  session={attrs.get('session.id', '-')}  "
+             f"turn={attrs.get('turn.id', '-')}  {total / 1e6:.0f}ms"]
+
+    def walk(parent: str, depth: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda s: int(s["startTimeUnixNano"])):
+            s_start, s_end = int(s["startTimeUnixNano"]) - start, int(s["endTimeUnixNano"]) - start
+            left = int(width * s_start / total)
+            bar = max(1, int(width * s_end / total) - left)
+            label = ("  " * depth + s["name"])[:40]
+            flag = " !" if s.get("status", {}).get("code") == STATUS_ERROR else ""
+            lines.append(f"{label:<40} |{' ' * left}{'█' * bar}{' ' * max(width - left - bar, 0)}| "
+                         f"{s_start / 1e6:>8.0f} +{(s_end - s_start) / 1e6:>7.0f}ms{flag}")
+            walk(s["spanId"], depth + 1)
+
+    walk("", 0)
+    return "\n".join(lines)
+
+
+_tracer: Optional[Tracer] = None
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer, configured from the environment on first use."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(
+            buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", DEFAULT_BUFFER_SIZE)),
+            export_path=os.getenv("TRACE_EXPORT_PATH") or None,
+            otlp_endpoint=os.getenv("TRACE_OTLP_ENDPOINT") or None,
+        )
+    return _tracer
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any):
+    """Shorthand for `get_tracer().span(...)`."""
+    return get_tracer().span(name, kind, **attributes)
+
+
+def _main(argv: List[str]) -> None:
+    if not argv:
+        print(__doc__)
+        return
+    traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    with open(argv[0], encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for rs in json.loads(line).get("resourceSpans", []):
+                for ss in rs.get("scopeSpans", []):
+                    for s in ss.get("spans", []):
+                        traces.setdefault(s["traceId"], []).append(s)
+    wanted = argv[1:] or list(traces)[-10:]
+    for trace_id in wanted:
+        print(render_waterfall(traces.get(trace_id, [])) + "\n")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
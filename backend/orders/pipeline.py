@@ -0,0 +1,364 @@
+# orders/pipeline.py
+
+from __future__ import annotations
+import os, json, time, uuid, socket, hashlib, threading, weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from orders.store import OrderStore, get_order_store
+from clients.stripe_client import get_stripe_gateway
+from state.session import set_stripe_order_id
+
+logger = logging.getLogger(__name__)
+
+# ── states ─────────────────────────────────────────────────────────────────
+CART = "cart"
+INVOICED = "invoiced"
+PAYMENT_PENDING = "payment_pending"
+PAID = "paid"
+SHIPPED = "shipped"
+EXPIRED = "expired"
+
+TRANSITIONS: Dict[str, set] = {
+    CART: {INVOICED, PAYMENT_PENDING},
+    INVOICED: {INVOICED, PAYMENT_PENDING},
+    # The cart may change after checkout opened: re-invoice or open a new checkout.
+    PAYMENT_PENDING: {INVOICED, PAYMENT_PENDING, PAID, EXPIRED},
+    # Stripe closed the checkout unpaid; a late payment event is still recorded.
+    EXPIRED: {INVOICED, PAYMENT_PENDING, PAID},
+    PAID: {SHIPPED},
+    SHIPPED: set(),
+}
+TERMINAL = {SHIPPED}
+# States a crashed process must pick back up without waiting for the customer.
+RESUMABLE = [PAYMENT_PENDING, PAID]
+
+DEFAULT_MAX_CACHED_SESSIONS = 10_000
+# An external call claimed longer ago than this is taken to have died with its
+# process and may be retried by another one (well above any provider timeout).
+DEFAULT_CALL_CLAIM_TTL = 300.0
+RESUME_LEASE = "resume_pending"
+RESUME_LEASE_TTL = 600.0
+# Stripe expires an unpaid Checkout Session 24 hours after creation by default.
+DEFAULT_CHECKOUT_EXPIRY = 24 * 3600.0
+
+
+class OrderStateError(RuntimeError):
+    """Raised when a step is requested from a state that does not allow it."""
+
+
+class CallInProgressError(RuntimeError):
+    """Raised when another worker is making the same external call right now."""
+
+
+def _fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class OrderPipeline:
+    """
+    Explicit checkout state machine: cart → invoiced → payment_pending → paid → shipped.
+
+    Every transition is persisted (with an audit row) before the caller sees
+    it, and every external call runs under an idempotency key derived from
+    the order, the step and the payload. A completed call is replayed from
+    the store instead of hitting the provider again. A call that was in flight
+    during a crash is retried with the same key, which Stripe and QuickBooks
+    dedupe on their side, once its claim expires; while it is claimed, other
+    workers sharing the database do not make the call. The latest open order per session is kept in memory
+    for O(1) status reads: at most `max_cached_sessions` of them (least
+    recently updated go first), and an order leaves the cache once it is shipped.
+    """
+
+    def __init__(
+        self,
+        store: Optional[OrderStore] = None,
+        max_cached_sessions: int = DEFAULT_MAX_CACHED_SESSIONS,
+        call_claim_ttl: float = DEFAULT_CALL_CLAIM_TTL,
+        checkout_expiry: float = DEFAULT_CHECKOUT_EXPIRY,
+    ) -> None:
+        self.store = store or get_order_store()
+        self.max_cached_sessions = max_cached_sessions
+        self.call_claim_ttl = call_claim_ttl
+        self.checkout_expiry = checkout_expiry
+        # Identifies this process in idempotency claims and leases.
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._by_session: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Weak values: a session's lock disappears once no step holds or waits on it.
+        self._session_locks: "weakref.WeakValueDictionary[str, threading.RLock]" = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+
+    def _session_lock(self, session_id: str) -> threading.RLock:
+        # Steps of one session are serialized; different sessions run in parallel.
+        with self._locks_guard:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.RLock()
+            return lock
+
+    # ── order bookkeeping ──────────────────────────────────────────────────
+    def _cache(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        with self._locks_guard:
+            if order["state"] in TERMINAL:
+                self._by_session.pop(order["session_id"], None)
+                return order
+            self._by_session[order["session_id"]] = order
+            self._by_session.move_to_end(order["session_id"])
+            while len(self._by_session) > self.max_cached_sessions:
+                self._by_session.popitem(last=False)
+        return order
+
+    def current_order(self, session_id: str) -> Optional[Dict[str, Any]]:
+        order = self._by_session.get(session_id)
+        if order is None:
+            order = self.store.latest_for_session(session_id)
+            if order is not None:
+                self._cache(order)
+        return order
+
+    def in_checkout(self, session_id: str) -> bool:
+        """Cheap check (cache only, no DB read) for admission priority: an order is invoiced or being paid."""
+        order = self._by_session.get(session_id)
+        return order is not None and order["state"] in (INVOICED, PAYMENT_PENDING, PAID)
+
+    def _open_order(self, session_id: str) -> Dict[str, Any]:
+        """Latest non-terminal order for the session, or a fresh one."""
+        order = self.current_order(session_id)
+        if order is None or order["state"] in TERMINAL:
+            order = self._cache(self.store.create_order(session_id, CART))
+        return order
+
+    def _transition(self, order: Dict[str, Any], to_state: str, detail: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        if to_state not in TRANSITIONS[order["state"]]:
+            raise OrderStateError(f"Order {order['order_id']} cannot move from {order['state']} to {to_state}.")
+        updated = self.store.update(
+            order["order_id"], detail=detail, expected_state=order["state"], state=to_state, last_error=None, **fields,
+        )
+        if updated is None:
+            # The cached order was stale: another worker moved it first.
+            current = self._cache(self.store.get(order["order_id"]))
+            if current["state"] == to_state:
+                return current
+            raise OrderStateError(f"Order {order['order_id']} is now {current['state']}; it cannot move to {to_state}.")
+        logger.info("Order %s (session %s): %s → %s.", order["order_id"], order["session_id"], order["state"], to_state)
+        return self._cache(updated)
+
+    def _fail(self, order: Dict[str, Any], step: str, error: Exception) -> None:
+        # The state is left as-is so the step can be retried (or resumed).
+        self._cache(self.store.update(order["order_id"], detail=f"{step} failed", last_error=str(error)))
+
+    def _call_once(self, order: Dict[str, Any], step: str, payload: Any, call: Callable[[str], Any]) -> Any:
+        key = f"{order['order_id']}:{step}:{_fingerprint(payload)}"
+        status, result = self.store.begin_call(key, order["order_id"], step, self.worker_id, self.call_claim_ttl)
+        if status == "done":
+            logger.info("Replaying recorded result of %s for order %s.", step, order["order_id"])
+            return result
+        if status == "busy":
+            raise CallInProgressError(f"The {step} for order {order['order_id']} is already in progress.")
+        try:
+            result = call(key)
+        except Exception as e:
+            logger.error("Order %s step %s failed: %s", order["order_id"], step, e, exc_info=True)
+            self.store.release_call(key, self.worker_id)
+            self._fail(order, step, e)
+            raise
+        self.store.finish_call(key, result)
+        return result
+
+    # ── steps ──────────────────────────────────────────────────────────────
+    def create_invoice(self, session_id: str, customer_id: str, line_items: List[Dict[str, Any]], qb=None) -> Dict[str, Any]:
+        with self._session_lock(session_id):
+            order = self._open_order(session_id)
+            if order["state"] in (PAID, SHIPPED):
+                raise OrderStateError("This order has already been paid; start a new order to invoice again.")
+
+            def call(key: str) -> Dict[str, Any]:
+                from tools.quickbooks.quickbooks_wrapper import QuickBooksWrapper
+                client = qb or QuickBooksWrapper()
+                # QuickBooks caps requestid at 50 characters.
+                invoice = client.create_invoice(customer_id, line_items, request_id=hashlib.sha256(key.encode()).hexdigest()[:36])
+                inv = invoice["Invoice"]
+                return {"id": inv["Id"], "doc_number": inv.get("DocNumber", inv["Id"]), "sync_token": inv.get("SyncToken")}
+
+            result = self._call_once(order, "invoice", {"customer_id": customer_id, "lines": line_items}, call)
+            if order["invoice_id"] == result["id"]:
+                return result  # same cart asked twice: nothing changed
+            self._transition(
+                order, INVOICED, detail=f"invoice {result['id']}",
+                customer_id=str(customer_id), invoice_id=result["id"], invoice_doc_number=result["doc_number"],
+            )
+            return result
+
+    def start_payment(self, session_id: str, line_items: List[Dict[str, Any]], cart_version: int = 0) -> Dict[str, Any]:
+        with self._session_lock(session_id):
+            order = self._open_order(session_id)
+            if order["state"] in (PAID, SHIPPED):
+                raise OrderStateError("This order has already been paid.")
+
+            def call(key: str) -> Dict[str, Any]:
+                checkout = get_stripe_gateway().create_checkout_session(
+                    {
+                        "line_items": line_items,
+                        "mode": "payment",
+                        "ui_mode": "embedded",
+                        "billing_address_collection": "required",
+                        "redirect_on_completion": "never",
+                        "metadata": {"session_id": session_id, "order_id": order["order_id"]},
+                    },
+                    idempotency_key=key,
+                )
+                return {"id": checkout.id, "client_secret": checkout.client_secret}
+
+            # Same session + cart version -> same key, so a retried call gets
+            # the checkout Stripe already created instead of a duplicate.
+            payload = {"cart_version": cart_version, "lines": line_items}
+            result = self._call_once(order, "payment", payload, call)
+            self._transition(order, PAYMENT_PENDING, detail=f"checkout {result['id']}", stripe_session_id=result["id"])
+            set_stripe_order_id(session_id, result["id"])
+            return result
+
+    def confirm_payment(self, session_id: str) -> Dict[str, Any]:
+        """Check payment, answering from local state once the order is known to be paid."""
+        with self._session_lock(session_id):
+            order = self.current_order(session_id)
+            if order is None or not order["stripe_session_id"]:
+                raise OrderStateError("No checkout has been started for this session.")
+            if order["state"] in (PAID, SHIPPED):
+                return order
+
+            checkout = get_stripe_gateway().retrieve_checkout_session(order["stripe_session_id"])
+            if checkout.payment_status == "paid":
+                order = self._transition(order, PAID, detail="payment verified")
+            return order
+
+    def mark_paid(self, stripe_session_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Record a payment confirmed out-of-band (e.g. by a webhook). Returns
+        (order or None if unknown, whether this call moved it to paid).
+        """
+        order = self.store.find_by_stripe_session(stripe_session_id)
+        if order is None:
+            return None, False
+        with self._session_lock(order["session_id"]):
+            order = self._cache(self.store.get(order["order_id"]))
+            if order["state"] not in (PAYMENT_PENDING, EXPIRED):
+                return order, False
+            return self._transition(order, PAID, detail="payment confirmed by Stripe"), True
+
+    def ship(self, session_id: str) -> Dict[str, Any]:
+        with self._session_lock(session_id):
+            order = self.current_order(session_id)
+            if order is None:
+                raise OrderStateError("There is no order for this session.")
+            if order["state"] == SHIPPED:
+                return order
+            if order["state"] != PAID:
+                raise OrderStateError("Payment has not been completed for this order yet.")
+
+            def call(key: str) -> Dict[str, Any]:
+                from tools.fedex.fedex_api_wrapper import FedExWrapper
+                # FedEx has no idempotency header; the recorded result is what
+                # prevents a second label for the same order.
+                result = FedExWrapper().create_shipment()
+                if not result["success"]:
+                    raise RuntimeError(f"FedEx shipment failed: {result['error']}")
+                return {"tracking_number": result.get("tracking_number"), "label_url": result.get("label_url")}
+
+            result = self._call_once(order, "shipment", {"order_id": order["order_id"]}, call)
+            return self._transition(
+                order, SHIPPED, detail=f"tracking {result['tracking_number']}",
+                tracking_number=result["tracking_number"], label_url=result["label_url"],
+            )
+
+    def on_payment_complete(self, session_id: str) -> Dict[str, Any]:
+        """Verify payment and ship in one go, without an LLM turn."""
+        with self._session_lock(session_id):
+            order = self.confirm_payment(session_id)
+            if order["state"] == PAID:
+                order = self.ship(session_id)
+            return order
+
+    # ── recovery & reads ───────────────────────────────────────────────────
+    def begin_resume(self) -> List[Dict[str, Any]]:
+        """
+        Orders left mid-pipeline by a crash or restart, for `resume_order`.
+        Every worker calls this at startup; only the one that gets the resume
+        lease receives orders (the others get []) and must call `end_resume`.
+        Checkouts last updated longer ago than `checkout_expiry` are marked
+        expired here instead of being polled again.
+        """
+        if not self.store.acquire_lease(RESUME_LEASE, self.worker_id, RESUME_LEASE_TTL):
+            logger.info("Another worker is resuming pending orders.")
+            return []
+        cutoff = time.time() - self.checkout_expiry
+        orders = []
+        for order in self.store.in_states(RESUMABLE):
+            if order["state"] == PAYMENT_PENDING and order["updated_at"] < cutoff:
+                try:
+                    self._transition(order, EXPIRED, detail="checkout expired")
+                except OrderStateError as e:
+                    logger.info("Not expiring order %s: %s", order["order_id"], e)
+            else:
+                orders.append(order)
+        return orders
+
+    def resume_order(self, order: Dict[str, Any]) -> bool:
+        """Drive one order from `begin_resume` as far as it can go; True once it shipped."""
+        self.store.acquire_lease(RESUME_LEASE, self.worker_id, RESUME_LEASE_TTL)   # keep the lease while working
+        self._cache(order)
+        if order["state"] == PAYMENT_PENDING and order["stripe_session_id"]:
+            order = self.confirm_payment(order["session_id"])
+        if order["state"] != PAID:
+            return False
+        return self.ship(order["session_id"])["state"] == SHIPPED
+
+    def end_resume(self) -> None:
+        self.store.release_lease(RESUME_LEASE, self.worker_id)
+
+    def resume_pending(self) -> int:
+        """`begin_resume` + `resume_order` for each order + `end_resume`, in the calling thread."""
+        resumed = 0
+        try:
+            for order in self.begin_resume():
+                try:
+                    resumed += self.resume_order(order)
+                except CallInProgressError as e:
+                    logger.info("Skipping order %s: %s", order["order_id"], e)
+                except Exception as e:
+                    logger.error("Could not resume order %s: %s", order["order_id"], e, exc_info=True)
+        finally:
+            self.end_resume()
+        if resumed:
+            logger.info("Resumed %d order(s) after restart.", resumed)
+        return resumed
+
+    def status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        order = self.current_order(session_id)
+        if order is None:
+            return None
+        return {
+            "order_id": order["order_id"],
+            "state": order["state"],
+            "invoice_id": order["invoice_id"],
+            "invoice_doc_number": order["invoice_doc_number"],
+            "stripe_session_id": order["stripe_session_id"],
+            "tracking_number": order["tracking_number"],
+            "label_url": order["label_url"],
+            "last_error": order["last_error"],
+            "updated_at": order["updated_at"],
+        }
+
+
+_pipeline: Optional[OrderPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_order_pipeline() -> OrderPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = OrderPipeline(
+                max_cached_sessions=int(os.getenv("ORDER_CACHE_MAX_SESSIONS", DEFAULT_MAX_CACHED_SESSIONS)),
+                checkout_expiry=float(os.getenv("STRIPE_CHECKOUT_EXPIRY_SECONDS", DEFAULT_CHECKOUT_EXPIRY)),
+            )
+        return _pipeline
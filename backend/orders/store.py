@@ -0,0 +1,264 @@
+# orders/store.py
+
+from __future__ import annotations
+import os, json, time, uuid, sqlite3, threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DB_PATH = PROJECT_ROOT / ".data" / "orders.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id           TEXT PRIMARY KEY,
+    session_id         TEXT NOT NULL,
+    state              TEXT NOT NULL,
+    customer_id        TEXT,
+    invoice_id         TEXT,
+    invoice_doc_number TEXT,
+    stripe_session_id  TEXT,
+    tracking_number    TEXT,
+    label_url          TEXT,
+    last_error         TEXT,
+    created_at         REAL NOT NULL,
+    updated_at         REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_session ON orders (session_id, created_at);
+CREATE INDEX IF NOT EXISTS orders_by_stripe_session ON orders (stripe_session_id);
+CREATE INDEX IF NOT EXISTS orders_by_state ON orders (state);
+
+CREATE TABLE IF NOT EXISTS order_events (
+    order_id   TEXT NOT NULL,
+    at         REAL NOT NULL,
+    from_state TEXT,
+    to_state   TEXT,
+    detail     TEXT
+);
+CREATE INDEX IF NOT EXISTS order_events_by_order ON order_events (order_id, at);
+
+CREATE TABLE IF NOT EXISTS idempotency (
+    key        TEXT PRIMARY KEY,
+    order_id   TEXT NOT NULL,
+    step       TEXT NOT NULL,
+    status     TEXT NOT NULL,      -- 'pending' until the external call returned, then 'done'
+    result     TEXT,
+    claimed_by TEXT,               -- process making the call while 'pending'
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+-- Named leases, so a job runs on one worker at a time.
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    holder     TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+_ORDER_FIELDS = {
+    "state", "customer_id", "invoice_id", "invoice_doc_number", "stripe_session_id",
+    "tracking_number", "label_url", "last_error",
+}
+
+# Columns added after the first release; created on databases that predate them.
+_MIGRATIONS = {
+    "idempotency": {"claimed_by": "TEXT", "claimed_at": "REAL"},
+}
+
+
+class OrderStore:
+    """
+    SQLite persistence for orders, their state transitions and the outcome of
+    every idempotent external call. One connection guarded by a lock; WAL
+    mode keeps reads cheap while a write is in progress.
+    """
+
+    def __init__(self, path: Path = DEFAULT_DB_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        logger.info(f"OrderStore opened at {self.path}")
+
+    def _migrate(self) -> None:
+        for table, columns in _MIGRATIONS.items():
+            have = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, kind in columns.items():
+                if name not in have:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+
+    # ── orders ─────────────────────────────────────────────────────────────
+    def create_order(self, session_id: str, state: str) -> Dict[str, Any]:
+        now = time.time()
+        order_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO orders (order_id, session_id, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (order_id, session_id, state, now, now),
+            )
+            self._conn.execute(
+                "INSERT INTO order_events (order_id, at, from_state, to_state, detail) VALUES (?, ?, NULL, ?, 'created')",
+                (order_id, now, state),
+            )
+        logger.info(f"Created order {order_id} for session {session_id}.")
+        return self.get(order_id)
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM orders WHERE session_id = ? ORDER BY created_at DESC LIMIT 1", (session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_stripe_session(self, stripe_session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM orders WHERE stripe_session_id = ?", (stripe_session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def in_states(self, states: List[str]) -> List[Dict[str, Any]]:
+        marks = ",".join("?" for _ in states)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM orders WHERE state IN ({marks})", tuple(states)).fetchall()
+        return [dict(r) for r in rows]
+
+    def update(
+        self, order_id: str, detail: Optional[str] = None, expected_state: Optional[str] = None, **fields: Any,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update order columns; a change of `state` is also appended to
+        order_events. With `expected_state`, the row is only written if it is
+        still in that state (checked in the UPDATE itself, so it holds across
+        processes); otherwise nothing changes and None is returned.
+        """
+        unknown = set(fields) - _ORDER_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown order fields: {sorted(unknown)}")
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute("SELECT state FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+            if cur is None:
+                raise KeyError(order_id)
+            from_state = cur["state"] if expected_state is None else expected_state
+            self._conn.execute("BEGIN")
+            try:
+                if fields:
+                    cols = ", ".join(f"{k} = ?" for k in fields)
+                    where, args = "order_id = ?", [order_id]
+                    if expected_state is not None:
+                        where, args = "order_id = ? AND state = ?", [order_id, expected_state]
+                    changed = self._conn.execute(
+                        f"UPDATE orders SET {cols}, updated_at = ? WHERE {where}",
+                        (*fields.values(), now, *args),
+                    ).rowcount
+                    if not changed:
+                        self._conn.execute("ROLLBACK")
+                        return None
+                if ("state" in fields and fields["state"] != from_state) or detail:
+                    self._conn.execute(
+                        "INSERT INTO order_events (order_id, at, from_state, to_state, detail) VALUES (?, ?, ?, ?, ?)",
+                        (order_id, now, from_state, fields.get("state", from_state), detail),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(order_id)
+
+    def events(self, order_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT at, from_state, to_state, detail FROM order_events WHERE order_id = ? ORDER BY at", (order_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    # ── idempotent external calls ──────────────────────────────────────────
+    def begin_call(self, key: str, order_id: str, step: str, owner: str, claim_ttl: float) -> Tuple[str, Any]:
+        """
+        Claim the external call registered under `key` for `owner`. Returns
+        ('done', result) if it already completed, ('claimed', None) if the
+        caller should make the call now, or ('busy', None) if another process
+        claimed it less than `claim_ttl` seconds ago. A claim left behind by a
+        process that crashed mid-call expires after `claim_ttl`; the caller
+        then retries with the same key and relies on the provider's idempotency.
+
+        The claim is a single conditional INSERT / UPDATE, so two workers
+        sharing the database never both get ('claimed', None) for one key.
+        """
+        now = time.time()
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO idempotency (key, order_id, step, status, claimed_by, claimed_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?, ?)",
+                (key, order_id, step, owner, now, now, now),
+            ).rowcount
+            if inserted:
+                return "claimed", None
+            claimed = self._conn.execute(
+                "UPDATE idempotency SET claimed_by = ?, claimed_at = ?, updated_at = ? "
+                "WHERE key = ? AND status = 'pending' AND (claimed_at IS NULL OR claimed_at < ?)",
+                (owner, now, now, key, now - claim_ttl),
+            ).rowcount
+            if claimed:
+                return "claimed", None
+            row = self._conn.execute("SELECT status, result FROM idempotency WHERE key = ?", (key,)).fetchone()
+        if row["status"] == "done":
+            return "done", json.loads(row["result"]) if row["result"] else None
+        return "busy", None
+
+    def finish_call(self, key: str, result: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE idempotency SET status = 'done', result = ?, claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE key = ?",
+                (json.dumps(result), time.time(), key),
+            )
+
+    def release_call(self, key: str, owner: str) -> None:
+        """Drop `owner`'s claim after a failed call so a retry need not wait for it to expire."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE idempotency SET claimed_by = NULL, claimed_at = NULL, updated_at = ? "
+                "WHERE key = ? AND status = 'pending' AND claimed_by = ?",
+                (time.time(), key, owner),
+            )
+
+    # ── leases ─────────────────────────────────────────────────────────────
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Take (or extend) the lease `name` for `ttl` seconds unless another holder has it."""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl, now),
+            ).rowcount > 0
+
+    def release_lease(self, name: str, holder: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+_store: Optional[OrderStore] = None
+_store_lock = threading.Lock()
+
+def get_order_store() -> OrderStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = OrderStore(Path(os.getenv("ORDERS_DB_PATH", DEFAULT_DB_PATH)))
+        return _store
@@ -0,0 +1,49 @@
+import os
+import hmac
+import asyncio
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from observability.profiler import get_profiler, ProfilerBusyError, MAX_SECONDS
+from observability.slow_turns import get_slow_turns
+
+logger = logging.getLogger(__name__)
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """When ADMIN_TOKEN is set, admin endpoints need it in the X-Admin-Token header."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if expected and not hmac.compare_digest(x_admin_token or "", expected):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10.0, interval_ms: float = 10.0, idle: bool = False):
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks
+    (flamegraph.pl / speedscope input). Only one profile runs at a time.
+    """
+    if not 0 < seconds <= MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"seconds must be in (0, {MAX_SECONDS:.0f}].")
+    try:
+        collapsed, summary = await asyncio.to_thread(get_profiler().profile, seconds, interval_ms / 1000, idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    headers = {f"X-Profile-{k.replace('_', '-').title()}": str(v) for k, v in summary.items()}
+    return PlainTextResponse(collapsed, headers=headers)
+
+@router.get("/slow-turns")
+def slow_turns(limit: int = 50, session_id: Optional[str] = None):
+    """Captured slow turns (newest first), without their span trees."""
+    log = get_slow_turns()
+    return {"threshold_seconds": log.threshold, "captured": log.captured,
+            "turns": log.recent(limit=limit, session_id=session_id)}
+
+@router.get("/slow-turns/{trace_id}")
+def slow_turn(trace_id: str):
+    """One captured turn: step and tool timings, prompt sizes and the OTLP span tree."""
+    turn = get_slow_turns().get(trace_id)
+    if turn is None:
+        raise HTTPException(status_code=404, detail="Slow turn not found (it may have been evicted).")
+    return turn
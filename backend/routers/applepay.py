@@ -2,18 +2,18 @@ import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from tools.payment.applepay.apple_pay_tool import (
-    generate_apple_pay_link,
-    get_apple_pay_session_status,
-    save_apple_pay_session_id,
-    get_apple_pay_session_id,
-)
 
 logger = logging.getLogger(__name__)
 
+def _apple_pay():
+    # Rarely used: the tool module (and the Stripe SDK behind it) loads on the first Apple Pay request.
+    from tools.payment.applepay import apple_pay_tool
+    return apple_pay_tool
+
 router = APIRouter(prefix="/api/applepay", tags=["applepay"])
 
 class ApplePayLinkRequest(BaseModel):
+    session_id: str
     amount: float
     currency: str = "USD"
     order_id: Optional[str] = None
@@ -24,29 +24,29 @@ def create_link(req: ApplePayLinkRequest):
     logger.info(f"Received request to create Apple Pay link for amount: {req.amount} {req.currency}")
     try:
         product_name = req.description or "Chai Corner Order"
-        url = generate_apple_pay_link.invoke({"amount_dollars": req.amount, "product_name": product_name})
+        url = _apple_pay().generate_apple_pay_link.invoke({"session_id": req.session_id, "amount_dollars": req.amount, "product_name": product_name})
         logger.info(f"Successfully generated Apple Pay link: {url}")
         return {"url": url}
     except Exception as e:
         logger.error(f"Failed to create Apple Pay link. Error: {e}", exc_info=True)
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/session/{session_id}")
-def set_session(session_id: str):
-    logger.info(f"Received request to set Apple Pay session ID: {session_id}")
+@router.post("/session/{session_id}/{checkout_session_id}")
+def set_session(session_id: str, checkout_session_id: str):
+    logger.info(f"Received request to set Apple Pay session ID: {checkout_session_id} for session: {session_id}")
     try:
-        save_apple_pay_session_id(session_id)
-        logger.info(f"Successfully saved Apple Pay session ID: {session_id}")
-        return {"ok": True, "session_id": session_id}
+        _apple_pay().save_apple_pay_session_id.invoke({"session_id": session_id, "checkout_session_id": checkout_session_id})
+        logger.info(f"Successfully saved Apple Pay session ID: {checkout_session_id}")
+        return {"ok": True, "session_id": session_id, "checkout_session_id": checkout_session_id}
     except Exception as e:
-        logger.error(f"Failed to set Apple Pay session ID: {session_id}. Error: {e}", exc_info=True)
+        logger.error(f"Failed to set Apple Pay session ID: {checkout_session_id}. Error: {e}", exc_info=True)
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/session")
-def get_session():
-    logger.info("Received request to get Apple Pay session ID.")
+@router.get("/session/{session_id}")
+def get_session(session_id: str):
+    logger.info(f"Received request to get Apple Pay session ID for session: {session_id}")
     try:
-        sid = get_apple_pay_session_id()
+        sid = _apple_pay().get_apple_pay_session_id.invoke({"session_id": session_id})
         logger.info(f"Successfully retrieved Apple Pay session ID: {sid}")
         return {"session_id": sid}
     except Exception as e:
@@ -54,12 +54,12 @@ def get_session():
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/status/{session_id}")
-def status(session_id: str):
-    logger.info(f"Received request to get Apple Pay session status for ID: {session_id}")
+def status(session_id: str, checkout_session_id: Optional[str] = None):
+    logger.info(f"Received request to get Apple Pay session status for session: {session_id}")
     try:
-        result = get_apple_pay_session_status(session_id)
+        result = _apple_pay().get_apple_pay_session_status.invoke({"session_id": session_id, "checkout_session_id": checkout_session_id})
         logger.info(f"Successfully retrieved status for session ID {session_id}.")
         return result
     except Exception as e:
         logger.error(f"Failed to get Apple Pay session status for ID: {session_id}. Error: {e}", exc_info=True)
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
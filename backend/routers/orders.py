@@ -0,0 +1,23 @@
+import logging
+from fastapi import APIRouter, HTTPException
+from orders.pipeline import get_order_pipeline
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/orders", tags=["orders"])
+
+@router.get("/{session_id}")
+def order_status(session_id: str):
+    """Latest order for the session, served from the pipeline's local state."""
+    status = get_order_pipeline().status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No order for this session.")
+    return status
+
+@router.get("/{session_id}/events")
+def order_events(session_id: str):
+    pipeline = get_order_pipeline()
+    status = pipeline.status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No order for this session.")
+    return {"order_id": status["order_id"], "events": pipeline.store.events(status["order_id"])}
@@ -2,7 +2,7 @@ import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from state.session import get_paypal_order_id, set_paypal_order_id
+from state.session import get_paypal_order_id, set_paypal_order_id, get_session_for_paypal_order
 from tools.payment.paypal.paypal_tool import create_paypal_order, capture_paypal_order
 
 logger = logging.getLogger(__name__)
@@ -10,13 +10,14 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/paypal", tags=["paypal"])
 
 class SaveOrder(BaseModel):
+    session_id: str
     order_id: str
 
 @router.post("/paypal_order_id")
 def save(o: SaveOrder):
-    logger.info(f"Received request to save PayPal order ID: {o.order_id}")
+    logger.info(f"Received request to save PayPal order ID: {o.order_id} for session: {o.session_id}")
     try:
-        set_paypal_order_id(o.order_id)
+        set_paypal_order_id(o.session_id, o.order_id)
         logger.info("Successfully saved PayPal order ID.")
         return {"ok": True}
     except Exception as e:
@@ -24,10 +25,10 @@ def save(o: SaveOrder):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/paypal_order_id")
-def get():
-    logger.info("Received request to get PayPal order ID.")
+def get(session_id: str):
+    logger.info(f"Received request to get PayPal order ID for session: {session_id}")
     try:
-        order_id = get_paypal_order_id()
+        order_id = get_paypal_order_id(session_id)
         logger.info(f"Successfully retrieved PayPal order ID: {order_id}")
         return {"order_id": order_id}
     except Exception as e:
@@ -37,12 +38,13 @@ def get():
 class CreateOrder(BaseModel):
     amount: str
     currency: str = "USD"
+    session_id: Optional[str] = None
 
 @router.post("/order")
 def order(req: CreateOrder):
     logger.info(f"Received request to create PayPal order for amount: {req.amount} {req.currency}")
     try:
-        result = create_paypal_order(req.amount, req.currency)
+        result = create_paypal_order(float(req.amount), req.currency, session_id=req.session_id)
         logger.info(f"Successfully created PayPal order. Order ID: {result.get('id')}")
         return result
     except Exception as e:
@@ -51,11 +53,24 @@ def order(req: CreateOrder):
 
 @router.post("/capture/{order_id}")
 def capture(order_id: str):
-    logger.info(f"Received request to capture PayPal order with ID: {order_id}")
+    session_id = get_session_for_paypal_order(order_id)
+    logger.info(f"Received request to capture PayPal order with ID: {order_id} (session: {session_id})")
     try:
         result = capture_paypal_order(order_id)
         logger.info(f"Successfully captured PayPal order: {order_id}.")
         return result
     except Exception as e:
         logger.error(f"Failed to capture PayPal order with ID: {order_id}. Error: {e}", exc_info=True)
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/capture")
+def capture_for_session(session_id: str):
+    """Capture the PayPal order saved for the session."""
+    logger.info(f"Received request to capture the PayPal order of session: {session_id}")
+    try:
+        result = capture_paypal_order(session_id=session_id)
+        logger.info(f"Successfully captured PayPal order for session: {session_id}.")
+        return result
+    except Exception as e:
+        logger.error(f"Failed to capture PayPal order for session: {session_id}. Error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
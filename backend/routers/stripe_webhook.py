@@ -0,0 +1,55 @@
+import os
+import logging
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from orders.pipeline import get_order_pipeline
+from runtime.pubsub import publish_session_event
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/stripe", tags=["stripe"])
+
+# Checkout events that mean the money is in. `completed` also fires for
+# delayed payment methods before they settle, so its payment_status is checked.
+PAID_EVENTS = {"checkout.session.completed", "checkout.session.async_payment_succeeded"}
+
+@router.post("/webhook")
+async def stripe_webhook(request: Request):
+    secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+    if not secret:
+        logger.error("Stripe webhook called but STRIPE_WEBHOOK_SECRET is not configured.")
+        raise HTTPException(status_code=503, detail="Webhook secret not configured.")
+
+    import stripe  # the SDK is loaded on first use, not at startup
+
+    payload = await request.body()
+    signature = request.headers.get("stripe-signature", "")
+    try:
+        event = stripe.Webhook.construct_event(payload, signature, secret)
+    except ValueError as e:
+        logger.warning(f"Rejected Stripe webhook with invalid payload: {e}")
+        raise HTTPException(status_code=400, detail="Invalid payload.")
+    except stripe.error.SignatureVerificationError as e:
+        logger.warning(f"Rejected Stripe webhook with bad signature: {e}")
+        raise HTTPException(status_code=400, detail="Invalid signature.")
+
+    logger.info(f"Stripe webhook event {event['id']} ({event['type']}) received.")
+    if event["type"] not in PAID_EVENTS:
+        return {"received": True}
+
+    checkout = event["data"]["object"]
+    if checkout.get("payment_status") != "paid":
+        logger.info(f"Checkout {checkout['id']} completed but not paid yet ({checkout.get('payment_status')}).")
+        return {"received": True}
+
+    # Indexed lookup on the Stripe checkout id; replays of the same event are no-ops.
+    order, newly_paid = await run_in_threadpool(get_order_pipeline().mark_paid, checkout["id"])
+    if order is None:
+        logger.warning(f"No order found for Stripe checkout {checkout['id']}.")
+        return {"received": True}
+    if not newly_paid:
+        logger.info(f"Stripe event {event['id']}: order {order['order_id']} already {order['state']}; nothing to do.")
+        return {"received": True}
+
+    await publish_session_event(order["session_id"], "payment_confirmed", order_id=order["order_id"], state=order["state"])
+    return {"received": True}
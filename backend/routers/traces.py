@@ -0,0 +1,32 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from observability.tracing import get_tracer, render_waterfall
+from routers.admin import require_admin
+
+logger = logging.getLogger(__name__)
+
+# Traces carry session ids and full span attributes: admin only, like /api/admin.
+router = APIRouter(prefix="/api/traces", tags=["traces"], dependencies=[Depends(require_admin)])
+
+@router.get("")
+def recent_traces(limit: int = 50, session_id: Optional[str] = None):
+    """Most recent turns (newest first), optionally for one session."""
+    return get_tracer().recent(limit=limit, session_id=session_id)
+
+@router.get("/{trace_id}")
+def trace_otlp(trace_id: str):
+    """One turn as an OTLP/JSON export request (loadable by any OTLP-compatible viewer)."""
+    tracer = get_tracer()
+    spans = tracer.get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have been evicted).")
+    return tracer.to_otlp(spans)
+
+@router.get("/{trace_id}/waterfall", response_class=PlainTextResponse)
+def trace_waterfall(trace_id: str):
+    spans = get_tracer().get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have been evicted).")
+    return render_waterfall([s.to_otlp() for s in spans])
@@ -0,0 +1,167 @@
+# runtime/admission.py
+
+from __future__ import annotations
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT = 16    # agent turns running at once, process-wide
+DEFAULT_MAX_QUEUE = 64         # turns allowed to wait for a slot
+DEFAULT_MAX_WAIT = 10.0        # seconds a queued turn waits before it is shed
+DEFAULT_PER_CLIENT = 4         # running + queued turns per client
+
+# Lower runs first. Sessions already in checkout are closest to revenue and
+# hold provider state (open invoice / checkout), so they jump the queue.
+PRIORITY_CHECKOUT = 0
+PRIORITY_DEFAULT = 1
+
+
+class AdmissionRejected(Exception):
+    """A turn was not admitted; `status` is 429 (client over its share) or 503 (server saturated)."""
+
+    def __init__(self, status: int, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Global concurrency limit for agent turns with a bounded priority wait
+    queue, plus a per-client cap. Rejections are immediate (queue full,
+    client over its cap) or after `max_wait` in the queue, so overload turns
+    into fast 429/503s instead of every request slowing down together.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        per_client: int = DEFAULT_PER_CLIENT,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_client = per_client
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._clients: Dict[str, int] = {}
+        self._counters = {"admitted": 0, "rejected_client": 0, "shed_queue_full": 0, "shed_timeout": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._queued_max = 0
+
+    def _retry_after(self) -> int:
+        # Rough time for the current backlog to drain one slot's worth.
+        return max(1, min(int(self.max_wait), 1 + self._queued() // max(self.max_concurrent, 1)))
+
+    def _queued(self) -> int:
+        return sum(1 for *_, fut in self._waiters if not fut.done())
+
+    async def _acquire(self, priority: int) -> None:
+        if self.in_flight < self.max_concurrent and not self._queued():
+            self.in_flight += 1
+            return
+        if self._queued() >= self.max_queue and not self._displace(priority):
+            self._counters["shed_queue_full"] += 1
+            raise AdmissionRejected(503, "Server is at capacity.", self._retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._queued_max = max(self._queued_max, self._queued())
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                return  # the slot was handed over just as we timed out: keep it
+            fut.cancel()
+            self._counters["shed_timeout"] += 1
+            raise AdmissionRejected(503, "Server is busy; timed out waiting for a slot.", self._retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release()  # handed a slot we will never use
+            else:
+                fut.cancel()
+            raise
+
+    def _displace(self, priority: int) -> bool:
+        """Full queue: shed the newest waiter of a lower priority to make room; False if there is none."""
+        live = [w for w in self._waiters if not w[2].done()]
+        victim = max(live, key=lambda w: (w[0], w[1]), default=None)
+        if victim is None or victim[0] <= priority:
+            return False
+        self._counters["shed_queue_full"] += 1
+        victim[2].set_exception(AdmissionRejected(503, "Server is at capacity.", self._retry_after()))
+        return True
+
+    def _release(self) -> None:
+        # Hand the slot straight to the best waiter, so in_flight never dips
+        # and a new arrival cannot overtake the queue.
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, client_id: str, priority: int = PRIORITY_DEFAULT) -> AsyncIterator[None]:
+        if self._clients.get(client_id, 0) >= self.per_client:
+            self._counters["rejected_client"] += 1
+            raise AdmissionRejected(429, "Too many concurrent requests from this client.", 1)
+        self._clients[client_id] = self._clients.get(client_id, 0) + 1
+        started = time.perf_counter()
+        try:
+            await self._acquire(priority)
+            waited = time.perf_counter() - started
+            self._counters["admitted"] += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            remaining = self._clients[client_id] - 1
+            if remaining:
+                self._clients[client_id] = remaining
+            else:
+                del self._clients[client_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._queued(),
+            "queue_depth_max": self._queued_max,
+            "max_queue": self.max_queue,
+            "clients": len(self._clients),
+            "wait_avg_ms": round(1000 * self._wait_total / max(self._counters["admitted"], 1), 2),
+            "wait_max_ms": round(1000 * self._wait_max, 2),
+            **self._counters,
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller, configured from the environment on first use."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENT", DEFAULT_MAX_CONCURRENT)),
+            max_queue=int(os.getenv("CHAT_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+            max_wait=float(os.getenv("CHAT_MAX_QUEUE_WAIT_SECONDS", DEFAULT_MAX_WAIT)),
+            per_client=int(os.getenv("CHAT_MAX_PER_CLIENT", DEFAULT_PER_CLIENT)),
+        )
+    return _controller
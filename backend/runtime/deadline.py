@@ -0,0 +1,62 @@
+# runtime/deadline.py
+"""
+Per-turn deadlines. `/chat` opens a `deadline(seconds)` scope; everything the
+turn does afterwards (LLM calls, tool calls on the executor, upstream HTTP
+requests in its worker threads) reads the time left from a contextvar and
+caps its own timeout with `clamp()`, so one slow dependency cannot hold the
+customer past the turn's budget. Outside a scope there is no deadline and
+every helper is a no-op.
+"""
+
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)   # time.monotonic() value
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current turn's deadline has passed."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline `seconds` from now (a tighter enclosing one wins; None or <= 0: no deadline)."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (negative once passed), or None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(what: str = "call") -> None:
+    """Raise DeadlineExceeded instead of starting `what` after the deadline."""
+    if expired():
+        raise DeadlineExceeded(f"Turn deadline passed; not starting {what}.")
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` capped at the time left (never below 1ms); None stays None without a deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.001)
+    return left if timeout is None else min(timeout, left)
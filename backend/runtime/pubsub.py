@@ -0,0 +1,243 @@
+# runtime/pubsub.py
+
+from __future__ import annotations
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64          # events buffered per subscriber before the oldest is dropped
+DEFAULT_CHANNEL_PREFIX = "chai:session:"
+
+
+class Subscription:
+    """
+    One subscriber's view of a session's events (e.g. one WebSocket). The
+    queue is bounded: when a slow client falls behind, the oldest event is
+    dropped so publishers never wait on it.
+    """
+
+    def __init__(self, broker: "InProcessBroker", session_id: str, maxsize: int = DEFAULT_QUEUE_SIZE) -> None:
+        self.broker = broker
+        self.session_id = session_id
+        # Events are queued pre-serialized so the backlog can be measured in bytes.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.queued_bytes = 0
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, payload: str) -> None:
+        if self.closed:
+            return
+        if self.queue.full():
+            self.queued_bytes -= len(self.queue.get_nowait())
+            self.dropped += 1
+            logger.warning(f"Subscriber of session {self.session_id} is slow; dropped an event ({self.dropped} so far).")
+        self.queued_bytes += len(payload)
+        self.queue.put_nowait(payload)
+
+    async def get_text(self) -> str:
+        """Next event as the JSON text to put on the wire."""
+        payload = await self.queue.get()
+        self.queued_bytes -= len(payload)
+        return payload
+
+    async def get(self) -> Dict[str, Any]:
+        return json.loads(await self.get_text())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.get()
+
+    async def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            await self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Per-session fan-out to every subscriber in this process."""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        self._subs.clear()
+
+    async def subscribe(self, session_id: str) -> Subscription:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sub = Subscription(self, session_id, self.queue_size)
+        self._subs.setdefault(session_id, set()).add(sub)
+        logger.debug("New subscriber for session %s (%s total).", session_id, len(self._subs[session_id]))
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subs.get(sub.session_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.session_id]
+
+    def subscriber_count(self, session_id: str) -> int:
+        return len(self._subs.get(session_id, ()))
+
+    async def has_subscribers(self, session_id: str) -> bool:
+        """Whether an event published now for the session would reach anyone."""
+        return self.subscriber_count(session_id) > 0
+
+    def _deliver(self, session_id: str, payload: str) -> int:
+        subs = self._subs.get(session_id, ())
+        for sub in list(subs):
+            sub.offer(payload)
+        return len(subs)
+
+    async def publish(self, session_id: str, event: Dict[str, Any]) -> int:
+        """Send `event` to every subscriber of the session; returns how many local subscribers got it."""
+        self.published += 1
+        return self._deliver(session_id, json.dumps(event))
+
+    def publish_threadsafe(self, session_id: str, event: Dict[str, Any]) -> None:
+        """Publish from a worker thread (e.g. a tool running on the executor)."""
+        if self._loop is None:
+            logger.warning(f"Dropping event {event.get('type')} for session {session_id}: broker not started.")
+            return
+        asyncio.run_coroutine_threadsafe(self.publish(session_id, event), self._loop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "published": self.published,
+            "sessions": len(self._subs),
+            "subscribers": sum(len(s) for s in self._subs.values()),
+            "queued_bytes": sum(sub.queued_bytes for subs in self._subs.values() for sub in subs),
+        }
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Fan-out across workers over Redis pub/sub, one channel per session. Each
+    worker only subscribes to channels of sessions it has local subscribers
+    for, and delivers what it receives through the in-process fan-out.
+
+    `client` is anything speaking the redis.asyncio API (a fakeredis client
+    works for local runs); by default one is created from `url`.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 prefix: str = DEFAULT_CHANNEL_PREFIX) -> None:
+        super().__init__(queue_size)
+        if client is None:
+            import redis.asyncio as redis  # optional dependency, only needed for this backend
+            client = redis.from_url(url)
+        self._client = client
+        self.prefix = prefix
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    async def start(self) -> None:
+        await super().start()
+        if self._listener is None:
+            self._pubsub = self._client.pubsub()
+            self._listener = asyncio.create_task(self._listen())
+            logger.info("Redis pub/sub listener started.")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._client.close()
+        await super().close()
+
+    async def subscribe(self, session_id: str) -> Subscription:
+        if self._listener is None:
+            await self.start()
+        first = self.subscriber_count(session_id) == 0
+        sub = await super().subscribe(session_id)
+        if first:
+            await self._pubsub.subscribe(self._channel(session_id))
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        await super().unsubscribe(sub)
+        if self.subscriber_count(sub.session_id) == 0 and self._pubsub is not None:
+            await self._pubsub.unsubscribe(self._channel(sub.session_id))
+
+    async def has_subscribers(self, session_id: str) -> bool:
+        # The session's socket may be open on another worker: ask Redis.
+        if self.subscriber_count(session_id) > 0:
+            return True
+        counts = await self._client.pubsub_numsub(self._channel(session_id))
+        return any(count for _, count in counts)
+
+    async def publish(self, session_id: str, event: Dict[str, Any]) -> int:
+        # Local subscribers get it back through the listener, like every other worker.
+        self.published += 1
+        return await self._client.publish(self._channel(session_id), json.dumps(event))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.2)
+                    continue
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if msg is None or msg.get("type") != "message":
+                    continue
+                channel = msg["channel"]
+                channel = channel.decode() if isinstance(channel, bytes) else channel
+                data = msg["data"]
+                self._deliver(channel[len(self.prefix):], data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub listener error: {e}", exc_info=True)
+                await asyncio.sleep(1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), backend="redis")
+
+
+_broker: Optional[InProcessBroker] = None
+
+def get_pubsub() -> InProcessBroker:
+    """
+    Process-wide broker. PUBSUB_URL=redis://... fans out across workers;
+    otherwise events only reach subscribers in this process.
+    """
+    global _broker
+    if _broker is None:
+        url = os.getenv("PUBSUB_URL", "")
+        queue_size = int(os.getenv("PUBSUB_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            _broker = RedisBroker(url, queue_size=queue_size)
+        else:
+            _broker = InProcessBroker(queue_size=queue_size)
+    return _broker
+
+
+async def publish_session_event(session_id: str, event_type: str, **payload: Any) -> int:
+    """Publish a `{"type": event_type, ...}` message to every connection of the session."""
+    return await get_pubsub().publish(session_id, {"type": event_type, **payload})
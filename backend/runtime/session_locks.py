@@ -0,0 +1,110 @@
+# runtime/session_locks.py
+
+from __future__ import annotations
+import os
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WAIT = 30.0    # seconds a turn waits for the session's previous turn
+
+
+class SessionBusyError(RuntimeError):
+    """The session's previous turn did not finish within the allowed wait."""
+
+    def __init__(self, session_id: str, waited: float) -> None:
+        super().__init__(f"Session {session_id} is busy (waited {waited:.1f}s).")
+        self.session_id = session_id
+        self.waited = waited
+
+
+def _has_waiters(lock: asyncio.Lock) -> bool:
+    # asyncio.Lock keeps its queue private; a cancelled waiter no longer counts.
+    return any(not w.cancelled() for w in (getattr(lock, "_waiters", None) or ()))
+
+
+class SessionLocks:
+    """
+    One asyncio.Lock per session in front of everything that touches a
+    session's memory or cart (chat turns, payment completion). Turns of the
+    same session run one at a time, in arrival order; different sessions
+    never wait on each other. Locks are held weakly, so idle sessions cost
+    nothing.
+    """
+
+    def __init__(self, default_wait: float = DEFAULT_WAIT) -> None:
+        self.default_wait = default_wait
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.acquired = 0
+        self.contended = 0
+        self.busy = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, wait: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Run the block as the session's only turn. Raises SessionBusyError if
+        the lock is not free within `wait` seconds (0 = fail immediately).
+        """
+        wait = self.default_wait if wait is None else wait
+        lock = self._lock(session_id)
+        started = time.perf_counter()
+        # Held, or just released with turns still queued for it (they go first).
+        contended = lock.locked() or _has_waiters(lock)
+        if contended:
+            self.contended += 1
+        if wait <= 0:
+            if contended:
+                self.busy += 1
+                raise SessionBusyError(session_id, 0.0)
+            await lock.acquire()  # free and nobody queued: returns without yielding
+        else:
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=wait)
+            except asyncio.TimeoutError:
+                self.busy += 1
+                waited = time.perf_counter() - started
+                logger.warning(f"Session {session_id} still busy after {waited:.1f}s; giving up.")
+                raise SessionBusyError(session_id, waited)
+        waited = time.perf_counter() - started
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        if waited > 0.5:
+            logger.info(f"Session {session_id} waited {waited:.2f}s for its previous turn.")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self._locks),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "busy": self.busy,
+            "wait_avg_ms": round(1000 * self.wait_total / max(self.acquired, 1), 2),
+            "wait_max_ms": round(1000 * self.wait_max, 2),
+        }
+
+
+_locks: Optional[SessionLocks] = None
+
+def get_session_locks() -> SessionLocks:
+    global _locks
+    if _locks is None:
+        _locks = SessionLocks(default_wait=float(os.getenv("SESSION_LOCK_WAIT_SECONDS", DEFAULT_WAIT)))
+    return _locks
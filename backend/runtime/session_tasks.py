@@ -0,0 +1,96 @@
+# runtime/session_tasks.py
+
+from __future__ import annotations
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 16   # queued jobs per session before new ones are refused
+
+Job = Tuple[str, Callable[[], Awaitable[Any]]]
+
+
+class SessionTaskQueues:
+    """
+    One FIFO worker per session for work triggered by WebSocket events, so a
+    socket's receive loop only enqueues and goes back to reading (heartbeats
+    keep flowing) while jobs of the same session still run strictly in order.
+    A session's worker exits once its queue is empty; `cancel()` drops the
+    pending jobs and cancels the running one.
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "refused": 0}
+
+    def submit(self, session_id: str, name: str, job: Callable[[], Awaitable[Any]]) -> bool:
+        """Queue `job` behind the session's earlier jobs; False if the session's queue is full."""
+        queue = self._queues.get(session_id)
+        if queue is None:
+            queue = self._queues[session_id] = asyncio.Queue(maxsize=self.max_pending)
+        try:
+            queue.put_nowait((name, job))
+        except asyncio.QueueFull:
+            self._counters["refused"] += 1
+            logger.warning(f"Task queue of session {session_id} is full; refusing {name}.")
+            return False
+        self._counters["submitted"] += 1
+        worker = self._workers.get(session_id)
+        if worker is None or worker.done():
+            self._workers[session_id] = asyncio.create_task(self._run(session_id, queue))
+        return True
+
+    async def _run(self, session_id: str, queue: asyncio.Queue) -> None:
+        try:
+            while not queue.empty():
+                name, job = queue.get_nowait()
+                logger.info(f"Session {session_id}: running {name} ({queue.qsize()} queued).")
+                try:
+                    await job()
+                    self._counters["completed"] += 1
+                except asyncio.CancelledError:
+                    self._counters["cancelled"] += 1
+                    raise
+                except Exception as e:
+                    self._counters["failed"] += 1
+                    logger.error(f"Session {session_id}: {name} failed: {e}", exc_info=True)
+        finally:
+            if self._workers.get(session_id) is asyncio.current_task():
+                del self._workers[session_id]
+                if queue.empty():
+                    self._queues.pop(session_id, None)
+
+    def cancel(self, session_id: str) -> None:
+        queue = self._queues.pop(session_id, None)
+        if queue is not None and not queue.empty():
+            dropped = queue.qsize()
+            self._counters["cancelled"] += dropped
+            logger.info(f"Session {session_id}: dropping {dropped} queued task(s).")
+        worker = self._workers.pop(session_id, None)
+        if worker is not None and not worker.done():
+            worker.cancel()
+
+    def pending(self, session_id: str) -> int:
+        queue = self._queues.get(session_id)
+        return queue.qsize() if queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._workers),
+            "queued": sum(q.qsize() for q in self._queues.values()),
+            **self._counters,
+        }
+
+
+_queues: Optional[SessionTaskQueues] = None
+
+def get_session_tasks() -> SessionTaskQueues:
+    global _queues
+    if _queues is None:
+        _queues = SessionTaskQueues(max_pending=int(os.getenv("SESSION_TASK_MAX_PENDING", DEFAULT_MAX_PENDING)))
+    return _queues
@@ -0,0 +1,224 @@
+# runtime/tool_executor.py
+
+from __future__ import annotations
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from observability.tracing import span
+from runtime.deadline import DeadlineExceeded, clamp, remaining
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_TIMEOUT = 30.0           # seconds, queue wait + run time
+SLOW_QUEUE_WARNING = 1.0         # seconds spent waiting for a slot before we log it
+
+# Concurrent in-flight calls allowed per provider lane. QuickBooks allows 10
+# concurrent requests per realm; FedEx and Stripe throttle per account key.
+DEFAULT_PROVIDER_LIMITS: Dict[str, int] = {
+    "quickbooks": 8,
+    "fedex": 4,
+    "stripe": 8,
+}
+DEFAULT_PROVIDER_LIMIT = 8
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool call did not finish (queue wait + execution) within its timeout."""
+
+
+class ProviderStats:
+    __slots__ = ("calls", "errors", "timeouts", "in_flight", "queued",
+                 "queue_time_total", "queue_time_max", "run_time_total")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        completed = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queue_time_avg_ms": round(1000 * self.queue_time_total / completed, 2),
+            "queue_time_max_ms": round(1000 * self.queue_time_max, 2),
+            "run_time_avg_ms": round(1000 * self.run_time_total / completed, 2),
+        }
+
+
+def provider_key(provider: str) -> str:
+    """
+    Resolve a provider family to its rate-limit lane: QuickBooks limits are
+    per realm and FedEx limits per account, so those ids are part of the key.
+    """
+    if provider == "quickbooks":
+        return f"quickbooks:{os.getenv('QB_REALM_ID', '')}"
+    if provider == "fedex":
+        return f"fedex:{os.getenv('FEDEX_ACCOUNT_NUMBER', '')}"
+    return provider
+
+
+class ToolExecutor:
+    """
+    Runs blocking tool functions on a bounded thread pool so they never
+    stall the event loop, with a semaphore per provider lane in front of it.
+
+    Timeouts cover queue wait + execution. A call that times out before it
+    starts is cancelled outright; one that is already running cannot be
+    interrupted, so it finishes in the background and keeps holding its
+    provider slot until then (the upstream is still busy with it).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        provider_limits: Optional[Dict[str, int]] = None,
+        default_timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.max_workers = max_workers
+        self.provider_limits = dict(DEFAULT_PROVIDER_LIMITS, **(provider_limits or {}))
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def _lane(self, key: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(key)
+        if sem is None:
+            family = key.split(":", 1)[0]
+            sem = asyncio.Semaphore(self.provider_limits.get(family, DEFAULT_PROVIDER_LIMIT))
+            self._semaphores[key] = sem
+        return sem
+
+    async def run(
+        self,
+        provider: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        key = provider_key(provider)
+        stats = self._stats.setdefault(key, ProviderStats())
+        # Inside a /chat turn the timeout is also capped by the turn's deadline.
+        left = remaining()
+        if left is not None and left <= 0:
+            stats.timeouts += 1
+            raise DeadlineExceeded(f"Turn deadline passed; not starting the {provider} call.")
+        timeout = clamp(self.default_timeout if timeout is None else timeout)
+        loop = asyncio.get_running_loop()
+        sem = self._lane(key)
+
+        enqueued = time.perf_counter()
+        started: Dict[str, float] = {}
+        stats.queued += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            stats.queued -= 1
+            stats.timeouts += 1
+            logger.warning(f"Tool call on {key} timed out after {timeout}s waiting for a provider slot.")
+            raise ToolTimeoutError(f"{provider} is busy; timed out after {timeout:.0f}s.")
+        stats.queued -= 1
+
+        # Carry contextvars (session/turn ids, spans) into the worker thread.
+        ctx = contextvars.copy_context()
+
+        def traced() -> Any:
+            # The gap between this span and its parent is the time spent waiting for the lane.
+            with span(f"executor {key}", **{"executor.lane": key, "executor.queue_ms": round((started["at"] - enqueued) * 1000, 1)}):
+                return fn(*args, **kwargs)
+
+        def call() -> Any:
+            started["at"] = time.perf_counter()
+            return ctx.run(traced)
+
+        cf = self._pool.submit(call)
+        cf.add_done_callback(lambda _: loop.call_soon_threadsafe(sem.release))
+        stats.in_flight += 1
+        try:
+            wait_s = max(timeout - (time.perf_counter() - enqueued), 0.001)
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(cf)), timeout=wait_s)
+            stats.calls += 1
+            return result
+        except asyncio.TimeoutError:
+            cf.cancel()
+            stats.timeouts += 1
+            logger.warning(f"Tool call {getattr(fn, '__name__', fn)} on {key} timed out after {timeout}s.")
+            raise ToolTimeoutError(f"{provider} call timed out after {timeout:.0f}s.")
+        except asyncio.CancelledError:
+            cf.cancel()
+            raise
+        except Exception:
+            stats.calls += 1
+            stats.errors += 1
+            raise
+        finally:
+            now = time.perf_counter()
+            queue_time = started.get("at", now) - enqueued
+            stats.in_flight -= 1
+            stats.queue_time_total += queue_time
+            stats.queue_time_max = max(stats.queue_time_max, queue_time)
+            if "at" in started:
+                stats.run_time_total += now - started["at"]
+            if queue_time > SLOW_QUEUE_WARNING:
+                logger.warning(f"Tool call on {key} waited {queue_time:.2f}s for a slot.")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {key: s.as_dict() for key, s in self._stats.items()}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: Optional[ToolExecutor] = None
+
+def get_tool_executor() -> ToolExecutor:
+    """Process-wide executor, configured from the environment on first use."""
+    global _executor
+    if _executor is None:
+        limits = {
+            family: int(os.getenv(f"TOOL_LIMIT_{family.upper()}", limit))
+            for family, limit in DEFAULT_PROVIDER_LIMITS.items()
+        }
+        _executor = ToolExecutor(
+            max_workers=int(os.getenv("TOOL_EXECUTOR_WORKERS", DEFAULT_MAX_WORKERS)),
+            provider_limits=limits,
+            default_timeout=float(os.getenv("TOOL_TIMEOUT_SECONDS", DEFAULT_TIMEOUT)),
+        )
+    return _executor
+
+
+def offload_tool(tool, provider: str):
+    """
+    Give a sync LangChain tool an async implementation that runs on the
+    shared executor under `provider`'s lane. Async tools are left alone.
+    Timeouts are returned as an error string, like the tools' own failures.
+    """
+    if getattr(tool, "coroutine", None) is not None:
+        return tool
+
+    func = tool.func
+
+    async def _acall(**kwargs: Any) -> Any:
+        try:
+            return await get_tool_executor().run(provider, func, **kwargs)
+        except ToolTimeoutError as e:
+            return f"Error: {e} Please try again in a moment."
+
+    tool.coroutine = _acall
+    return tool
@@ -0,0 +1,173 @@
+# runtime/warmup.py
+"""
+Startup warm-up behind the /ready probe. Each step opens a connection pool,
+validates or refreshes a token, or fills a cache, so the first customer after
+a deploy does not pay for TLS handshakes, token refreshes and cold imports.
+
+Steps run concurrently (a step can wait for others with `after=`), each with
+a timeout. The process is ready once every required step (READY_REQUIRED_STEPS,
+comma-separated) has succeeded; required steps that fail are retried every
+WARMUP_RETRY_SECONDS, optional ones are attempted once and only reported.
+Work that happens elsewhere (e.g. starting the pub/sub broker) is recorded
+with `mark()`.
+"""
+
+from __future__ import annotations
+import os
+import time
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from observability.tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUIRED = "pubsub,agent"
+DEFAULT_STEP_TIMEOUT = 30.0     # seconds per attempt
+DEFAULT_RETRY_INTERVAL = 15.0   # seconds between rounds while a required step is failing
+
+PENDING, RUNNING, OK, FAILED, SKIPPED = "pending", "running", "ok", "failed", "skipped"
+
+
+class WarmupSkipped(Exception):
+    """Raised by a step that does not apply here (e.g. the provider is not configured)."""
+
+
+class _Step:
+    def __init__(self, name: str, fn: Optional[Callable[[], Any]], after: Iterable[str], required: bool) -> None:
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.required = required
+        self.state = PENDING
+        self.detail: Optional[str] = None
+        self.attempts = 0
+        self.ms: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"state": self.state, "required": self.required, "attempts": self.attempts,
+                "ms": self.ms, "detail": self.detail}
+
+
+class Warmup:
+    def __init__(
+        self,
+        required: Optional[Set[str]] = None,
+        step_timeout: float = DEFAULT_STEP_TIMEOUT,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+    ) -> None:
+        self.required = set(required if required is not None else DEFAULT_REQUIRED.split(","))
+        self.step_timeout = step_timeout
+        self.retry_interval = retry_interval
+        self._steps: Dict[str, _Step] = {}
+        self._started = time.monotonic()
+        self.ready_after: Optional[float] = None
+
+    def add(self, name: str, fn: Optional[Callable[[], Any]] = None, after: Iterable[str] = ()) -> None:
+        """
+        Register a step. `fn` is a plain function (run in a worker thread) or a
+        coroutine function; whatever it returns becomes the step's detail. A
+        step without `fn` is completed through `mark()`.
+        """
+        self._steps[name] = _Step(name, fn, after, required=name in self.required)
+
+    def mark(self, name: str, ok: bool = True, detail: Optional[str] = None) -> None:
+        step = self._steps.get(name)
+        if step is None:
+            self.add(name)
+            step = self._steps[name]
+        step.state = OK if ok else FAILED
+        step.detail = detail
+        self._check_ready()
+
+    @property
+    def ready(self) -> bool:
+        return all(s.state == OK for s in self._steps.values() if s.required)
+
+    def _check_ready(self) -> None:
+        if self.ready_after is None and self.ready:
+            self.ready_after = time.monotonic() - self._started
+            logger.info(f"Ready to take traffic {self.ready_after:.2f}s after startup.")
+
+    # ── running ────────────────────────────────────────────────────────────
+    async def _attempt(self, step: _Step) -> None:
+        step.state = RUNNING
+        step.attempts += 1
+        started = time.perf_counter()
+        with span(f"warmup {step.name}", **{"warmup.step": step.name, "warmup.attempt": step.attempts}) as s:
+            try:
+                if inspect.iscoroutinefunction(step.fn):
+                    result = await asyncio.wait_for(step.fn(), self.step_timeout)
+                else:
+                    result = await asyncio.wait_for(asyncio.to_thread(step.fn), self.step_timeout)
+                step.state, step.detail = OK, (str(result) if result is not None else None)
+            except WarmupSkipped as e:
+                step.state, step.detail = SKIPPED, str(e)
+            except asyncio.TimeoutError:
+                step.state, step.detail = FAILED, f"timed out after {self.step_timeout:g}s"
+                s.fail(step.detail)
+            except Exception as e:
+                step.state, step.detail = FAILED, f"{type(e).__name__}: {e}"
+                s.fail(step.detail)
+        step.ms = round((time.perf_counter() - started) * 1000, 1)
+        log = logger.warning if step.state == FAILED else logger.info
+        log(f"Warm-up step {step.name}: {step.state} in {step.ms:.0f}ms (attempt {step.attempts})"
+            + (f" - {step.detail}" if step.detail else ""))
+        self._check_ready()
+
+    async def _round(self, todo: List[_Step]) -> None:
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_one(step: _Step) -> None:
+            waits = [tasks[d] for d in step.after if d in tasks]
+            if waits:
+                await asyncio.wait(waits)
+            blocked = [d for d in step.after if d in self._steps and self._steps[d].state != OK]
+            if blocked:
+                step.state, step.detail = PENDING, f"waiting for {', '.join(blocked)}"
+                return
+            await self._attempt(step)
+
+        for step in todo:
+            tasks[step.name] = asyncio.create_task(run_one(step))
+        await asyncio.gather(*tasks.values())
+
+    def _needs_run(self, step: _Step) -> bool:
+        return step.fn is not None and (step.state == PENDING or (step.state == FAILED and step.required))
+
+    async def run(self) -> None:
+        """Run every step; keep retrying failed required steps until they pass (or the task is cancelled)."""
+        while True:
+            await self._round([s for s in self._steps.values() if self._needs_run(s)])
+            if self.ready or not any(self._needs_run(s) for s in self._steps.values()):
+                break
+            await asyncio.sleep(self.retry_interval)
+        for step in self._steps.values():
+            if step.state == PENDING and step.fn is not None:
+                step.state = SKIPPED
+        logger.info(f"Warm-up finished: {', '.join(f'{s.name}={s.state}' for s in self._steps.values())}.")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.monotonic() - self._started, 2),
+            "ready_after_s": round(self.ready_after, 2) if self.ready_after is not None else None,
+            "steps": {name: s.as_dict() for name, s in self._steps.items()},
+        }
+
+
+_warmup: Optional[Warmup] = None
+
+def get_warmup() -> Warmup:
+    """Process-wide warm-up, configured from the environment on first use."""
+    global _warmup
+    if _warmup is None:
+        required = os.getenv("READY_REQUIRED_STEPS", DEFAULT_REQUIRED)
+        _warmup = Warmup(
+            required={s.strip() for s in required.split(",") if s.strip()},
+            step_timeout=float(os.getenv("WARMUP_STEP_TIMEOUT_SECONDS", DEFAULT_STEP_TIMEOUT)),
+            retry_interval=float(os.getenv("WARMUP_RETRY_SECONDS", DEFAULT_RETRY_INTERVAL)),
+        )
+    return _warmup
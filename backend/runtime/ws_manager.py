@@ -0,0 +1,215 @@
+# runtime/ws_manager.py
+
+from __future__ import annotations
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from runtime.pubsub import Subscription, get_pubsub
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 1000
+DEFAULT_HEARTBEAT_INTERVAL = 20.0   # seconds between pings
+DEFAULT_IDLE_TIMEOUT = 60.0         # seconds without any client frame before the peer is dropped
+DEFAULT_SEND_TIMEOUT = 10.0         # seconds a single send may take before the peer counts as stalled
+
+# Close codes (RFC 6455): 1001 going away, 1008 policy violation, 1013 try again later.
+CLOSE_IDLE = 1001
+CLOSE_STALLED = 1008
+CLOSE_OVERLOADED = 1013
+
+
+class Connection:
+    __slots__ = ("id", "session_id", "ws", "subscription", "connected_at", "last_seen",
+                 "sent", "sender", "heartbeat", "closing", "send_lock")
+
+    def __init__(self, ws: WebSocket, session_id: str, subscription: Subscription) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.ws = ws
+        self.subscription = subscription
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.sent = 0
+        self.sender: Optional[asyncio.Task] = None
+        self.heartbeat: Optional[asyncio.Task] = None
+        self.closing = False
+        # Starlette websockets do not allow concurrent sends; the sender,
+        # heartbeat and close all go through this.
+        self.send_lock = asyncio.Lock()
+
+
+class WebSocketManager:
+    """
+    Owns every live WebSocket: admits up to `max_connections`, subscribes
+    each to its session's events, and runs two tasks per socket:
+
+    - sender: drains the connection's bounded event queue; a send that takes
+      longer than `send_timeout` marks the peer stalled and closes it, so
+      publishers (tools, webhooks) never wait on a slow client;
+    - heartbeat: sends `{"type": "ping"}` every `heartbeat_interval`; a peer
+      that sent nothing (no pong, no message) for `idle_timeout` is dropped.
+
+    Every write to a socket holds its connection's send lock, so a ping
+    never interleaves with an event being sent.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        send_timeout: float = DEFAULT_SEND_TIMEOUT,
+    ) -> None:
+        self.max_connections = max_connections
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self._connections: Dict[str, Connection] = {}
+        # dropped_events: events dropped for connections that have since closed.
+        self._counters = {
+            "accepted": 0, "rejected": 0, "dropped_idle": 0, "dropped_stalled": 0, "closed": 0, "dropped_events": 0,
+        }
+
+    # ── lifecycle ──────────────────────────────────────────────────────────
+    async def connect(self, ws: WebSocket, session_id: str) -> Optional[Connection]:
+        """Accept the socket, or close it with 1013 when at capacity (returns None)."""
+        if len(self._connections) >= self.max_connections:
+            self._counters["rejected"] += 1
+            logger.warning("Rejecting WebSocket for session %s: %s connections open.", session_id, len(self._connections))
+            await ws.accept()
+            await ws.close(code=CLOSE_OVERLOADED, reason="Server busy, retry shortly.")
+            return None
+
+        await ws.accept()
+        subscription = await get_pubsub().subscribe(session_id)
+        conn = Connection(ws, session_id, subscription)
+        self._connections[conn.id] = conn
+        conn.sender = asyncio.create_task(self._send_loop(conn))
+        conn.heartbeat = asyncio.create_task(self._heartbeat_loop(conn))
+        self._counters["accepted"] += 1
+        logger.info("WebSocket %s open for session %s (%s open).", conn.id, session_id, len(self._connections))
+        return conn
+
+    async def disconnect(self, conn: Connection, code: int = 1000, reason: str = "") -> None:
+        if conn.closing:
+            return
+        conn.closing = True
+        self._connections.pop(conn.id, None)
+        # No await before subscription.close() marks it closed, so no drop is missed or counted twice.
+        self._counters["dropped_events"] += conn.subscription.dropped
+        current = asyncio.current_task()
+        for task in (conn.sender, conn.heartbeat):
+            if task is not None and task is not current:
+                task.cancel()
+        await conn.subscription.close()
+        if conn.ws.application_state == WebSocketState.CONNECTED and conn.ws.client_state == WebSocketState.CONNECTED:
+            try:
+                await asyncio.wait_for(self._close(conn, code, reason), timeout=self.send_timeout)
+            except Exception:
+                pass
+        self._counters["closed"] += 1
+        logger.info("WebSocket %s of session %s closed (%s).", conn.id, conn.session_id, reason or code)
+
+    async def close_all(self) -> None:
+        for conn in list(self._connections.values()):
+            await self.disconnect(conn, code=CLOSE_IDLE, reason="Server shutting down.")
+
+    # ── traffic ────────────────────────────────────────────────────────────
+    async def receive(self, conn: Connection) -> Optional[Dict[str, Any]]:
+        """Next client message; heartbeat replies are consumed here and return None."""
+        data = await conn.ws.receive_json()
+        conn.last_seen = time.monotonic()
+        if isinstance(data, dict) and data.get("event") == "pong":
+            return None
+        return data
+
+    async def _close(self, conn: Connection, code: int, reason: str) -> None:
+        async with conn.send_lock:
+            await conn.ws.close(code=code, reason=reason)
+
+    async def _write(self, conn: Connection, text: str) -> None:
+        async with conn.send_lock:
+            await conn.ws.send_text(text)
+
+    async def _send(self, conn: Connection, text: str) -> bool:
+        # The send timeout covers waiting for the lock too: a writer stuck on
+        # a stalled peer stalls everyone behind it.
+        try:
+            await asyncio.wait_for(self._write(conn, text), timeout=self.send_timeout)
+            conn.sent += 1
+            return True
+        except asyncio.TimeoutError:
+            self._counters["dropped_stalled"] += 1
+            logger.warning("WebSocket %s of session %s stalled on send; dropping it.", conn.id, conn.session_id)
+            await self.disconnect(conn, code=CLOSE_STALLED, reason="Send timed out.")
+        except Exception as e:
+            logger.info("WebSocket %s send failed (%s); closing.", conn.id, e)
+            await self.disconnect(conn, reason="Send failed.")
+        return False
+
+    async def _send_loop(self, conn: Connection) -> None:
+        while not conn.closing:
+            text = await conn.subscription.get_text()
+            if not await self._send(conn, text):
+                return
+
+    async def _heartbeat_loop(self, conn: Connection) -> None:
+        while not conn.closing:
+            await asyncio.sleep(self.heartbeat_interval)
+            if time.monotonic() - conn.last_seen > self.idle_timeout:
+                self._counters["dropped_idle"] += 1
+                logger.info("WebSocket %s of session %s idle for %.0fs; dropping it.", conn.id, conn.session_id, self.idle_timeout)
+                await self.disconnect(conn, code=CLOSE_IDLE, reason="Idle timeout.")
+                return
+            # Straight to the socket (under the send lock), not the event queue:
+            # a full queue must not starve liveness checks.
+            if not await self._send(conn, '{"type": "ping"}'):
+                return
+
+    # ── gauges ─────────────────────────────────────────────────────────────
+    def open_sockets(self) -> int:
+        return len(self._connections)
+
+    def session_connections(self, session_id: str) -> int:
+        return sum(1 for c in self._connections.values() if c.session_id == session_id)
+
+    def queued_bytes(self) -> int:
+        return sum(c.subscription.queued_bytes for c in self._connections.values())
+
+    def stats(self) -> Dict[str, Any]:
+        conns = list(self._connections.values())
+        open_dropped = sum(c.subscription.dropped for c in conns)
+        return {
+            "open_sockets": len(conns),
+            "max_connections": self.max_connections,
+            "sessions": len({c.session_id for c in conns}),
+            "queued_bytes": sum(c.subscription.queued_bytes for c in conns),
+            "queued_events": sum(c.subscription.queue.qsize() for c in conns),
+            **self._counters,
+            # Cumulative (closed + open connections), so it only ever grows.
+            "dropped_events": self._counters["dropped_events"] + open_dropped,
+            "dropped_events_open": open_dropped,
+        }
+
+
+_manager: Optional[WebSocketManager] = None
+
+def get_ws_manager() -> WebSocketManager:
+    """Process-wide manager, configured from the environment on first use."""
+    global _manager
+    if _manager is None:
+        _manager = WebSocketManager(
+            max_connections=int(os.getenv("WS_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+            heartbeat_interval=float(os.getenv("WS_HEARTBEAT_SECONDS", DEFAULT_HEARTBEAT_INTERVAL)),
+            idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", DEFAULT_IDLE_TIMEOUT)),
+            send_timeout=float(os.getenv("WS_SEND_TIMEOUT_SECONDS", DEFAULT_SEND_TIMEOUT)),
+        )
+    return _manager
@@ -10,42 +10,42 @@ session_state: Dict[str, ChatState] = {}
 ### State ###
 
 def get_state(session_id: str) -> ChatState:
-    logger.debug(f"Attempting to get state for session_id: {session_id}")
+    logger.debug("Attempting to get state for session_id: %s", session_id)
     if session_id not in session_state:
-        logger.info(f"State not found for session_id: {session_id}. Creating new state.")
+        logger.info("State not found for session_id: %s. Creating new state.", session_id)
         session_state[session_id] = ChatState()
     return session_state[session_id]
 
 def save_state(session_id:str, state: ChatState) -> None:
-    logger.debug(f"Saving state for session_id: {session_id}")
+    logger.debug("Saving state for session_id: %s", session_id)
     session_state[session_id] = state
     
 
 ### Customer ###
 
 def set_customer(session_id: str, customer_id: str | None, *, is_guest: bool | None = None) -> None:
-    logger.info(f"Setting customer for session_id: {session_id} to customer_id: {customer_id}")
+    logger.info("Setting customer for session_id: %s to customer_id: %s", session_id, customer_id)
     s = get_state(session_id)
     s.customer_id = customer_id
     if is_guest is not None:
         s.is_guest = is_guest
-        logger.debug(f"Is guest flag set to: {is_guest}")
+        logger.debug("Is guest flag set to: %s", is_guest)
     save_state(session_id, s)
     
 def get_customer(session_id: str):
-    logger.debug(f"Getting customer_id for session_id: {session_id}")
+    logger.debug("Getting customer_id for session_id: %s", session_id)
     customer = get_state(session_id).customer_id
-    logger.debug(f"Found customer_id: {customer}")
+    logger.debug("Found customer_id: %s", customer)
     return customer
 
 def mark_guest(session_id: str) -> None:
-    logger.info(f"Marking session_id: {session_id} as a guest.")
+    logger.info("Marking session_id: %s as a guest.", session_id)
     s = get_state(session_id)
     s.is_guest = True
     save_state(session_id, s)
 
 def promote_to_real(session_id: str) -> None:
-    logger.info(f"Promoting session_id: {session_id} from guest to real customer.")
+    logger.info("Promoting session_id: %s from guest to real customer.", session_id)
     s = get_state(session_id)
     s.is_guest = False
     save_state(session_id, s)
@@ -54,86 +54,97 @@ def promote_to_real(session_id: str) -> None:
 ### Cart ###
 
 def get_cart(session_id: str):
-    logger.debug(f"Getting cart for session_id: {session_id}")
+    logger.debug("Getting cart for session_id: %s", session_id)
     return get_state(session_id).cart
 
 def add_to_cart(session_id: str, item_name: str, quantity: int):
-    logger.info(f"Adding {quantity} of '{item_name}' to cart for session_id: {session_id}")
+    logger.debug("Adding %s of '%s' to cart for session_id: %s", quantity, item_name, session_id)
     cart = get_state(session_id).cart
     try:
         if item_name not in cart:
             cart[item_name] = 0
-            logger.debug(f"Item '{item_name}' not in cart. Initializing quantity to 0.")
+            logger.debug("Item '%s' not in cart. Initializing quantity to 0.", item_name)
         cart[item_name] += quantity
-        logger.info(f"Successfully added '{item_name}'. New quantity is: {cart[item_name]}")
+        logger.info("Successfully added '%s'. New quantity is: %s", item_name, cart[item_name])
     except Exception as e:
-        logger.error(f"Failed to add '{item_name}' to cart: {e}", exc_info=True)
+        logger.error("Failed to add '%s' to cart: %s", item_name, e, exc_info=True)
     
 def remove_x_from_cart(session_id: str, item_name: str, quantity: int):
-    logger.info(f"Removing {quantity} of '{item_name}' from cart for session_id: {session_id}")
+    logger.debug("Removing %s of '%s' from cart for session_id: %s", quantity, item_name, session_id)
     cart = get_state(session_id).cart
     try:
         if item_name in cart:
             cart[item_name] -= quantity
-            logger.info(f"Successfully removed '{quantity}' of '{item_name}'. New quantity: {cart[item_name]}")
+            logger.info("Successfully removed '%s' of '%s'. New quantity: %s", quantity, item_name, cart[item_name])
             if cart[item_name] <= 0:
                 del cart[item_name]
-                logger.info(f"Item '{item_name}' quantity reached zero or less. Removing from cart.")
+                logger.info("Item '%s' quantity reached zero or less. Removing from cart.", item_name)
         else:
-            logger.warning(f"Attempted to remove '{item_name}', but it was not found in cart.")
+            logger.warning("Attempted to remove '%s', but it was not found in cart.", item_name)
     except Exception as e:
-        logger.error(f"Failed to remove '{item_name}' from cart: {e}", exc_info=True)
+        logger.error("Failed to remove '%s' from cart: %s", item_name, e, exc_info=True)
 
 def remove_completely_from_cart(session_id: str, item_name: str):
-    logger.info(f"Removing '{item_name}' completely from cart for session_id: {session_id}")
+    logger.debug("Removing '%s' completely from cart for session_id: %s", item_name, session_id)
     cart = get_state(session_id).cart
     try:
         if item_name in cart:
             del cart[item_name]
-            logger.info(f"Successfully removed '{item_name}' completely from cart.")
+            logger.info("Successfully removed '%s' completely from cart.", item_name)
         else:
-            logger.warning(f"Attempted to remove '{item_name}', but it was not found in cart.")
+            logger.warning("Attempted to remove '%s', but it was not found in cart.", item_name)
     except Exception as e:
-        logger.error(f"Failed to completely remove '{item_name}' from cart: {e}", exc_info=True)
+        logger.error("Failed to completely remove '%s' from cart: %s", item_name, e, exc_info=True)
     
 
 ### WebSocket ###
 
 def set_websocket(session_id: str, ws: WebSocket):
-    logger.info(f"Setting websocket connection for session_id: {session_id}")
+    logger.info("Setting websocket connection for session_id: %s", session_id)
     s = get_state(session_id)
     s.websocket = ws
     save_state(session_id, s)
 
 def get_websocket(session_id:str):
-    logger.debug(f"Getting websocket for session_id: {session_id}")
+    logger.debug("Getting websocket for session_id: %s", session_id)
     return get_state(session_id).websocket
 
 
 ### Stripe Order ###
 
 def set_stripe_order_id(session_id: str, stripe_order_id: str):
-    logger.info(f"Setting Stripe order ID for session_id: {session_id} to {stripe_order_id}")
+    logger.info("Setting Stripe order ID for session_id: %s to %s", session_id, stripe_order_id)
     s = get_state(session_id)
     s.stripe_order_id = stripe_order_id 
     save_state(session_id, s)
 
 def get_stripe_order_id(session_id:str):
-    logger.debug(f"Getting Stripe order ID for session_id: {session_id}")
+    logger.debug("Getting Stripe order ID for session_id: %s", session_id)
     order_id = get_state(session_id).stripe_order_id
-    logger.debug(f"Found Stripe order ID: {order_id}")
+    logger.debug("Found Stripe order ID: %s", order_id)
     return order_id
 
 ### PayPal Order ###
 
+# PayPal order id -> session id, so captures and webhooks find their session in O(1).
+paypal_order_sessions: Dict[str, str] = {}
+
 def set_paypal_order_id(session_id: str, paypal_order_id: str):
-    logger.info(f"Setting PayPal order ID for session_id: {session_id} to {paypal_order_id}")
+    logger.info("Setting PayPal order ID for session_id: %s to %s", session_id, paypal_order_id)
     s = get_state(session_id)
+    if s.paypal_order_id and paypal_order_sessions.get(s.paypal_order_id) == session_id:
+        del paypal_order_sessions[s.paypal_order_id]
     s.paypal_order_id = paypal_order_id 
+    if paypal_order_id:
+        paypal_order_sessions[paypal_order_id] = session_id
     save_state(session_id, s)
 
 def get_paypal_order_id(session_id:str):
-    logger.debug(f"Getting PayPal order ID for session_id: {session_id}")
+    logger.debug("Getting PayPal order ID for session_id: %s", session_id)
     order_id = get_state(session_id).paypal_order_id
-    logger.debug(f"Found PayPal order ID: {order_id}")
-    return order_id
\ No newline at end of file
+    logger.debug("Found PayPal order ID: %s", order_id)
+    return order_id
+
+def get_session_for_paypal_order(paypal_order_id: str):
+    logger.debug("Looking up session for PayPal order ID: %s", paypal_order_id)
+    return paypal_order_sessions.get(paypal_order_id)
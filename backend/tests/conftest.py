@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# Modules import each other rooted at backend/ (as when running uvicorn from there).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
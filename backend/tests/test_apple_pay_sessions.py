@@ -0,0 +1,97 @@
+# tests/test_apple_pay_sessions.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("requests")
+
+from tools.payment.applepay import apple_pay_tool
+from tools.payment.applepay.apple_pay_tool import ApplePaySessions, _idempotency_key
+
+
+class FakeGateway:
+    """Stripe gateway double: each checkout reports its own status; calls are counted and slow."""
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def retrieve_checkout_session(self, checkout_id):
+        with self._lock:
+            self.calls.append(checkout_id)
+        time.sleep(self.delay)
+        n = int(checkout_id.rsplit("_", 1)[1])
+        return SimpleNamespace(id=checkout_id, status="complete" if n % 2 else "open",
+                               payment_status="paid" if n % 2 else "unpaid",
+                               amount_total=100 * n, currency="usd", url=f"https://checkout.test/{checkout_id}")
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    fake = FakeGateway()
+    monkeypatch.setattr(apple_pay_tool, "get_stripe_gateway", lambda: fake)
+    return fake
+
+
+def test_sessions_do_not_bleed_under_concurrency(gateway):
+    sessions = ApplePaySessions()
+    n = 64
+    barrier = threading.Barrier(n)
+
+    def one(i):
+        barrier.wait()
+        sessions.set(f"session_{i}", f"cs_{i}")
+        checkout_id = sessions.get(f"session_{i}")
+        return i, checkout_id, sessions.status(checkout_id)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        results = list(pool.map(one, range(n)))
+
+    for i, checkout_id, info in results:
+        assert checkout_id == f"cs_{i}"
+        assert info["id"] == f"cs_{i}"
+        assert info["amount_total"] == i
+        assert info["payment_status"] == ("paid" if i % 2 else "unpaid")
+    assert sorted(gateway.calls) == sorted(f"cs_{i}" for i in range(n))
+
+
+def test_concurrent_status_lookups_share_one_upstream_call(gateway):
+    sessions = ApplePaySessions(status_ttl=60)
+    sessions.set("session_1", "cs_1")
+    n = 32
+    barrier = threading.Barrier(n)
+
+    def lookup(_):
+        barrier.wait()
+        return sessions.status(sessions.get("session_1"))
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        results = list(pool.map(lookup, range(n)))
+
+    assert gateway.calls == ["cs_1"]
+    assert all(info == results[0] for info in results)
+    assert results[0]["payment_status"] == "paid"
+
+
+def test_status_cache_is_bounded_and_pruned(gateway):
+    gateway.delay = 0
+    sessions = ApplePaySessions(max_sessions=4, status_ttl=0.05)
+    for n in range(10):
+        sessions.status(f"cs_{n}")           # ids that were never set() still get cached
+    assert list(sessions._statuses) == ["cs_6", "cs_7", "cs_8", "cs_9"]
+
+    time.sleep(0.06)
+    sessions.status("cs_10")
+    assert list(sessions._statuses) == ["cs_10"]
+
+
+def test_idempotency_key_follows_session_and_cart():
+    key = _idempotency_key("session_1", 500, "Masala Chai")
+    assert key == _idempotency_key("session_1", 500, "Masala Chai")
+    assert key != _idempotency_key("session_2", 500, "Masala Chai")
+    assert key != _idempotency_key("session_1", 600, "Masala Chai")
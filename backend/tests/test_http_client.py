@@ -0,0 +1,70 @@
+# tests/test_http_client.py
+import time
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from clients.http_client import CircuitBreaker, CircuitOpenError, ClientCredentialsTokenSource, ProviderHttpClient
+
+
+class NoToken:
+    def get(self):
+        return None
+
+
+def _client(monkeypatch, breaker, outcomes):
+    client = ProviderHttpClient("test", max_retries=0, breaker=breaker, token_source=NoToken())
+
+    def request(method, url, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        resp = requests.Response()
+        resp.status_code = outcome
+        return resp
+
+    monkeypatch.setattr(client.session, "request", request)
+    return client
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.InvalidHeader("bad header"),
+    ValueError("decode failed"),
+])
+def test_unexpected_error_during_half_open_probe_reopens_the_breaker(monkeypatch, error):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = _client(monkeypatch, breaker, [requests.exceptions.ConnectionError("down"), error, 200])
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.request("GET", "https://upstream.test/a")
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    with pytest.raises(type(error)):
+        client.request("GET", "https://upstream.test/a")     # the half-open probe
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", "https://upstream.test/a")
+
+    time.sleep(0.06)
+    assert client.request("GET", "https://upstream.test/a").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_token_refresh_during_half_open_probe_does_not_reopen_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = _client(monkeypatch, breaker, [503, 401, 200, 200])
+    client.token_source = ClientCredentialsTokenSource("https://upstream.test/token", "id", "secret", client)
+    client.token_source._token, client.token_source._expires_at = "stale", time.time() + 60
+    monkeypatch.setattr(requests.Response, "json", lambda self: {"access_token": "fresh", "expires_in": 3600})
+
+    assert client.request("GET", "https://upstream.test/a").status_code == 503
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    # The probe gets 401, fetches a new token (200) and retries (200).
+    assert client.request("GET", "https://upstream.test/a").status_code == 200
+    assert breaker.state == "closed"
+    assert client.token_source._token == "fresh"
@@ -0,0 +1,50 @@
+# tests/test_invoice_pdf_cache.py
+import os
+import json
+
+from tools.quickbooks.invoice_pdf_cache import InvoicePdfCache
+
+
+def test_commits_share_one_index_write(tmp_path, monkeypatch):
+    cache = InvoicePdfCache(root=tmp_path, index_save_delay=60)
+    writes = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if dst == cache.index_file:
+            writes.append(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
+
+    for n in range(5):
+        cache.store(f"inv{n}", "0", f"%PDF-{n}".encode())
+    assert writes == []     # still waiting on the timer
+
+    cache.flush_index()
+    cache.flush_index()     # nothing changed since: no second write
+    assert writes == [cache.index_file]
+    rows = json.loads(cache.index_file.read_text())
+    assert [r["invoice_id"] for r in rows] == [f"inv{n}" for n in range(5)]
+
+
+def test_index_survives_a_restart(tmp_path):
+    cache = InvoicePdfCache(root=tmp_path, index_save_delay=0.01)
+    entry = cache.store("inv1", "3", b"%PDF-1")
+    cache.flush_index()
+
+    reopened = InvoicePdfCache(root=tmp_path)
+    assert reopened.lookup("inv1", "3").digest == entry.digest
+
+
+def test_new_sync_token_with_same_content_keeps_the_blob(tmp_path):
+    cache = InvoicePdfCache(root=tmp_path, index_save_delay=60)
+    old = cache.store("inv1", "3", b"%PDF-1")
+    new = cache.store("inv1", "4", b"%PDF-1")      # edited in QuickBooks, same PDF
+
+    assert cache.lookup("inv1", "3") is None
+    assert new.digest == old.digest and new.path.exists()
+    assert cache.lookup("inv1", "4") == new
+    assert cache.stats() == {"entries": 1, "blobs": 1, "bytes": len(b"%PDF-1")}
+    assert list(cache.blob_dir.glob("*.tmp")) == []
+
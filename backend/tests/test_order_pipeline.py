@@ -0,0 +1,91 @@
+# tests/test_order_pipeline.py
+import gc
+
+import pytest
+
+pytest.importorskip("requests")
+
+from orders.pipeline import EXPIRED, INVOICED, PAID, PAYMENT_PENDING, SHIPPED, CallInProgressError, OrderPipeline, OrderStateError
+from orders.store import OrderStore
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return OrderPipeline(OrderStore(tmp_path / "orders.db"), max_cached_sessions=3)
+
+
+def test_cache_is_bounded(pipeline):
+    for n in range(10):
+        pipeline.store.create_order(f"s{n}", INVOICED)
+        assert pipeline.current_order(f"s{n}")["state"] == INVOICED
+    assert list(pipeline._by_session) == ["s7", "s8", "s9"]
+    assert pipeline.current_order("s0")["state"] == INVOICED     # evicted, read back from the store
+
+
+def test_shipped_orders_leave_the_cache(pipeline):
+    order = pipeline.store.create_order("s1", PAYMENT_PENDING)
+    pipeline._cache(order)
+    order = pipeline._transition(order, PAID)
+    assert "s1" in pipeline._by_session
+    pipeline._transition(order, SHIPPED, tracking_number="T1")
+    assert "s1" not in pipeline._by_session
+    assert pipeline.status("s1")["state"] == SHIPPED
+    assert "s1" not in pipeline._by_session
+
+
+def test_session_locks_are_released(pipeline):
+    for n in range(100):
+        with pipeline._session_lock(f"s{n}"):
+            assert pipeline._session_lock(f"s{n}") is pipeline._session_lock(f"s{n}")
+    gc.collect()
+    assert len(pipeline._session_locks) == 0
+
+
+def test_a_call_in_flight_on_another_worker_is_not_repeated(pipeline, tmp_path):
+    other = OrderPipeline(OrderStore(tmp_path / "orders.db"))
+    order = pipeline.store.create_order("s1", PAID)
+    calls = []
+
+    def ship(key):
+        calls.append(key)
+        with pytest.raises(CallInProgressError):
+            other._call_once(order, "shipment", {"order_id": order["order_id"]}, ship)
+        return {"tracking_number": "T1"}
+
+    assert pipeline._call_once(order, "shipment", {"order_id": order["order_id"]}, ship) == {"tracking_number": "T1"}
+    assert other._call_once(order, "shipment", {"order_id": order["order_id"]}, ship) == {"tracking_number": "T1"}
+    assert len(calls) == 1
+
+
+def test_transition_from_a_stale_cache_is_refused(pipeline, tmp_path):
+    other = OrderPipeline(OrderStore(tmp_path / "orders.db"))
+    order = pipeline.store.create_order("s1", PAYMENT_PENDING)
+    pipeline._cache(order)
+    other._transition(other._cache(order), PAID)
+
+    assert pipeline._transition(order, PAID)["state"] == PAID          # same move already made
+    with pytest.raises(OrderStateError):
+        pipeline._transition(order, INVOICED)
+    assert pipeline.current_order("s1")["state"] == PAID
+
+
+def test_resume_expires_old_checkouts_instead_of_polling_them(pipeline):
+    old = pipeline.store.create_order("s1", PAYMENT_PENDING)
+    pipeline.store.update(old["order_id"], stripe_session_id="cs_old")
+    recent = pipeline.store.create_order("s2", PAYMENT_PENDING)
+    with pipeline.store._lock:
+        pipeline.store._conn.execute("UPDATE orders SET updated_at = 0 WHERE order_id = ?", (old["order_id"],))
+
+    orders = pipeline.begin_resume()
+    pipeline.end_resume()
+    assert [o["order_id"] for o in orders] == [recent["order_id"]]
+    assert pipeline.store.get(old["order_id"])["state"] == EXPIRED
+
+
+def test_only_one_worker_resumes(pipeline, tmp_path):
+    other = OrderPipeline(OrderStore(tmp_path / "orders.db"))
+    pipeline.store.create_order("s1", PAID)
+    assert len(pipeline.begin_resume()) == 1
+    assert other.begin_resume() == []
+    pipeline.end_resume()
+    assert len(other.begin_resume()) == 1
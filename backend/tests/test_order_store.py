@@ -0,0 +1,59 @@
+# tests/test_order_store.py
+import sqlite3
+
+from orders.store import OrderStore
+
+
+def test_one_worker_claims_a_pending_call(tmp_path):
+    path = tmp_path / "orders.db"
+    a, b = OrderStore(path), OrderStore(path)     # two workers, one database
+    assert a.begin_call("o1:shipment:x", "o1", "shipment", "worker-a", claim_ttl=60) == ("claimed", None)
+    assert b.begin_call("o1:shipment:x", "o1", "shipment", "worker-b", claim_ttl=60) == ("busy", None)
+
+    a.finish_call("o1:shipment:x", {"tracking_number": "T1"})
+    assert b.begin_call("o1:shipment:x", "o1", "shipment", "worker-b", claim_ttl=60) == ("done", {"tracking_number": "T1"})
+
+
+def test_released_or_expired_claims_can_be_retaken(tmp_path):
+    store = OrderStore(tmp_path / "orders.db")
+    assert store.begin_call("k", "o1", "payment", "worker-a", claim_ttl=60)[0] == "claimed"
+    store.release_call("k", "worker-a")
+    assert store.begin_call("k", "o1", "payment", "worker-b", claim_ttl=60)[0] == "claimed"
+    assert store.begin_call("k", "o1", "payment", "worker-c", claim_ttl=0)[0] == "claimed"   # worker-b's claim expired
+
+
+def test_lease_has_one_holder(tmp_path):
+    path = tmp_path / "orders.db"
+    a, b = OrderStore(path), OrderStore(path)
+    assert a.acquire_lease("resume", "worker-a", ttl=60)
+    assert a.acquire_lease("resume", "worker-a", ttl=60)     # renewal
+    assert not b.acquire_lease("resume", "worker-b", ttl=60)
+    a.release_lease("resume", "worker-a")
+    assert b.acquire_lease("resume", "worker-b", ttl=60)
+    assert a.acquire_lease("resume", "worker-a", ttl=60) is False
+    assert OrderStore(path).acquire_lease("resume", "worker-c", ttl=60) is False
+
+
+def test_claim_columns_are_added_to_an_old_database(tmp_path):
+    path = tmp_path / "orders.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE idempotency (key TEXT PRIMARY KEY, order_id TEXT NOT NULL, step TEXT NOT NULL, "
+        "status TEXT NOT NULL, result TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO idempotency VALUES ('k', 'o1', 'shipment', 'pending', NULL, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = OrderStore(path)
+    assert store.begin_call("k", "o1", "shipment", "worker-a", claim_ttl=60) == ("claimed", None)
+
+
+def test_update_with_expected_state_does_not_overwrite_a_newer_state(tmp_path):
+    path = tmp_path / "orders.db"
+    a, b = OrderStore(path), OrderStore(path)
+    order = a.create_order("s1", "payment_pending")
+    assert b.update(order["order_id"], expected_state="payment_pending", state="paid")["state"] == "paid"
+    assert a.update(order["order_id"], expected_state="payment_pending", state="invoiced") is None
+    assert a.get(order["order_id"])["state"] == "paid"
+    assert [e["to_state"] for e in a.events(order["order_id"])] == ["payment_pending", "paid"]
@@ -0,0 +1,120 @@
+# tests/test_pubsub.py
+import asyncio
+
+from runtime.pubsub import InProcessBroker, RedisBroker
+
+
+class FakeRedis:
+    """Just enough of a Redis server for pub/sub: channel -> subscribed connections."""
+
+    def __init__(self):
+        self.channels = {}
+
+    def client(self):
+        return FakeClient(self)
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.channels = set()
+        self.messages = asyncio.Queue()
+
+    @property
+    def subscribed(self):
+        return bool(self.channels)
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+        self.server.channels.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+        self.server.channels.get(channel, set()).discard(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        for channel in list(self.channels):
+            await self.unsubscribe(channel)
+
+
+class FakeClient:
+    """The part of the redis.asyncio client API RedisBroker uses."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def pubsub(self):
+        return FakePubSub(self.server)
+
+    async def publish(self, channel, data):
+        receivers = list(self.server.channels.get(channel, ()))
+        for ps in receivers:
+            ps.messages.put_nowait({"type": "message", "channel": channel.encode(), "data": data.encode()})
+        return len(receivers)
+
+    async def pubsub_numsub(self, *channels):
+        return [(channel.encode(), len(self.server.channels.get(channel, ()))) for channel in channels]
+
+    async def close(self):
+        pass
+
+
+def test_events_fan_out_to_every_subscriber_of_the_session():
+    async def scenario():
+        broker = InProcessBroker()
+        a, b = await broker.subscribe("s1"), await broker.subscribe("s1")
+        other = await broker.subscribe("s2")
+        assert await broker.has_subscribers("s1") and not await broker.has_subscribers("s3")
+        assert await broker.publish("s1", {"type": "agent_message", "n": 1}) == 2
+        assert await a.get() == {"type": "agent_message", "n": 1}
+        assert await b.get() == {"type": "agent_message", "n": 1}
+        assert other.queue.empty()
+
+        await a.close()
+        assert broker.subscriber_count("s1") == 1
+        assert await broker.publish("s1", {"type": "agent_message", "n": 2}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_full_queue_drops_the_oldest_event():
+    async def scenario():
+        broker = InProcessBroker(queue_size=2)
+        sub = await broker.subscribe("s1")
+        for n in range(5):
+            await broker.publish("s1", {"n": n})
+        assert sub.dropped == 3
+        assert [await sub.get(), await sub.get()] == [{"n": 3}, {"n": 4}]
+        assert sub.queued_bytes == 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_broker_delivers_between_workers():
+    async def scenario():
+        server = FakeRedis()
+        worker_a, worker_b = RedisBroker(client=server.client()), RedisBroker(client=server.client())
+        try:
+            assert not await worker_a.has_subscribers("s1")
+            sub = await worker_b.subscribe("s1")
+            assert server.channels["chai:session:s1"]
+            assert await worker_a.has_subscribers("s1")       # the socket is on the other worker
+
+            assert await worker_a.publish("s1", {"type": "shipment_created"}) == 1
+            assert await asyncio.wait_for(sub.get(), 2) == {"type": "shipment_created"}
+            assert await worker_a.publish("s2", {"type": "agent_message"}) == 0
+
+            await sub.close()
+            assert not server.channels["chai:session:s1"]
+            assert await worker_a.publish("s1", {"type": "agent_message"}) == 0
+        finally:
+            await worker_a.close()
+            await worker_b.close()
+
+    asyncio.run(scenario())
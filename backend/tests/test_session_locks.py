@@ -0,0 +1,44 @@
+# tests/test_session_locks.py
+import asyncio
+
+import pytest
+
+from runtime.session_locks import SessionBusyError, SessionLocks
+
+
+def test_turn_arriving_right_after_a_release_still_times_out():
+    async def scenario():
+        locks = SessionLocks()
+        lock = locks._lock("s1")
+        await lock.acquire()
+        queued = asyncio.ensure_future(lock.acquire())     # a turn already waiting
+        await asyncio.sleep(0)
+        lock.release()                                      # free, but `queued` is next in line
+        assert not lock.locked()
+
+        with pytest.raises(SessionBusyError):
+            async with locks.hold("s1", wait=0.05):
+                pass
+        with pytest.raises(SessionBusyError):
+            async with locks.hold("s1", wait=0):
+                pass
+        await queued
+        lock.release()
+        return locks.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["contended"] == 2
+    assert stats["busy"] == 2
+
+
+def test_free_lock_is_taken_at_once():
+    async def scenario():
+        locks = SessionLocks()
+        async with locks.hold("s1", wait=0):
+            pass
+        async with locks.hold("s1"):
+            pass
+        return locks.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["acquired"] == 2 and stats["contended"] == 0 and stats["busy"] == 0
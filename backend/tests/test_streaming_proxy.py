@@ -0,0 +1,43 @@
+# tests/test_streaming_proxy.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+from clients.streaming_proxy import StreamingProxy, _Download
+
+
+class SlowResponse:
+    """Upstream response double whose close takes a moment."""
+    url = "https://upstream.test/invoice.pdf"
+
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        await asyncio.sleep(0.02)
+        self.closed = True
+
+
+def test_cleanup_completes_when_the_finishing_task_is_cancelled():
+    async def scenario():
+        proxy = StreamingProxy(max_concurrency=1)
+        await proxy._acquire()
+        outcomes = []
+        resp = SlowResponse()
+        download = _Download(resp, outcomes.append)
+
+        finishing = asyncio.ensure_future(proxy._finish(download))    # e.g. _body's finally after a disconnect
+        await asyncio.sleep(0)
+        finishing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await finishing
+        await asyncio.sleep(0.1)
+        return resp, outcomes, proxy
+
+    resp, outcomes, proxy = asyncio.run(scenario())
+    assert resp.closed
+    assert outcomes == [False]       # the cache writer was told to abort
+    assert proxy.active == 0 and not proxy._cleanups
@@ -0,0 +1,102 @@
+# tests/test_stripe_webhook.py
+import hmac
+import json
+import time
+import hashlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("stripe")
+pytest.importorskip("requests")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routers.stripe_webhook as stripe_webhook
+from orders.pipeline import PAID, PAYMENT_PENDING, OrderPipeline
+from orders.store import OrderStore
+
+SECRET = "whsec_test_secret"
+CHECKOUT_ID = "cs_test_123"
+
+
+def _sign(payload: bytes, secret: str = SECRET, at: int = None) -> str:
+    at = int(time.time()) if at is None else at
+    mac = hmac.new(secret.encode(), f"{at}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={at},v1={mac}"
+
+
+def _event(event_id: str = "evt_1", payment_status: str = "paid", type_: str = "checkout.session.completed") -> bytes:
+    return json.dumps({
+        "id": event_id,
+        "object": "event",
+        "type": type_,
+        "data": {"object": {"id": CHECKOUT_ID, "object": "checkout.session", "payment_status": payment_status}},
+    }).encode()
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STRIPE_WEBHOOK_SECRET", SECRET)
+    pipeline = OrderPipeline(OrderStore(tmp_path / "orders.db"))
+    order = pipeline.store.create_order("session-1", PAYMENT_PENDING)
+    pipeline.store.update(order["order_id"], stripe_session_id=CHECKOUT_ID)
+    published = []
+
+    async def publish(session_id, event_type, **payload):
+        published.append((session_id, event_type, payload))
+        return 1
+
+    monkeypatch.setattr(stripe_webhook, "get_order_pipeline", lambda: pipeline)
+    monkeypatch.setattr(stripe_webhook, "publish_session_event", publish)
+    app = FastAPI()
+    app.include_router(stripe_webhook.router)
+    return TestClient(app), pipeline, order["order_id"], published
+
+
+def _post(client, payload, signature):
+    return client.post("/api/stripe/webhook", content=payload,
+                       headers={"stripe-signature": signature, "content-type": "application/json"})
+
+
+def test_paid_checkout_marks_order_paid(env):
+    client, pipeline, order_id, published = env
+    payload = _event()
+    assert _post(client, payload, _sign(payload)).status_code == 200
+    assert pipeline.store.get(order_id)["state"] == PAID
+    assert [p[1] for p in published] == ["payment_confirmed"]
+
+
+@pytest.mark.parametrize("signature", [
+    lambda payload: _sign(payload, secret="whsec_wrong"),
+    lambda payload: _sign(payload, at=int(time.time()) - 3600),     # outside Stripe's 5 minute tolerance
+    lambda payload: "t=1,v1=deadbeef",
+])
+def test_bad_or_expired_signature_is_rejected(env, signature):
+    client, pipeline, order_id, published = env
+    payload = _event()
+    assert _post(client, payload, signature(payload)).status_code == 400
+    assert pipeline.store.get(order_id)["state"] == PAYMENT_PENDING
+    assert published == []
+
+
+def test_replayed_event_changes_nothing(env):
+    client, pipeline, order_id, published = env
+    payload = _event()
+    assert _post(client, payload, _sign(payload)).status_code == 200
+    order = pipeline.store.get(order_id)
+    events = pipeline.store.events(order_id)
+
+    assert _post(client, payload, _sign(payload)).status_code == 200
+    assert pipeline.store.get(order_id) == order
+    assert pipeline.store.events(order_id) == events
+    assert len(published) == 1
+
+
+def test_unpaid_session_is_ignored(env):
+    client, pipeline, order_id, published = env
+    payload = _event(payment_status="unpaid")
+    assert _post(client, payload, _sign(payload)).status_code == 200
+    assert pipeline.store.get(order_id)["state"] == PAYMENT_PENDING
+    assert published == []
@@ -0,0 +1,70 @@
+# tests/test_tool_executor.py
+import time
+import asyncio
+
+import pytest
+
+from runtime.deadline import DeadlineExceeded, deadline, remaining
+from runtime.tool_executor import ToolExecutor, ToolTimeoutError
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_run_without_deadline():
+    executor = ToolExecutor(max_workers=2)
+    try:
+        assert _run(executor.run("stripe", lambda a, b: a + b, 2, 3)) == 5
+        assert executor.stats()["stripe"]["calls"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_run_under_deadline_sees_it_in_the_worker():
+    executor = ToolExecutor(max_workers=2)
+
+    async def go():
+        with deadline(5):
+            return await executor.run("stripe", remaining)
+
+    try:
+        left = _run(go())
+        assert left is not None and 0 < left <= 5
+    finally:
+        executor.shutdown()
+
+
+def test_run_times_out_at_the_deadline():
+    executor = ToolExecutor(max_workers=2)
+
+    async def go():
+        started = time.perf_counter()
+        with deadline(0.05):
+            with pytest.raises(ToolTimeoutError):
+                await executor.run("stripe", time.sleep, 0.3, timeout=10)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.4)    # let the worker finish and release its slot on this loop
+        return elapsed
+
+    try:
+        assert _run(go()) < 0.25
+    finally:
+        executor.shutdown()
+
+
+def test_run_after_deadline_does_not_start():
+    executor = ToolExecutor(max_workers=2)
+    calls = []
+
+    async def go():
+        with deadline(0.01):
+            await asyncio.sleep(0.02)
+            return await executor.run("stripe", calls.append, 1)
+
+    try:
+        with pytest.raises(DeadlineExceeded):
+            _run(go())
+        assert calls == []
+    finally:
+        executor.shutdown()
@@ -0,0 +1,29 @@
+# tests/test_traces_auth.py
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers.traces import router
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path", ["/api/traces", "/api/traces/abc", "/api/traces/abc/waterfall"])
+def test_traces_need_the_admin_token(client, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_traces_with_the_admin_token(client):
+    headers = {"X-Admin-Token": "admin-secret"}
+    assert client.get("/api/traces", headers=headers).status_code == 200
+    assert client.get("/api/traces/abc", headers=headers).status_code == 404
@@ -0,0 +1,78 @@
+# tests/test_ws_manager.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from starlette.websockets import WebSocketState
+
+import runtime.pubsub as pubsub
+from runtime.pubsub import InProcessBroker
+from runtime.ws_manager import WebSocketManager
+
+
+class SlowSocket:
+    """WebSocket double whose sends take a while and which records overlapping sends."""
+
+    def __init__(self) -> None:
+        self.application_state = WebSocketState.CONNECTED
+        self.client_state = WebSocketState.CONNECTED
+        self.sending = 0
+        self.overlaps = 0
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sending += 1
+        if self.sending > 1:
+            self.overlaps += 1
+        await asyncio.sleep(0.005)
+        self.sent.append(text)
+        self.sending -= 1
+
+    async def close(self, code=1000, reason=""):
+        await self.send_text(f"close {code}")
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+def test_pings_and_events_never_send_concurrently(monkeypatch):
+    broker = InProcessBroker()
+    monkeypatch.setattr(pubsub, "_broker", broker)
+
+    async def go():
+        manager = WebSocketManager(heartbeat_interval=0.002, idle_timeout=60, send_timeout=5)
+        ws = SlowSocket()
+        conn = await manager.connect(ws, "session-1")
+        for n in range(40):
+            await broker.publish("session-1", {"type": "event", "n": n})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.1)
+        await manager.disconnect(conn, reason="done")
+        return ws
+
+    ws = asyncio.run(go())
+    assert ws.overlaps == 0
+    assert any('"ping"' in text for text in ws.sent)
+    assert sum('"event"' in text for text in ws.sent) == 40
+
+
+def test_dropped_events_count_survives_disconnect(monkeypatch):
+    broker = InProcessBroker(queue_size=1)
+    monkeypatch.setattr(pubsub, "_broker", broker)
+
+    async def go():
+        manager = WebSocketManager(heartbeat_interval=60, idle_timeout=60, send_timeout=5)
+        conn = await manager.connect(SlowSocket(), "session-1")
+        for n in range(10):
+            await broker.publish("session-1", {"type": "event", "n": n})   # no await in between: the queue overflows
+        before = manager.stats()
+        await manager.disconnect(conn, reason="done")
+        return before, manager.stats()
+
+    before, after = asyncio.run(go())
+    assert before["dropped_events"] == before["dropped_events_open"] > 0
+    assert after["dropped_events"] == before["dropped_events"]
+    assert after["dropped_events_open"] == 0
@@ -9,30 +9,40 @@ logger = logging.getLogger(__name__)
 # Structure: { "session_id_1": {"item_1": qty, "item_2": qty}, "session_id_2": ... }
 # This is an in-memory store. It will be cleared if the server restarts.
 session_carts = {}
+# Bumped on every cart change; payment idempotency keys are derived from it so
+# a retry reuses the checkout while an edited cart gets a fresh one.
+session_cart_versions = defaultdict(int)
 
 def get_cart_for_session(session_id: str) -> defaultdict:
     """Retrieves or creates a cart object for a given session ID."""
     if session_id not in session_carts:
-        logger.info(f"Cart not found for session '{session_id}'. Creating a new one.")
+        logger.info("Cart not found for session '%s'. Creating a new one.", session_id)
         session_carts[session_id] = defaultdict(int)
     return session_carts[session_id]
 
+def get_cart_version(session_id: str) -> int:
+    return session_cart_versions[session_id]
+
+def _bump_cart_version(session_id: str) -> None:
+    session_cart_versions[session_id] += 1
+
 @tool
 def add_to_cart(session_id: str, item_name: str, quantity: int) -> str:
     """
     Adds a specified quantity of an item to the shopping cart.
     """
-    logger.info(f"Tool: add_to_cart called for session '{session_id}'. Adding {quantity} of '{item_name}'.")
+    logger.debug("Tool: add_to_cart called for session '%s'. Adding %s of '%s'.", session_id, quantity, item_name)
     
     if quantity <= 0:
-        logger.warning(f"Invalid quantity '{quantity}' for adding to cart. Quantity must be positive.")
+        logger.warning("Invalid quantity '%s' for adding to cart. Quantity must be positive.", quantity)
         return "Quantity must be a positive integer to add to cart."
     
     cart = get_cart_for_session(session_id)
     
     cart[item_name] += quantity
-    logger.info(f"Added {quantity} x {item_name} to cart for session '{session_id}'.")
-    logger.debug(f"Current cart state for '{session_id}': {dict(cart)}")
+    _bump_cart_version(session_id)
+    logger.info("Added %s x %s to cart for session '%s'.", quantity, item_name, session_id)
+    logger.debug("Current cart state for '%s': %s", session_id, cart)
     
     return f"Added {quantity} x {item_name} to the cart. Current quantity: {cart[item_name]}."
 
@@ -41,28 +51,29 @@ def remove_from_cart(session_id: str, item_name: str, quantity: int) -> str:
     """
     Removes a specified quantity of an item from the shopping cart.
     """
-    logger.info(f"Tool: remove_from_cart called for session '{session_id}'. Removing {quantity} of '{item_name}'.")
+    logger.debug("Tool: remove_from_cart called for session '%s'. Removing %s of '%s'.", session_id, quantity, item_name)
 
     if quantity <= 0:
-        logger.warning(f"Invalid quantity '{quantity}' for removing from cart. Quantity must be positive.")
+        logger.warning("Invalid quantity '%s' for removing from cart. Quantity must be positive.", quantity)
         return "Quantity must be a positive integer to remove from cart."
     
     cart = get_cart_for_session(session_id)
     
     if item_name not in cart or cart[item_name] == 0:
-        logger.warning(f"Attempted to remove '{item_name}' but it was not in the cart for session '{session_id}'.")
+        logger.warning("Attempted to remove '%s' but it was not in the cart for session '%s'.", item_name, session_id)
         return f"{item_name} is not in the cart."
 
     current_quantity = cart[item_name]
+    _bump_cart_version(session_id)
     if quantity >= current_quantity:
         del cart[item_name]
-        logger.info(f"Removed all {current_quantity} x {item_name} from cart for session '{session_id}'.")
-        logger.debug(f"Current cart state for '{session_id}': {dict(cart)}")
+        logger.info("Removed all %s x %s from cart for session '%s'.", current_quantity, item_name, session_id)
+        logger.debug("Current cart state for '%s': %s", session_id, cart)
         return f"Removed all {current_quantity} x {item_name} from the cart."
     else:
         cart[item_name] -= quantity
-        logger.info(f"Removed {quantity} x {item_name} from cart for session '{session_id}'.")
-        logger.debug(f"Current cart state for '{session_id}': {dict(cart)}")
+        logger.info("Removed %s x %s from cart for session '%s'.", quantity, item_name, session_id)
+        logger.debug("Current cart state for '%s': %s", session_id, cart)
         return f"Removed {quantity} x {item_name} from the cart. Remaining quantity: {cart[item_name]}."
 
 @tool
@@ -70,16 +81,16 @@ def view_cart(session_id: str) -> str:
     """
     Displays the current contents of the shopping cart.
     """
-    logger.info(f"Tool: view_cart called for session '{session_id}'.")
+    logger.debug("Tool: view_cart called for session '%s'.", session_id)
     cart = get_cart_for_session(session_id)
     
     if not cart:
-        logger.info(f"Cart for session '{session_id}' is empty.")
+        logger.info("Cart for session '%s' is empty.", session_id)
         return "The cart is currently empty."
 
     cart_items = [f"{qty} x {item}" for item, qty in cart.items()]
     cart_summary = ", ".join(cart_items)
-    logger.info(f"Cart contents for session '{session_id}': {cart_summary}")
+    logger.info("Cart contents for session '%s': %s", session_id, cart_summary)
     return f"The cart contains: {cart_summary}."
 
 @tool
@@ -87,11 +98,12 @@ def clear_cart(session_id: str) -> str:
     """
     Empties the shopping cart.
     """
-    logger.info(f"Tool: clear_cart called for session '{session_id}'.")
+    logger.debug("Tool: clear_cart called for session '%s'.", session_id)
     cart = get_cart_for_session(session_id)
     
     cart.clear()
-    logger.info(f"Cart for session '{session_id}' has been cleared.")
+    _bump_cart_version(session_id)
+    logger.info("Cart for session '%s' has been cleared.", session_id)
     return "The cart has been cleared."
 
 cart_tools = [add_to_cart, remove_from_cart, view_cart, clear_cart]
\ No newline at end of file
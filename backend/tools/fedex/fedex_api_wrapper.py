@@ -2,45 +2,26 @@ import logging
 import os
 import requests
 from dotenv import load_dotenv
-from token_service import get_token_for_provider, refresh_token_for_provider
+from clients.http_client import ClientCredentialsTokenSource, ProviderHttpClient, get_http_client
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def _request_with_auto_refresh(method, url, headers=None, **kwargs):
-    provider = "fedex"
-    hdrs = dict(headers or {})
-    tok = get_token_for_provider(provider)
-    
-    if tok and isinstance(tok, dict) and tok.get("access_token"):
-        hdrs.setdefault("Authorization", f"Bearer {tok['access_token']}")
-    
-    logger.debug(f"Making request to {url} with method {method}.")
-    resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-    
-    if getattr(resp, "status_code", None) in (401, 403):
-        logger.warning(f"Request to {url} failed with status {resp.status_code}. Attempting token refresh.")
-        try:
-            new_tok = refresh_token_for_provider(provider)
-            if new_tok and new_tok.get("access_token"):
-                hdrs["Authorization"] = f"Bearer {new_tok['access_token']}"
-                logger.info("Token refreshed successfully. Retrying request.")
-                resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-            else:
-                logger.error("Failed to get a new access token during refresh.")
-        except Exception as e:
-            logger.error(f"An exception occurred during token refresh: {e}", exc_info=True)
-            raise
-
-    logger.debug(f"Request to {url} completed with status {resp.status_code}.")
-    return resp
+def _fedex_http(token_url: str, client_id: str, client_secret: str) -> ProviderHttpClient:
+    # One pooled client per process; its OAuth token is cached until shortly
+    # before expiry instead of being fetched for every wrapper instance.
+    return get_http_client(
+        "fedex",
+        token_source_factory=lambda http: ClientCredentialsTokenSource(token_url, client_id, client_secret, http),
+    )
 
 class FedExWrapper:
     def __init__(self):
         logger.info("Initializing FedExWrapper.")
-        self.token_url = "https://apis-sandbox.fedex.com/oauth/token"
-        self.shipment_url = "https://apis-sandbox.fedex.com/ship/v1/shipments"
+        base_url = os.getenv("FEDEX_BASE_URL", "https://apis-sandbox.fedex.com").rstrip("/")
+        self.token_url = f"{base_url}/oauth/token"
+        self.shipment_url = f"{base_url}/ship/v1/shipments"
         self.client_id = os.getenv("FEDEX_CLIENT_ID")
         self.client_secret = os.getenv("FEDEX_CLIENT_SECRET")
         self.account_number = os.getenv("FEDEX_ACCOUNT_NUMBER")
@@ -50,6 +31,7 @@ class FedExWrapper:
             logger.error("Missing one or more required environment variables for FedEx API (FEDEX_CLIENT_ID, FEDEX_CLIENT_SECRET, FEDEX_ACCOUNT_NUMBER).")
             raise ValueError("Missing required FedEx environment variables.")
         
+        self.http = _fedex_http(self.token_url, self.client_id, self.client_secret)
         try:
             self.token = self.get_token()
         except Exception:
@@ -58,33 +40,21 @@ class FedExWrapper:
 
     def get_token(self):
         logger.info("Requesting FedEx token...")
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-        }
-        
         try:
-            response = _request_with_auto_refresh('post', self.token_url, data=data, auth=(self.client_id, self.client_secret))
-            response.raise_for_status() # Raise an exception for bad status codes
-            token_data = response.json()
-            access_token = token_data.get("access_token")
-            if not access_token:
-                logger.error(f"Access token not found in token response: {token_data}")
-                raise Exception("Access token not found in response.")
+            access_token = self.http.token_source.get()
             logger.info("FedEx token acquired successfully.")
             return access_token
         except requests.exceptions.RequestException as req_e:
             logger.error(f"Failed to get FedEx token due to request error: {req_e}", exc_info=True)
             raise Exception(f"Request error: {req_e}")
         except Exception as e:
-            logger.error(f"Failed to get FedEx token. Status: {response.status_code}, Response: {response.text}")
-            raise Exception(f"Failed to get FedEx token: {response.status_code} - {response.text}")
+            logger.error(f"Failed to get FedEx token: {e}")
+            raise Exception(f"Failed to get FedEx token: {e}")
 
     def create_shipment(self):
         logger.info("Attempting to create FedEx shipment.")
+        # The client adds the bearer token and refreshes it on a 401.
         headers = {
-            "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
             "x-locale": "en_US",
         }
@@ -140,16 +110,19 @@ class FedExWrapper:
             }
         }
         
-        logger.debug(f"FedEx shipment payload: {payload}")
+        logger.debug("FedEx shipment payload: %s", payload)
 
         try:
-            response = _request_with_auto_refresh('post', self.shipment_url, headers=headers, json=payload)
+            response = self.http.request('post', self.shipment_url, headers=headers, json=payload)
             response.raise_for_status()
             
             json_data = response.json()
             label_url = None
+            tracking_number = None
             try:
-                label_url = json_data.get("output", {}).get("transactionShipments", [{}])[0].get("pieceResponses", [{}])[0].get("packageDocuments", [{}])[0].get("url")
+                shipment = json_data.get("output", {}).get("transactionShipments", [{}])[0]
+                tracking_number = shipment.get("masterTrackingNumber")
+                label_url = shipment.get("pieceResponses", [{}])[0].get("packageDocuments", [{}])[0].get("url")
             except (IndexError, TypeError):
                 logger.warning("Could not extract label URL from successful response.")
                 pass
@@ -157,6 +130,7 @@ class FedExWrapper:
             logger.info("FedEx shipment created successfully.")
             return {
                 "success": True,
+                "tracking_number": tracking_number,
                 "label_url": label_url,
                 "error": None
             }
@@ -1,17 +1,42 @@
 import logging
 from langchain_core.tools import tool
 from tools.fedex.fedex_api_wrapper import FedExWrapper
+from orders.pipeline import get_order_pipeline, OrderStateError
+from runtime.pubsub import get_pubsub
 
 logger = logging.getLogger(__name__)
 
 @tool
-def create_fedex_shipment() -> str:
+def create_fedex_shipment(session_id: str = "") -> str:
     """
     Creates a FedEx shipment using sandbox credentials.
+    Pass the session_id so the shipment is recorded against the paid order
+    (and never created twice for it).
     Returns tracking number and label URL.
     """
     logger.info("Invoking create_fedex_shipment tool.")
     
+    if session_id:
+        try:
+            order = get_order_pipeline().ship(session_id)
+        except OrderStateError as e:
+            logger.warning(f"Cannot ship for session {session_id}: {e}")
+            return f" Failed to create FedEx shipment.\nError: {e}"
+        except Exception as e:
+            logger.error(f"An exception occurred while shipping order for session {session_id}: {e}", exc_info=True)
+            return f"An error occurred while creating a FedEx shipment: {e}"
+        get_pubsub().publish_threadsafe(session_id, {
+            "type": "shipment_created",
+            "order_id": order["order_id"],
+            "tracking_number": order["tracking_number"],
+            "label_url": order["label_url"],
+        })
+        return (
+            f" Shipment Created!\n"
+            f"Tracking Number: {order['tracking_number']}\n"
+            f"Label URL: {order['label_url'] or 'Label not available'}"
+        )
+
     try:
         fedex = FedExWrapper()
         result = fedex.create_shipment()
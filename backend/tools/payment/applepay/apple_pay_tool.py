@@ -1,48 +1,117 @@
 import logging
-import requests
 import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-from typing import Optional
-from token_service import get_token_for_provider, refresh_token_for_provider
+from typing import Any, Dict, Optional, Tuple
+from clients.stripe_client import get_stripe_gateway
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def _request_with_auto_refresh(method, url, headers=None, **kwargs):
-    provider = "applepay"
-    hdrs = dict(headers or {})
-    tok = get_token_for_provider(provider)
-    if tok and isinstance(tok, dict) and tok.get("access_token"):
-        hdrs.setdefault("Authorization", f"Bearer {tok['access_token']}")
-    
-    logger.debug(f"Making {method} request to {url}")
-    resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-    
-    if getattr(resp, "status_code", None) in (401, 403):
-        logger.warning(f"Request failed with status {resp.status_code}. Attempting token refresh.")
-        try:
-            new_tok = refresh_token_for_provider(provider)
-            if new_tok and new_tok.get("access_token"):
-                hdrs["Authorization"] = f"Bearer {new_tok['access_token']}"
-                resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-                logger.info("Token refreshed and request retried successfully.")
-            else:
-                logger.error("Failed to get a new access token during refresh.")
-        except Exception as e:
-            logger.error(f"An exception occurred during token refresh: {e}", exc_info=True)
-    return resp
-
-# Global variable for Apple Pay session ID (consider using a persistent store in production)
-apple_pay_session_id = ""
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_STATUS_TTL = 5.0  # seconds a retrieved checkout status is reused
+
+
+class ApplePaySessions:
+    """
+    Chat session id -> Stripe checkout session id, bounded (least recently
+    used entries are evicted) and safe to use from concurrent tool threads.
+    Retrieved checkout statuses are cached for `status_ttl` seconds (at most
+    `max_sessions` of them, expired ones pruned as new ones arrive), and
+    concurrent lookups of the same checkout share one Stripe call.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, status_ttl: float = DEFAULT_STATUS_TTL) -> None:
+        self.max_sessions = max_sessions
+        self.status_ttl = status_ttl
+        self._checkouts: "OrderedDict[str, str]" = OrderedDict()
+        # Insertion order is expiry order: every entry lives `status_ttl`.
+        self._statuses: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def set(self, session_id: str, checkout_id: str) -> None:
+        with self._lock:
+            self._checkouts[session_id] = checkout_id
+            self._checkouts.move_to_end(session_id)
+            while len(self._checkouts) > self.max_sessions:
+                evicted, old_checkout = self._checkouts.popitem(last=False)
+                self._statuses.pop(old_checkout, None)
+                logger.debug(f"Evicted Apple Pay checkout of session {evicted}.")
+
+    def get(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            checkout_id = self._checkouts.get(session_id)
+            if checkout_id is not None:
+                self._checkouts.move_to_end(session_id)
+            return checkout_id
+
+    def status(self, checkout_id: str) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._statuses.get(checkout_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            flight = self._inflight.setdefault(checkout_id, threading.Lock())
+        with flight:
+            # Whoever held the flight lock before us may have just filled the cache.
+            with self._lock:
+                cached = self._statuses.get(checkout_id)
+                if cached and cached[0] > time.monotonic():
+                    return cached[1]
+            try:
+                session = get_stripe_gateway().retrieve_checkout_session(checkout_id)
+                info = {
+                    "id": session.id,
+                    "status": session.status,
+                    "payment_status": session.payment_status,
+                    "amount_total": session.amount_total / 100 if session.amount_total else 0,  # Convert cents to dollars
+                    "currency": session.currency,
+                    "url": session.url
+                }
+                self._store_status(checkout_id, info)
+                return info
+            finally:
+                with self._lock:
+                    self._inflight.pop(checkout_id, None)
+
+
+    def _store_status(self, checkout_id: str, info: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._statuses.pop(checkout_id, None)
+            self._statuses[checkout_id] = (now + self.status_ttl, info)
+            while self._statuses:
+                oldest_id, (expires_at, _) = next(iter(self._statuses.items()))
+                if expires_at > now and len(self._statuses) <= self.max_sessions:
+                    break
+                del self._statuses[oldest_id]
+
+
+def _idempotency_key(session_id: str, amount_cents: int, product_name: str) -> str:
+    # Same session + same cart -> same key, so a retried call gets the checkout
+    # Stripe already created instead of a second one.
+    cart = json.dumps({"session_id": session_id, "amount_cents": amount_cents, "product": product_name}, sort_keys=True)
+    return f"applepay-{hashlib.sha256(cart.encode()).hexdigest()[:32]}"
+
+
+apple_pay_sessions = ApplePaySessions(
+    max_sessions=int(os.getenv("APPLE_PAY_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+    status_ttl=float(os.getenv("APPLE_PAY_STATUS_TTL", DEFAULT_STATUS_TTL)),
+)
 
 @tool
-def generate_apple_pay_link(amount_dollars: float, product_name: str = "Chai Corner Order") -> str:
+def generate_apple_pay_link(session_id: str, amount_dollars: float, product_name: str = "Chai Corner Order") -> str:
     """
     Generates an Apple Pay payment link using Stripe Checkout.
     
     Args:
+        session_id (str): The chat session ID the checkout belongs to
         amount_dollars (float): The payment amount in dollars
         product_name (str): The name of the product/order (default: "Chai Corner Order")
     
@@ -62,26 +131,28 @@ def generate_apple_pay_link(amount_dollars: float, product_name: str = "Chai Cor
         
         amount_cents = int(amount_dollars * 100)
         
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{
-                "price_data": {
-                    "currency": "usd",
-                    "unit_amount": amount_cents,
-                    "product_data": {
-                        "name": product_name,
+        # Shared pooled Stripe client; the key lets the SDK (and a retried tool call) retry safely.
+        session = get_stripe_gateway().create_checkout_session(
+            {
+                "payment_method_types": ["card"],
+                "line_items": [{
+                    "price_data": {
+                        "currency": "usd",
+                        "unit_amount": amount_cents,
+                        "product_data": {
+                            "name": product_name,
+                        },
                     },
-                },
-                "quantity": 1,
-            }],
-            mode="payment",
-            success_url="https://lightningminds.com/success",
-            cancel_url="https://lightningminds.com/cancel",
+                    "quantity": 1,
+                }],
+                "mode": "payment",
+                "success_url": "https://lightningminds.com/success",
+                "cancel_url": "https://lightningminds.com/cancel",
+            },
+            idempotency_key=_idempotency_key(session_id, amount_cents, product_name),
         )
         
-        # Save session ID globally for potential future use
-        global apple_pay_session_id
-        apple_pay_session_id = session.id
+        apple_pay_sessions.set(session_id, session.id)
         logger.info(f"Generated Stripe Checkout Session ID: {session.id}")
         logger.info(f"Apple Pay Link Generated: {session.url}")
         
@@ -96,17 +167,18 @@ def generate_apple_pay_link(amount_dollars: float, product_name: str = "Chai Cor
         return "https://checkout.stripe.com/demo-apple-pay-link"
 
 @tool
-def get_apple_pay_session_status(session_id: Optional[str] = None) -> str:
+def get_apple_pay_session_status(session_id: str, checkout_session_id: Optional[str] = None) -> str:
     """
     Retrieves the status of an Apple Pay (Stripe) checkout session.
     
     Args:
-        session_id (str, optional): The Stripe session ID. If not provided, uses the last generated session.
+        session_id (str): The chat session ID
+        checkout_session_id (str, optional): The Stripe session ID. If not provided, uses the session's last generated checkout.
     
     Returns:
         str: Session status information
     """
-    logger.info(f"Checking Apple Pay session status for ID: {session_id}")
+    logger.info(f"Checking Apple Pay session status for session {session_id} (checkout: {checkout_session_id})")
     try:
         import stripe
         stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
@@ -115,23 +187,13 @@ def get_apple_pay_session_status(session_id: Optional[str] = None) -> str:
             logger.error("Stripe API key not configured.")
             return "Error: Stripe API key not configured."
         
-        # Use provided session_id or fall back to global one
-        session_to_check = session_id or apple_pay_session_id
+        session_to_check = checkout_session_id or apple_pay_sessions.get(session_id)
         
         if not session_to_check:
             logger.warning("No Apple Pay session ID available. Cannot check status.")
             return "No Apple Pay session ID available. Please generate a payment link first."
         
-        session = stripe.checkout.Session.retrieve(session_to_check)
-        
-        status_info = {
-            "id": session.id,
-            "status": session.status,
-            "payment_status": session.payment_status,
-            "amount_total": session.amount_total / 100 if session.amount_total else 0,  # Convert cents to dollars
-            "currency": session.currency,
-            "url": session.url
-        }
+        status_info = apple_pay_sessions.status(session_to_check)
         
         logger.info(f"Retrieved session status: {status_info}")
         return f"Apple Pay Session Status: {status_info['status']}, Payment Status: {status_info['payment_status']}, Amount: ${status_info['amount_total']}"
@@ -141,34 +203,38 @@ def get_apple_pay_session_status(session_id: Optional[str] = None) -> str:
         return f"Error retrieving Apple Pay session status: {str(e)}"
 
 @tool
-def save_apple_pay_session_id(session_id: str) -> str:
+def save_apple_pay_session_id(session_id: str, checkout_session_id: str) -> str:
     """
     Saves an Apple Pay session ID for later reference.
     
     Args:
-        session_id (str): The Stripe session ID to save
+        session_id (str): The chat session ID
+        checkout_session_id (str): The Stripe session ID to save
     
     Returns:
         str: Confirmation message
     """
-    logger.info(f"Saving Apple Pay session ID: {session_id}")
-    global apple_pay_session_id
-    apple_pay_session_id = session_id
-    logger.info(f"Apple Pay session ID '{session_id}' has been saved.")
-    return f"Apple Pay session ID '{session_id}' has been saved successfully."
+    logger.info(f"Saving Apple Pay session ID {checkout_session_id} for session {session_id}")
+    apple_pay_sessions.set(session_id, checkout_session_id)
+    logger.info(f"Apple Pay session ID '{checkout_session_id}' has been saved.")
+    return f"Apple Pay session ID '{checkout_session_id}' has been saved successfully."
 
 @tool
-def get_apple_pay_session_id() -> str:
+def get_apple_pay_session_id(session_id: str) -> str:
     """
-    Retrieves the currently saved Apple Pay session ID.
+    Retrieves the Apple Pay session ID saved for the chat session.
+    
+    Args:
+        session_id (str): The chat session ID
     
     Returns:
         str: The saved session ID or a message if none is saved
     """
-    logger.info("Attempting to retrieve saved Apple Pay session ID.")
-    if apple_pay_session_id:
-        logger.info(f"Retrieved saved Apple Pay session ID: {apple_pay_session_id}")
-        return apple_pay_session_id
+    logger.info(f"Attempting to retrieve saved Apple Pay session ID for session {session_id}.")
+    checkout_id = apple_pay_sessions.get(session_id)
+    if checkout_id:
+        logger.info(f"Retrieved saved Apple Pay session ID: {checkout_id}")
+        return checkout_id
     else:
         logger.warning("No Apple Pay session ID has been saved yet.")
         return "No Apple Pay session ID has been saved yet."
@@ -1,18 +1,14 @@
 import os
 import json
-import requests
+import uuid
 from typing import Optional
-from pathlib import Path
 import logging
 
-from langchain.agents import Tool
-from langchain_core.tools import tool
+from langchain_core.tools import BaseTool, tool
 from dotenv import load_dotenv
 
 from state.session import set_paypal_order_id, get_paypal_order_id
-from token_service import get_token_for_provider, refresh_token_for_provider
-from paypal_agent_toolkit.langchain.toolkit import PayPalToolkit
-from paypal_agent_toolkit.shared.configuration import Configuration, Context
+from clients.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +17,11 @@ load_dotenv()
 # ----------------------------
 # PayPal Toolkit (LangChain) 
 # ----------------------------
-def get_paypal_tools() -> list[Tool]:
+def get_paypal_tools() -> list[BaseTool]:
+    # The toolkit is only needed when these tools are enabled; keep it off the startup path.
+    from paypal_agent_toolkit.langchain.toolkit import PayPalToolkit
+    from paypal_agent_toolkit.shared.configuration import Configuration, Context
+
     paypal_client_id = os.getenv("PAYPAL_CLIENT_ID")
     paypal_client_secret = os.getenv("PAYPAL_CLIENT_SECRET")
     if not paypal_client_id or not paypal_client_secret:
@@ -46,70 +46,33 @@ def get_paypal_tools() -> list[Tool]:
     return toolkit.get_tools()
 
 # ----------------------------
-# Token-aware HTTP helper
+# HTTP client (pooled, retrying, token-aware)
 # ----------------------------
-def _request_with_auto_refresh(method, url, headers=None, **kwargs):
-    provider = "paypal"
-    hdrs = dict(headers or {})
-    tok = get_token_for_provider(provider)
-    if tok and isinstance(tok, dict) and tok.get("access_token"):
-        hdrs.setdefault("Authorization", f"Bearer {tok['access_token']}")
-    
-    logger.debug(f"Making {method} request to {url}")
-    resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-    
-    if getattr(resp, "status_code", None) in (401, 403):
-        logger.warning(f"Request to {url} failed with status {resp.status_code}. Attempting token refresh.")
-        try:
-            new_tok = refresh_token_for_provider(provider)
-            if new_tok and new_tok.get("access_token"):
-                hdrs["Authorization"] = f"Bearer {new_tok['access_token']}"
-                resp = requests.request(method.upper(), url, headers=hdrs, **kwargs)
-                logger.info("Token refreshed and request retried successfully.")
-            else:
-                logger.error("Failed to get a new access token during refresh.")
-        except Exception as e:
-            logger.error(f"An exception occurred during token refresh: {e}", exc_info=True)
-    return resp
+def _http():
+    return get_http_client("paypal")
 
 # ----------------------------
 # Env / base URL
 # ----------------------------
 PAYPAL_ENV = os.getenv("PAYPAL_ENV", "sandbox").lower()  # "sandbox" or "live"
 def _paypal_api_base() -> str:
+    override = os.getenv("PAYPAL_API_BASE")
+    if override:
+        return override.rstrip("/")
     return "https://api-m.paypal.com" if PAYPAL_ENV == "live" else "https://api-m.sandbox.paypal.com"
 
-# ----------------------------
-# Order ID persistence
-# ----------------------------
-_ORDER_FILE = Path(__file__).parent / "last_order_id.txt"
-
-def _write_order_id(oid: str) -> None:
-    try:
-        _ORDER_FILE.write_text(oid.strip(), encoding="utf-8")
-        logger.info(f"PayPal order ID '{oid}' written to file.")
-    except Exception as e:
-        logger.error(f"Failed to write PayPal order ID to file: {e}", exc_info=True)
-
-def _read_order_id() -> Optional[str]:
-    try:
-        if _ORDER_FILE.exists():
-            oid = _ORDER_FILE.read_text(encoding="utf-8").strip()
-            logger.info(f"Read PayPal order ID '{oid}' from file.")
-            return oid
-    except Exception as e:
-        logger.error(f"Failed to read PayPal order ID from file: {e}", exc_info=True)
-    logger.info("No PayPal order ID found in file.")
-    return None
-
 def create_paypal_order(
     amount: float,
     currency: str = "USD",
     description: str = "Chai Order",
     return_url: Optional[str] = None,
     cancel_url: Optional[str] = None,
+    session_id: Optional[str] = None,
 ) -> dict:
-    """Create a PayPal order (intent=CAPTURE) and return the JSON response."""
+    """
+    Create a PayPal order (intent=CAPTURE) and return the JSON response.
+    The order id is recorded against `session_id` when one is given.
+    """
     logger.info(f"Attempting to create PayPal order for amount {amount} {currency}.")
     url = f"{_paypal_api_base()}/v2/checkout/orders"
     payload = {
@@ -123,7 +86,11 @@ def create_paypal_order(
         payload["application_context"] = {"return_url": return_url, "cancel_url": cancel_url}
         
     logger.debug(f"Payload for PayPal order: {payload}")
-    resp = _request_with_auto_refresh("POST", url, headers={"Content-Type": "application/json"}, json=payload)
+    # PayPal-Request-Id makes the create idempotent, so the client may retry it.
+    resp = _http().request(
+        "POST", url, json=payload, idempotent=True,
+        headers={"Content-Type": "application/json", "PayPal-Request-Id": str(uuid.uuid4())},
+    )
     
     try:
         data = resp.json()
@@ -137,22 +104,26 @@ def create_paypal_order(
 
     oid = data.get("id")
     if oid:
-        _write_order_id(oid)
+        if session_id:
+            set_paypal_order_id(session_id, oid)
         logger.info(f"PayPal order created with ID: {oid}")
     else:
         logger.warning(f"PayPal order created but ID not found in response: {data}")
     return data
 
-def capture_paypal_order(order_id: Optional[str] = None) -> dict:
-    """Capture an existing PayPal order by ID."""
-    oid = order_id or _read_order_id()
+def capture_paypal_order(order_id: Optional[str] = None, session_id: Optional[str] = None) -> dict:
+    """Capture an existing PayPal order by ID, or the order saved for `session_id`."""
+    oid = order_id or (get_paypal_order_id(session_id) if session_id else None)
     if not oid or str(oid).lower().startswith("no valid paypal"):
         logger.error("No valid PayPal order_id provided or saved.")
         raise ValueError("No valid PayPal order_id provided or saved.")
 
     logger.info(f"Attempting to capture PayPal order with ID: {oid}")
     url = f"{_paypal_api_base()}/v2/checkout/orders/{oid}/capture"
-    resp = _request_with_auto_refresh("POST", url, headers={"Content-Type": "application/json"})
+    resp = _http().request(
+        "POST", url, idempotent=True,
+        headers={"Content-Type": "application/json", "PayPal-Request-Id": f"capture-{oid}"},
+    )
     
     try:
         data = resp.json()
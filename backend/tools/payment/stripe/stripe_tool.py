@@ -1,14 +1,11 @@
 import logging
 import os
-import stripe
 from langchain_core.tools import tool
 from pydantic import BaseModel
-from state.session import get_stripe_order_id
+from orders.pipeline import get_order_pipeline, OrderStateError, PAID, SHIPPED
 
 logger = logging.getLogger(__name__)
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-
 class CheckoutSessionRequest(BaseModel):
     """Request model for checking a checkout session."""
     session_id: str
@@ -26,25 +23,25 @@ def stripe_checkout_status_tool(session_id: str) -> str:
     """
     logger.info(f"Tool 'stripe_checkout_status_tool' called for session_id: {session_id}")
 
-    if not stripe.api_key:
+    if not os.getenv("STRIPE_SECRET_KEY"):
         logger.error("Stripe API key is not configured. Returning error.")
         return "Error: Stripe API key is not configured."
 
+    import stripe  # loaded on first use; already imported once the gateway has made a call
+
     try:
-        order_id = get_stripe_order_id(session_id)
-        if not order_id:
-            logger.warning(f"No Stripe order ID found for session: {session_id}")
-            return "No Stripe order ID found for this session."
-            
-        logger.info(f"Retrieving Stripe Checkout Session for order ID: {order_id}")
-        order = stripe.checkout.Session.retrieve(order_id)
-        
-        payment_status = order.payment_status
-        logger.info(f"Successfully retrieved Stripe session. Payment Status: {payment_status}")
+        # Answered from the local order once it is known to be paid; Stripe is
+        # only asked while the payment is still pending.
+        order = get_order_pipeline().confirm_payment(session_id)
+        payment_status = "paid" if order["state"] in (PAID, SHIPPED) else "unpaid"
+        logger.info(f"Order {order['order_id']} is {order['state']}. Payment Status: {payment_status}")
         
         return (
             f"Payment Status: {payment_status}."
         )
+    except OrderStateError as e:
+        logger.warning(f"No Stripe order found for session {session_id}: {e}")
+        return "No Stripe order ID found for this session."
     except stripe.error.StripeError as e:
         logger.error(f"Stripe API error when retrieving checkout session: {str(e)}", exc_info=True)
         return f"Error retrieving checkout session: {str(e)}"
@@ -1,30 +1,15 @@
 import os
 import logging
-import sys
 from typing import List
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
-from state.session import get_websocket
-import stripe
-from state.session import set_stripe_order_id, set_paypal_order_id
-
-import paypalrestsdk
+from runtime.pubsub import get_pubsub, publish_session_event
+from orders.pipeline import get_order_pipeline, OrderStateError
+from runtime.tool_executor import get_tool_executor, ToolTimeoutError
+from tools.cart.cart_tool import get_cart_version
 
 logger = logging.getLogger(__name__)
 
-try:
-    paypalrestsdk.configure({
-        "mode": os.getenv("PAYPAL_MODE", "sandbox"),  # "sandbox" or "live"
-        "client_id": os.getenv("PAYPAL_CLIENT_ID"),
-        "client_secret": os.getenv("PAYPAL_CLIENT_SECRET")
-    })
-    logger.info("PayPal SDK configured successfully.")
-except Exception as e:
-    logger.error(f"Error configuring PayPal SDK: {e}", exc_info=True)
-
-# --- Environment Setup ---
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-
 # --- Pydantic Models ---
 class CartItem(BaseModel):
     name: str = Field(..., description="The full name of the product.")
@@ -38,18 +23,19 @@ class TriggerPaymentArgs(BaseModel):
 @tool(args_schema=TriggerPaymentArgs)
 async def trigger_payment(cart_items: List[CartItem], session_id: str):
     """
-    Creates a Stripe PaymentIntent and sends its client_secret to the user's
-    WebSocket to initialize an embedded payment form.
+    Creates a Stripe PaymentIntent and publishes its client_secret to the
+    user's WebSocket connections to initialize an embedded payment form.
     """
     logger.info(f"Attempting to create PaymentIntent for session_id: {session_id}")
 
-    if not stripe.api_key:
+    if not os.getenv("STRIPE_SECRET_KEY"):
         logger.error("Stripe API key is not configured.")
         return "Error: Payment processor is not configured. Please set the STRIPE_API_KEY environment variable."
 
-    ws = get_websocket(session_id)
-    if not ws:
-        logger.warning(f"No active WebSocket for session {session_id}.")
+    # The form can only be shown over the session's WebSocket; without one,
+    # do not open a live checkout the customer cannot see.
+    if not await get_pubsub().has_subscribers(session_id):
+        logger.warning(f"No active WebSocket for session {session_id}; not starting payment.")
         return "Something went wrong. No active WebSocket for this session."
 
     try:
@@ -69,29 +55,27 @@ async def trigger_payment(cart_items: List[CartItem], session_id: str):
         
         logger.info(f"Line items for Stripe checkout: {line_items}")
 
-        checkout_session = stripe.checkout.Session.create(
-            line_items=line_items,
-            mode='payment',
-            ui_mode='embedded',
-            billing_address_collection='required',
-            redirect_on_completion='never'
+        # The pipeline records the checkout against the session's order and
+        # creates it under an idempotency key, so a retried call reuses it.
+        checkout_session = await get_tool_executor().run(
+            "stripe", get_order_pipeline().start_payment, session_id, line_items, get_cart_version(session_id)
         )
+        logger.info(f"Stripe Checkout Session ready with ID: {checkout_session['id']}")
         
-        logger.info(f"Stripe Checkout Session created with ID: {checkout_session.id}")
-        set_stripe_order_id(session_id, checkout_session.id) # Save the Stripe checkout order ID for later
-        
-        logger.info(f"Stripe Checkout Session URL: {checkout_session.url}")
-        
-        message = {
-            "type": "payment_intent_created",
-            "client_secret": checkout_session.client_secret,
-        }
-        await ws.send_json(message)
-        logger.info(f"Sent payment intent client_secret to WebSocket for session: {session_id}")
+        delivered = await publish_session_event(
+            session_id, "payment_intent_created", client_secret=checkout_session["client_secret"]
+        )
+        if not delivered:
+            logger.warning(f"No active WebSocket for session {session_id}.")
+            return "Something went wrong. No active WebSocket for this session."
+        logger.info(f"Published payment intent client_secret to {delivered} subscriber(s) of session: {session_id}")
 
         # The tool returns a confirmation that the payment process has been initiated.
         return "Payment form initialized. Let the user know, 'The payment form has been initialized.' DO NOT ask customer to let you know once they are finished paying"
 
+    except (OrderStateError, ToolTimeoutError) as e:
+        logger.warning(f"Could not start payment for session {session_id}: {e}")
+        return f"Error: {e}"
     except Exception as e:
         logger.error(f"Failed to create Stripe PaymentIntent: {e}", exc_info=True)
         return f"Error: Could not create a payment session. Details: {e}"
@@ -1,5 +1,7 @@
-from langchain.tools import tool
+from langchain_core.tools import tool
 from tools.quickbooks.quickbooks_wrapper import QuickBooksWrapper
+from tools.quickbooks.invoice_pdf_cache import get_invoice_pdf_cache
+from orders.pipeline import get_order_pipeline
 from state.session import get_customer
 import re
 
@@ -64,9 +66,14 @@ def create_invoice_tool(input_text: str, session_id: str) -> str:
 
     try:
         qb = QuickBooksWrapper() 
-        invoice = qb.create_invoice(customer_id, line_items)
-        invoice_id = invoice["Invoice"]["Id"]
-        doc_number = invoice["Invoice"].get("DocNumber", invoice_id)
+        # The order pipeline records the invoice against the session's order and
+        # makes the QuickBooks call idempotent for the same cart.
+        invoice = get_order_pipeline().create_invoice(session_id, customer_id, line_items, qb=qb)
+        invoice_id = invoice["id"]
+        doc_number = invoice["doc_number"]
+
+        # Customers usually click the link right away; have the PDF on disk by then.
+        get_invoice_pdf_cache().prewarm(qb, invoice_id, invoice.get("sync_token"))
 
         pdf_link = f"http://localhost:8001/download/invoice/{invoice_id}"
         logger.info(f"Successfully created Invoice #{doc_number} with PDF link: {pdf_link}")
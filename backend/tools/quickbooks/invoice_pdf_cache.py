@@ -0,0 +1,311 @@
+# tools/quickbooks/invoice_pdf_cache.py
+
+from __future__ import annotations
+import os, json, time, hashlib, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "invoices"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024   # 256 MiB
+DEFAULT_SYNC_TOKEN_TTL = 30             # seconds
+DEFAULT_INDEX_SAVE_DELAY = 2.0          # seconds; commits within this window share one index write
+
+
+@dataclass
+class CachedPdf:
+    invoice_id: str
+    sync_token: str
+    digest: str
+    size: int
+    path: Path
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class InvoicePdfCache:
+    """
+    Disk-backed, content-addressed cache for QuickBooks invoice PDFs.
+
+    - Blobs live under `blobs/<sha256>.pdf`; identical PDFs are stored once.
+    - Entries are keyed by (invoice_id, SyncToken), so editing an invoice in
+      QuickBooks (which bumps SyncToken) naturally misses the old entry.
+    - Total blob size is bounded; least-recently-used entries are evicted.
+    - The latest SyncToken per invoice is memoised for a short TTL so that
+      repeated clicks do not each cost a QuickBooks round trip.
+    - The index is rewritten at most once per `index_save_delay` seconds on a
+      timer thread, not on every commit; `flush_index()` writes it now.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        sync_token_ttl: int = DEFAULT_SYNC_TOKEN_TTL,
+        index_save_delay: float = DEFAULT_INDEX_SAVE_DELAY,
+    ) -> None:
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.index_file = self.root / "index.json"
+        self.max_bytes = max_bytes
+        self.sync_token_ttl = sync_token_ttl
+        self.index_save_delay = index_save_delay
+
+        self._lock = threading.Lock()
+        self._index_write_lock = threading.Lock()
+        self._index_dirty = False
+        self._index_timer: Optional[threading.Timer] = None
+        self._entries: "OrderedDict[Tuple[str, str], CachedPdf]" = OrderedDict()
+        self._blob_refs: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._sync_tokens: Dict[str, Tuple[str, float]] = {}
+        self._inflight: Dict[Tuple[str, str], threading.Event] = {}
+        self._prewarm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="invoice-pdf-prewarm")
+
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+        logger.info(f"InvoicePdfCache ready at {self.root} ({len(self._entries)} entries, {self._total_bytes} bytes).")
+
+    # ── persistence ────────────────────────────────────────────────────────
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / f"{digest}.pdf"
+
+    def _load_index(self) -> None:
+        try:
+            if not self.index_file.exists():
+                return
+            rows = json.loads(self.index_file.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"Invoice PDF cache index unreadable, starting empty: {e}")
+            return
+
+        # Rows are written oldest → newest, which is exactly LRU order.
+        for row in rows:
+            path = self._blob_path(row["digest"])
+            if not path.exists():
+                continue
+            entry = CachedPdf(row["invoice_id"], row["sync_token"], row["digest"], path.stat().st_size, path)
+            self._add_entry(entry)
+
+    def _schedule_index_save(self) -> None:
+        with self._lock:
+            self._index_dirty = True
+            if self._index_timer is not None:
+                return
+            timer = self._index_timer = threading.Timer(self.index_save_delay, self.flush_index)
+            timer.daemon = True
+        timer.start()
+
+    def flush_index(self) -> None:
+        """Write the index now if it changed since the last write."""
+        with self._index_write_lock:
+            with self._lock:
+                self._index_timer = None
+                if not self._index_dirty:
+                    return
+                self._index_dirty = False
+                rows = [
+                    {"invoice_id": e.invoice_id, "sync_token": e.sync_token, "digest": e.digest}
+                    for e in self._entries.values()
+                ]
+            tmp = self.index_file.with_suffix(".tmp")
+            try:
+                tmp.write_text(json.dumps(rows), encoding="utf-8")
+                os.replace(tmp, self.index_file)
+            except Exception as e:
+                logger.error(f"Failed to persist invoice PDF cache index: {e}", exc_info=True)
+                with self._lock:
+                    self._index_dirty = True
+
+    # ── bookkeeping (caller holds the lock) ────────────────────────────────
+    def _add_entry(self, entry: CachedPdf) -> None:
+        key = (entry.invoice_id, entry.sync_token)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = entry
+        refs = self._blob_refs.get(entry.digest, 0)
+        if refs == 0:
+            self._total_bytes += entry.size
+        self._blob_refs[entry.digest] = refs + 1
+
+    def _drop_entry(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key)
+        refs = self._blob_refs.get(entry.digest, 1) - 1
+        if refs > 0:
+            self._blob_refs[entry.digest] = refs
+            return
+        self._blob_refs.pop(entry.digest, None)
+        self._total_bytes -= entry.size
+        try:
+            entry.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not delete evicted invoice PDF {entry.path}: {e}")
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            logger.info(f"Evicting invoice PDF {key[0]} (SyncToken {key[1]}) from cache.")
+            self._drop_entry(key)
+
+    # ── public API ─────────────────────────────────────────────────────────
+    def lookup(self, invoice_id: str, sync_token: str) -> Optional[CachedPdf]:
+        key = (str(invoice_id), str(sync_token))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.path.exists():
+                self._drop_entry(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def store(self, invoice_id: str, sync_token: str, pdf_bytes: bytes) -> CachedPdf:
+        writer = self.writer(invoice_id, sync_token)
+        try:
+            writer.write(pdf_bytes)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def writer(self, invoice_id: str, sync_token: str) -> "CacheWriter":
+        """Incremental writer for callers that stream the PDF instead of holding it in memory."""
+        return CacheWriter(self, str(invoice_id), str(sync_token))
+
+    def _commit_file(self, invoice_id: str, sync_token: str, tmp: Path, digest: str, size: int) -> CachedPdf:
+        path = self._blob_path(digest)
+        entry = CachedPdf(invoice_id, sync_token, digest, size, path)
+        with self._lock:
+            # Blobs are only unlinked under the lock once no entry references
+            # them, so a referenced blob cannot vanish between this check and
+            # the new entry taking its reference.
+            if self._blob_refs.get(digest) and path.exists():
+                tmp.unlink(missing_ok=True)
+            else:
+                os.replace(tmp, path)
+            # Referenced before the stale entries go: an older SyncToken with
+            # the same PDF content must not take the shared blob with it.
+            self._add_entry(entry)
+            stale = [k for k in self._entries if k[0] == invoice_id and k[1] != sync_token]
+            for key in stale:
+                self._drop_entry(key)
+            self._evict()
+        self._schedule_index_save()
+        self.remember_sync_token(invoice_id, sync_token)
+        logger.info(f"Cached PDF for invoice {invoice_id} (SyncToken {sync_token}, {size} bytes).")
+        return entry
+
+    def remember_sync_token(self, invoice_id: str, sync_token: str) -> None:
+        self._sync_tokens[str(invoice_id)] = (str(sync_token), time.monotonic() + self.sync_token_ttl)
+
+    def current_sync_token(self, qb, invoice_id: str) -> str:
+        memo = self._sync_tokens.get(str(invoice_id))
+        if memo and memo[1] > time.monotonic():
+            return memo[0]
+        invoice = qb.get_invoice(invoice_id)
+        sync_token = invoice.get("SyncToken")
+        if sync_token is None:
+            raise RuntimeError(f"QuickBooks invoice {invoice_id} has no SyncToken.")
+        self.remember_sync_token(invoice_id, sync_token)
+        return str(sync_token)
+
+    def get_or_fetch(self, qb, invoice_id: str, sync_token: Optional[str] = None) -> CachedPdf:
+        """
+        Return the cached PDF for the invoice's current SyncToken, downloading
+        it from QuickBooks on a miss. Concurrent misses for the same key share
+        a single download.
+        """
+        sync_token = str(sync_token) if sync_token is not None else self.current_sync_token(qb, invoice_id)
+        key = (str(invoice_id), sync_token)
+
+        while True:
+            entry = self.lookup(*key)
+            if entry is not None:
+                logger.debug(f"Invoice PDF cache hit for {key}.")
+                return entry
+
+            with self._lock:
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+            if waiter is not None:
+                waiter.wait(timeout=30)
+                continue
+
+            try:
+                logger.info(f"Invoice PDF cache miss for {key}. Fetching from QuickBooks.")
+                return self.store(invoice_id, sync_token, qb.get_invoice_pdf(invoice_id))
+            finally:
+                with self._lock:
+                    self._inflight.pop(key).set()
+
+    def prewarm(self, qb, invoice_id: str, sync_token: Optional[str] = None) -> None:
+        """Fetch the PDF in the background so the customer's first click is a hit."""
+        def _run():
+            try:
+                self.get_or_fetch(qb, invoice_id, sync_token)
+            except Exception as e:
+                logger.warning(f"Pre-warming invoice PDF {invoice_id} failed: {e}")
+
+        self._prewarm_pool.submit(_run)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "blobs": len(self._blob_refs), "bytes": self._total_bytes}
+
+
+class CacheWriter:
+    """Tees streamed chunks into a temp file; `commit()` publishes it as a cache entry."""
+
+    def __init__(self, cache: InvoicePdfCache, invoice_id: str, sync_token: str) -> None:
+        self.cache = cache
+        self.invoice_id = invoice_id
+        self.sync_token = sync_token
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._tmp = cache.blob_dir / f"{invoice_id}-{sync_token}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+        self._fh = open(self._tmp, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self._hash.update(chunk)
+        self._size += len(chunk)
+
+    def commit(self) -> CachedPdf:
+        self._fh.close()
+        return self.cache._commit_file(self.invoice_id, self.sync_token, self._tmp, self._hash.hexdigest(), self._size)
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+_cache: Optional[InvoicePdfCache] = None
+_cache_lock = threading.Lock()
+
+def get_invoice_pdf_cache() -> InvoicePdfCache:
+    """Process-wide cache instance, configured from the environment on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = InvoicePdfCache(
+                root=Path(os.getenv("INVOICE_PDF_CACHE_DIR", DEFAULT_CACHE_DIR)),
+                max_bytes=int(os.getenv("INVOICE_PDF_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                sync_token_ttl=int(os.getenv("INVOICE_PDF_SYNC_TOKEN_TTL", DEFAULT_SYNC_TOKEN_TTL)),
+            )
+        return _cache
+
+def flush_invoice_pdf_cache() -> None:
+    """Write a pending index update (at shutdown); a no-op if the cache was never used."""
+    if _cache is not None:
+        _cache.flush_index()
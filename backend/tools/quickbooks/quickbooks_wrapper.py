@@ -1,14 +1,18 @@
 # tools/quickbooks/quickbooks_wrapper.py
 
 from __future__ import annotations
-import os, json, time
+import os, json, time, threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 import logging
 
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from token_service import get_token_for_provider, refresh_token_for_provider
+from observability.tracing import span, KIND_CLIENT
+from observability.metrics import observe_upstream, count_token_refresh
+from runtime.deadline import check as check_deadline, clamp
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,92 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 ENV_PATH = PROJECT_ROOT / ".env"
 load_dotenv(dotenv_path=ENV_PATH if ENV_PATH.exists() else None)
 
+DEFAULT_CUSTOMER_CACHE_TTL = 300.0  # seconds; 0 disables the cache
+CUSTOMER_PRELOAD_LIMIT = 1000       # QBO's page size limit
+
+# ── shared connection pool ─────────────────────────────────────────────────
+# Wrappers are cheap and built per tool call; the keep-alive connections to
+# QBO are not, so every instance sends through one process-wide session.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _http() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", 16)), max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+# ── customer cache ─────────────────────────────────────────────────────────
+class CustomerCache:
+    """
+    Customer records by DisplayName (case-insensitive), so a returning
+    customer's name check skips the QBO query. Only hits are cached: a name
+    that is not found is always looked up again, and entries expire after
+    `ttl` seconds so edits made directly in QuickBooks show up.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CUSTOMER_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._by_name: Dict[str, tuple] = {}    # lower-cased name -> (stored at, customer)
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, display_name: str) -> Optional[Dict[str, Any]]:
+        if self.ttl <= 0:
+            return None
+        key = display_name.strip().lower()
+        with self._lock:
+            entry = self._by_name.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self._by_name.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, customer: Dict[str, Any]) -> None:
+        name = (customer.get("DisplayName") or "").strip().lower()
+        if self.ttl <= 0 or not name:
+            return
+        with self._lock:
+            # A rename leaves the old name pointing at the same Id; drop it.
+            stale = [k for k, (_, c) in self._by_name.items() if c.get("Id") == customer.get("Id") and k != name]
+            for k in stale:
+                del self._by_name[k]
+            self._by_name[name] = (time.monotonic(), customer)
+
+    def replace_all(self, customers: List[Dict[str, Any]]) -> None:
+        now = time.monotonic()
+        fresh = {(c.get("DisplayName") or "").strip().lower(): (now, c) for c in customers if c.get("DisplayName")}
+        with self._lock:
+            self._by_name = fresh
+            self.loaded_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._by_name), "hits": self.hits, "misses": self.misses,
+                    "ttl_seconds": self.ttl, "loaded_at": self.loaded_at}
+
+
+_customer_cache: Optional[CustomerCache] = None
+
+def get_customer_cache() -> CustomerCache:
+    """Process-wide customer cache (CUSTOMER_CACHE_TTL_SECONDS, default 300; 0 disables)."""
+    global _customer_cache
+    if _customer_cache is None:
+        _customer_cache = CustomerCache(ttl=float(os.getenv("CUSTOMER_CACHE_TTL_SECONDS", DEFAULT_CUSTOMER_CACHE_TTL)))
+    return _customer_cache
+
+
 class QuickBooksWrapper:
     """
     Wrapper with lazy token load + proactive refresh.
@@ -25,7 +115,8 @@ class QuickBooksWrapper:
 
     def __init__(self) -> None:
         logger.info("Initializing QuickBooksWrapper.")
-        self.base_url = "https://sandbox-quickbooks.api.intuit.com"
+        # QB_BASE_URL points the wrapper elsewhere (e.g. the offline fakes in bench/).
+        self.base_url = os.getenv("QB_BASE_URL", "https://sandbox-quickbooks.api.intuit.com").rstrip("/")
         self.minor_version = os.getenv("QB_MINOR_VERSION", "75")
         self.realm_id = os.getenv("QB_REALM_ID")
         if not self.realm_id:
@@ -34,7 +125,7 @@ class QuickBooksWrapper:
         self.access_token: Optional[str] = None
         self.refresh_token: Optional[str] = None
         self.access_expires_at: Optional[int] = None
-        logger.debug(f"QuickBooksWrapper initialized with base_url: {self.base_url}")
+        logger.debug("QuickBooksWrapper initialized with base_url: %s", self.base_url)
 
     # ── token plumbing ─────────────────────────────────────────────────────
     def _load_from_store(self) -> None:
@@ -59,44 +150,94 @@ class QuickBooksWrapper:
         # refresh when < 2 minutes remaining
         if not self.access_expires_at or (self.access_expires_at - int(time.time()) <= 120):
             logger.info("Access token is near expiration or missing. Refreshing token.")
-            data = refresh_token_for_provider("quickbooks")
+            with span("token.refresh", **{"peer.service": "quickbooks"}):
+                count_token_refresh("quickbooks")
+                data = refresh_token_for_provider("quickbooks")
             self.access_token = data.get("access_token")
             self.refresh_token = data.get("refresh_token")
             self.access_expires_at = data.get("access_expires_at")
             logger.info("Token refreshed successfully.")
 
+    def authorized_headers(self, force_refresh: bool = False, **extra: str) -> Dict[str, str]:
+        """Bearer headers for callers that issue the HTTP request themselves (e.g. async streaming)."""
+        if force_refresh:
+            self._load_from_store()
+            count_token_refresh("quickbooks")
+            data = refresh_token_for_provider("quickbooks")
+            self.access_token = data.get("access_token")
+            self.refresh_token = data.get("refresh_token")
+            self.access_expires_at = data.get("access_expires_at")
+        else:
+            self._ensure_fresh_access()
+        headers = {"Accept": "application/json", **extra}
+        headers["Authorization"] = f"Bearer {self.access_token}"
+        return headers
+
+    def invoice_pdf_url(self, invoice_id: str) -> str:
+        return f"{self.base_url}/v3/company/{self.realm_id}/invoice/{invoice_id}/pdf"
+
     # ── http with auto-refresh on 401 as safety net ────────────────────────
     def _make_authenticated_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        with span(f"http {method.upper()} quickbooks", KIND_CLIENT, **{
+            "http.method": method.upper(),
+            "http.url": url,
+            "peer.service": "quickbooks",
+        }) as http_span:
+            started = time.perf_counter()
+            try:
+                resp = self._send_authenticated(method, url, **kwargs)
+            except Exception as e:
+                observe_upstream("quickbooks", type(e).__name__, time.perf_counter() - started)
+                raise
+            observe_upstream("quickbooks", resp.status_code, time.perf_counter() - started)
+            http_span.set(**{"http.status_code": resp.status_code})
+            if resp.status_code >= 400:
+                http_span.fail(f"HTTP {resp.status_code}")
+            return resp
+
+    def _send_authenticated(self, method: str, url: str, **kwargs) -> requests.Response:
+        check_deadline(f"QuickBooks {method.upper()}")
         self._ensure_fresh_access()
         headers = dict(kwargs.pop("headers", {}) or {})
         headers.setdefault("Accept", "application/json")
         headers["Authorization"] = f"Bearer {self.access_token}"
         kwargs["headers"] = headers
 
-        logger.debug(f"Making authenticated {method} request to {url}")
-        resp = requests.request(method.upper(), url, timeout=20, **kwargs)
+        logger.debug("Making authenticated %s request to %s", method, url)
+        resp = _http().request(method.upper(), url, timeout=clamp(20), **kwargs)
         
         if resp.status_code == 401:
             logger.warning("Request failed with 401 Unauthorized. Attempting token refresh and retry.")
             try:
                 self._load_from_store()
-                data = refresh_token_for_provider("quickbooks")
+                with span("token.refresh", **{"peer.service": "quickbooks"}):
+                    count_token_refresh("quickbooks")
+                    data = refresh_token_for_provider("quickbooks")
                 self.access_token = data.get("access_token")
                 self.refresh_token = data.get("refresh_token")
                 self.access_expires_at = data.get("access_expires_at")
                 headers["Authorization"] = f"Bearer {self.access_token}"
                 kwargs["headers"] = headers
-                resp = requests.request(method.upper(), url, timeout=20, **kwargs)
+                resp = _http().request(method.upper(), url, timeout=clamp(20), **kwargs)
                 logger.info("Token refresh and retry successful.")
             except Exception as e:
                 logger.error(f"Token refresh failed during 401 retry: {e}", exc_info=True)
                 raise RuntimeError(f"Failed to refresh token: {e}")
         
-        logger.debug(f"Request to {url} completed with status code: {resp.status_code}")
+        logger.debug("Request to %s completed with status code: %s", url, resp.status_code)
         return resp
 
     # ── public API ─────────────────────────────────────────────────────────
-    def create_invoice(self, customer_id: str, line_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def create_invoice(
+        self,
+        customer_id: str,
+        line_items: List[Dict[str, Any]],
+        request_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        `request_id` is passed as QuickBooks' `requestid` parameter: a retried
+        create with the same id returns the original invoice instead of a duplicate.
+        """
         logger.info(f"Creating invoice for customer_id: {customer_id}")
         if not customer_id:
             logger.error("customer_id is required but was not provided.")
@@ -107,6 +248,8 @@ class QuickBooksWrapper:
         
         url = f"{self.base_url}/v3/company/{self.realm_id}/invoice"
         params = {"minorversion": self.minor_version}
+        if request_id:
+            params["requestid"] = request_id
         body = {"Line": line_items, "CustomerRef": {"value": str(customer_id)}}
         headers = {"Content-Type": "application/json"}
         
@@ -125,13 +268,29 @@ class QuickBooksWrapper:
         logger.info("Invoice created successfully.")
         return data
 
+    def get_invoice(self, invoice_id: str) -> Dict[str, Any]:
+        logger.info(f"Getting invoice_id: {invoice_id}")
+        if not invoice_id:
+            logger.error("invoice_id is required but was not provided.")
+            raise ValueError("invoice_id is required.")
+
+        url = f"{self.base_url}/v3/company/{self.realm_id}/invoice/{invoice_id}"
+        params = {"minorversion": self.minor_version}
+        resp = self._make_authenticated_request("GET", url, params=params)
+
+        if resp.status_code != 200:
+            logger.error(f"QuickBooks get_invoice failed: HTTP {resp.status_code} - {resp.text}")
+            raise RuntimeError(f"QuickBooks get_invoice failed: HTTP {resp.status_code} - {resp.text}")
+
+        return resp.json().get("Invoice", {})
+
     def get_invoice_pdf(self, invoice_id: str) -> bytes:
         logger.info(f"Getting PDF for invoice_id: {invoice_id}")
         if not invoice_id:
             logger.error("invoice_id is required but was not provided.")
             raise ValueError("invoice_id is required.")
             
-        url = f"{self.base_url}/v3/company/{self.realm_id}/invoice/{invoice_id}/pdf"
+        url = self.invoice_pdf_url(invoice_id)
         headers = {"Accept": "application/pdf"}
         resp = self._make_authenticated_request("GET", url, headers=headers)
         
@@ -162,6 +321,12 @@ class QuickBooksWrapper:
             logger.warning("Display name is empty. Cannot search for customer.")
             return None
 
+        cache = get_customer_cache()
+        cached = cache.get(display_name)
+        if cached is not None:
+            logger.debug("Customer '%s' served from cache.", display_name)
+            return cached
+
         q = f"SELECT * FROM Customer WHERE DisplayName = '{safe}'"
         url = f"{self.base_url}/v3/company/{self.realm_id}/query"
         params = {"query": q, "minorversion": self.minor_version}
@@ -175,6 +340,7 @@ class QuickBooksWrapper:
         customers = (data.get("QueryResponse") or {}).get("Customer", [])
         if customers:
             logger.info(f"Found customer with name '{display_name}'.")
+            cache.put(customers[0])
             return customers[0]
         else:
             logger.info(f"No customer found with exact name '{display_name}'.")
@@ -201,6 +367,32 @@ class QuickBooksWrapper:
         logger.info(f"Found {len(customers)} customers matching fragment '{name_fragment}'.")
         return customers
 
+    def load_customers(self, limit: int = CUSTOMER_PRELOAD_LIMIT) -> int:
+        """Fill the customer cache with the active customers (one query); returns how many were loaded."""
+        q = f"SELECT * FROM Customer WHERE Active = true STARTPOSITION 1 MAXRESULTS {int(limit)}"
+        url = f"{self.base_url}/v3/company/{self.realm_id}/query"
+        params = {"query": q, "minorversion": self.minor_version}
+
+        resp = self._make_authenticated_request("GET", url, params=params)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Customer preload failed: HTTP {resp.status_code} - {resp.text}")
+
+        customers = ((resp.json() or {}).get("QueryResponse") or {}).get("Customer", []) or []
+        get_customer_cache().replace_all(customers)
+        logger.info(f"Loaded {len(customers)} customers into the cache.")
+        return len(customers)
+
+    def warm_up(self) -> str:
+        """
+        Startup warm-up: refresh the access token if it is near expiry (so a
+        broken refresh token shows up before the first customer does) and
+        preload the customer cache, which also opens the pooled connection.
+        """
+        self._ensure_fresh_access()
+        loaded = self.load_customers()
+        remaining = int((self.access_expires_at or 0) - time.time())
+        return f"token valid for {remaining}s, {loaded} customers cached"
+
     def create_guest_customer(self, display_name: str = "Guest Customer") -> Dict[str, Any]:
         logger.info(f"Creating or retrieving guest customer with display name: {display_name}")
         existing = self.find_customer_by_name(display_name)
@@ -220,6 +412,7 @@ class QuickBooksWrapper:
         resp = self._make_authenticated_request("POST", url, params=params, json=payload, headers=headers)
         if resp.status_code == 200:
             logger.info(f"Successfully created new guest customer: {resp.json().get('Customer', {}).get('DisplayName')}")
+            get_customer_cache().put(resp.json()["Customer"])
             return resp.json()["Customer"]
 
         logger.error(f"Error creating guest: HTTP {resp.status_code} - {resp.text}")
@@ -257,7 +450,7 @@ class QuickBooksWrapper:
             payload["BillAddr"] = address
             payload["ShipAddr"] = address
         
-        logger.debug(f"Payload for new customer creation: {payload}")
+        logger.debug("Payload for new customer creation: %s", payload)
         
         url = f"{self.base_url}/v3/company/{self.realm_id}/customer"
         params = {"minorversion": self.minor_version}
@@ -266,6 +459,7 @@ class QuickBooksWrapper:
         resp = self._make_authenticated_request("POST", url, params=params, json=payload, headers=headers)
         if resp.status_code == 200:
             logger.info(f"Successfully created new customer: {resp.json().get('Customer', {}).get('DisplayName')}")
+            get_customer_cache().put(resp.json()["Customer"])
             return resp.json()["Customer"]
 
         logger.error(f"QuickBooks create_customer failed: HTTP {resp.status_code} - {resp.text}")
@@ -291,7 +485,7 @@ class QuickBooksWrapper:
             raise RuntimeError(f"Customer with name '{new_name}' already exists.")
 
         # fetch current to obtain SyncToken
-        logger.debug(f"Fetching current customer data for ID: {customer_id}")
+        logger.debug("Fetching current customer data for ID: %s", customer_id)
         get_url = f"{self.base_url}/v3/company/{self.realm_id}/customer/{customer_id}"
         get_params = {"minorversion": self.minor_version}
         get_resp = self._make_authenticated_request("GET", get_url, params=get_params)
@@ -324,7 +518,7 @@ class QuickBooksWrapper:
             update_payload["BillAddr"] = address
             update_payload["ShipAddr"] = address
         
-        logger.debug(f"Payload for customer rename: {update_payload}")
+        logger.debug("Payload for customer rename: %s", update_payload)
         
         update_url = f"{self.base_url}/v3/company/{self.realm_id}/customer"
         update_params = {"minorversion": self.minor_version}
@@ -335,6 +529,7 @@ class QuickBooksWrapper:
         )
         if upd_resp.status_code == 200:
             logger.info(f"Customer with ID {customer_id} successfully renamed to '{new_name}'.")
+            get_customer_cache().put(upd_resp.json()["Customer"])
             return upd_resp.json()["Customer"]
 
         logger.error(f"Error renaming customer: HTTP {upd_resp.status_code} - {upd_resp.text}")
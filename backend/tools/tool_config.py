@@ -1,5 +1,5 @@
 import logging
-from langchain.agents import Tool
+from langchain_core.tools import BaseTool
 
 from tools.cart.cart_tool import cart_tools
 
@@ -14,14 +14,44 @@ from tools.product.summary_tool import generate_summary
 from tools.quickbooks.create_invoice_tool import create_invoice_tool
 from tools.fedex.fedex_tool import create_fedex_shipment as fedex_tool
 
-from tools.payment.applepay.apple_pay_tool import apple_pay_tools
-from tools.payment.paypal.paypal_tool import get_paypal_tools, order_tools
+from tools.payment.paypal.paypal_tool import order_tools, get_order_id_tool
 from tools.payment.trigger_payment import trigger_payment_tool
 from tools.payment.stripe.stripe_tool import stripe_checkout_status_tool
 
+from runtime.tool_executor import offload_tool
+
 logger = logging.getLogger(__name__)
 
-def get_all_tools() -> list[Tool]:
+# Upstream each blocking tool talks to. These tools run on the shared tool
+# executor under that provider's concurrency lane instead of on the event loop.
+TOOL_PROVIDERS = {
+    create_invoice_tool.name: "quickbooks",
+    create_customer_tool.name: "quickbooks",
+    create_guest_tool.name: "quickbooks",
+    rename_customer_tool.name: "quickbooks",
+    validate_customer_tool.name: "quickbooks",
+    fedex_tool.name: "fedex",
+    stripe_checkout_status_tool.name: "stripe",
+}
+
+# Tools in the same group mutate shared per-session state; when the model
+# emits several of them in one step the agent runner serializes them per
+# session instead of running them concurrently.
+TOOL_CONFLICT_GROUPS = {t.name: "cart" for t in cart_tools}
+
+# Fields of a tool's JSON output the model acts on. The rest is dropped before
+# the output enters the agent scratchpad (agent/compaction.py); tools not
+# listed keep every non-empty field.
+_CUSTOMER_FIELDS = ("status", "id", "name", "reason")
+TOOL_OUTPUT_FIELDS = {
+    create_customer_tool.name: _CUSTOMER_FIELDS,
+    create_guest_tool.name: _CUSTOMER_FIELDS,
+    rename_customer_tool.name: _CUSTOMER_FIELDS,
+    validate_customer_tool.name: _CUSTOMER_FIELDS,
+    get_order_id_tool.name: ("exists", "order_id"),
+}
+
+def get_all_tools() -> list[BaseTool]:
     """
     Gathers and returns all tool instances for the LangChain agent.
     """
@@ -40,9 +70,15 @@ def get_all_tools() -> list[Tool]:
             stripe_checkout_status_tool
         ]
         + order_tools
-        # + apple_pay_tools
-        # + get_paypal_tools()
+        # Not offered to the agent; import them here when enabling (they load Stripe / the PayPal toolkit):
+        # + tools.payment.applepay.apple_pay_tool.apple_pay_tools
+        # + tools.payment.paypal.paypal_tool.get_paypal_tools()
     )
     
+    for t in tools:
+        provider = TOOL_PROVIDERS.get(t.name)
+        if provider:
+            offload_tool(t, provider)
+
     logger.info(f"Successfully loaded {len(tools)} tools for the agent.")
     return tools
\ No newline at end of file
@@ -46,7 +46,10 @@ const Index = () => {
                 const msg = JSON.parse(event.data);
                 console.debug("Index: WebSocket message received:", msg);
 
-                if (msg.type === 'payment_intent_created' && msg.client_secret) {
+                if (msg.type === 'ping') {
+                    // Server heartbeat: answer so the connection is not dropped as idle.
+                    newSocket.send(JSON.stringify({ event: 'pong' }));
+                } else if (msg.type === 'payment_intent_created' && msg.client_secret) {
                     console.info(`Index: Received 'payment_intent_created' event.`);
                     console.debug(`Index: Client Secret: ${msg.client_secret.substring(0, 10)}...`);
                     
@@ -69,6 +72,12 @@ const Index = () => {
                     };
                     setMessages(prev => [...prev, aiMessage]);
                     setIsLoading(false);
+                } else if (msg.type === 'payment_confirmed') {
+                    console.info(`Index: Payment confirmed by Stripe for order ${msg.order_id}.`);
+                } else if (msg.type === 'order_progress') {
+                    console.info(`Index: Order progress: ${msg.step}`);
+                } else if (msg.type === 'shipment_created') {
+                    console.info(`Index: Shipment created for order ${msg.order_id}. Tracking: ${msg.tracking_number}`);
                 } else {
                     console.warn(`Index: Received unknown message type or incomplete data:`, msg);
                 }